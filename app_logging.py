@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志配置
+功能: 分级日志、惰性格式化，通过队列把日志交给后台线程写入控制台和滚动日志文件，
+      调用方（列举线程、Tk主线程）不会被stdout或磁盘写入阻塞
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOGGER_NAME = "audio_qr"
+LOG_DIR = "logs"
+LOG_FILE = "audio_qr.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# 逐对象跟踪级别，低于DEBUG，默认关闭
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s"
+
+_listener = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    把原始日志记录放入队列的处理器
+
+    标准 QueueHandler.prepare() 为了跨进程传递，会在调用线程中合并参数、格式化异常堆栈；
+    监听线程在同一进程内，可以直接使用原记录，格式化全部推迟到监听线程。
+    因此记录日志后不应修改作为参数传入的可变对象。
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def get_logger(name=None):
+    """获取 audio_qr 下的子日志记录器"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def setup_logging(level="INFO", log_dir=LOG_DIR, console=True):
+    """
+    初始化日志（重复调用只会调整级别）
+
+    Args:
+        level: 日志级别名称或数值，"TRACE" 开启逐对象跟踪
+        log_dir: 滚动日志文件所在目录（install.py 创建的 logs 目录）
+        console: 是否同时输出到控制台（stderr）
+    """
+    global _listener
+
+    logger = logging.getLogger(LOGGER_NAME)
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    logger.setLevel(level)
+
+    if _listener is not None:
+        return logger
+
+    handlers = []
+    formatter = logging.Formatter(LOG_FORMAT)
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        handlers.append(stream_handler)
+    if log_dir:
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                os.path.join(log_dir, LOG_FILE),
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT,
+                encoding="utf-8"
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        except OSError as e:
+            logger.warning("无法创建日志文件: %s", e)
+
+    # 调用方只把记录放入队列，格式化与写入在监听线程中完成
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging():
+    """停止后台日志线程，写完队列中剩余的日志"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段耗时与计数
+功能: 记录COS请求、二维码编码/光栅化/PNG编码、界面刷新等阶段的延迟直方图、计数与吞吐，
+      导出为JSON或Prometheus文本格式，可选记录Chrome跟踪文件（chrome://tracing / Perfetto 打开）；
+      工作进程中的阶段耗时由 StageTimings 随渲染结果带回主进程合并
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from qr_cache import write_atomic
+
+# 直方图桶上限（秒），覆盖100微秒到1分钟
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 跟踪事件上限，超出后丢弃并计数，长时间运行也不会无限占用内存
+MAX_TRACE_EVENTS = 500000
+
+PROMETHEUS_PREFIX = "audio_qr_"
+
+
+def prometheus_name(name):
+    """阶段名转换为Prometheus指标名：cos.list_objects -> audio_qr_cos_list_objects"""
+    return PROMETHEUS_PREFIX + "".join(c if c.isalnum() else "_" for c in name)
+
+
+class Histogram:
+    """固定桶的延迟直方图，分位数按桶内线性插值估算（与Prometheus的histogram_quantile一致）"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.first = None
+        self.last = None
+
+    def observe(self, seconds, end):
+        """记录一次耗时，end 为结束时刻（perf_counter）"""
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        start = end - seconds
+        self.first = start if self.first is None else min(self.first, start)
+        self.last = end if self.last is None else max(self.last, end)
+
+    def quantile(self, q):
+        """估算分位数（秒）"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+                value = lower + (upper - lower) * (rank - seen) / n
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+    def to_dict(self):
+        """汇总：次数、总耗时、均值、分位数与吞吐（次数 / 首次开始到最后结束的时长）"""
+        span = (self.last - self.first) if self.count else 0
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else None,
+            'min': self.min,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'per_second': round(self.count / span, 1) if span > 0 else None,
+            'buckets': dict(zip([str(b) for b in BUCKETS] + ["+Inf"], self.counts))
+        }
+
+
+class StageTimings:
+    """
+    工作进程中记录的阶段耗时
+
+    只保存 (阶段名, 开始时刻, 耗时) 元组，可随渲染结果一起pickle回主进程，
+    由 Metrics.merge() 并入直方图和跟踪。perf_counter 在同一台机器的进程间可比较。
+    """
+
+    def __init__(self):
+        self.samples = []
+
+    @contextmanager
+    def time(self, name):
+        """计时一个阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append((name, start, time.perf_counter() - start))
+
+
+class Metrics:
+    """
+    进程内的指标注册表（线程安全）
+
+    - timer(name) / observe(name, seconds)：延迟直方图，开启跟踪时同时记录一个完整事件
+    - count(name, n)：累计计数
+    - start_trace() / chrome_trace()：Chrome跟踪事件
+    - write(path)：按扩展名导出JSON、Prometheus文本或Chrome跟踪文件
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空全部指标（跟踪开关保持不变）"""
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+            self.started = time.perf_counter()
+            self.started_wall = time.time()
+            self._events = []
+            self._thread_names = {}
+            self.dropped_events = 0
+            self.tracing = getattr(self, 'tracing', False)
+
+    def _record(self, name, start, seconds, pid=None, tid=None, thread_name=None):
+        """记录一个样本（调用方已持有锁）"""
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(seconds, start + seconds)
+        if not self.tracing:
+            return
+        if len(self._events) >= MAX_TRACE_EVENTS:
+            self.dropped_events += 1
+            return
+        pid = pid or os.getpid()
+        tid = tid or threading.get_ident()
+        if (pid, tid) not in self._thread_names:
+            self._thread_names[(pid, tid)] = thread_name or threading.current_thread().name
+        self._events.append((name, start, seconds, pid, tid))
+
+    def observe(self, name, seconds, start=None):
+        """记录一次耗时（秒），start 为开始时刻（perf_counter），默认为当前时刻减去耗时"""
+        if start is None:
+            start = time.perf_counter() - seconds
+        with self._lock:
+            self._record(name, start, seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """计时一个阶段：with metrics.timer("cos.connect"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, start)
+
+    def count(self, name, n=1):
+        """累加计数"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, samples, pid):
+        """并入工作进程带回的 StageTimings.samples"""
+        if not samples:
+            return
+        with self._lock:
+            for name, start, seconds in samples:
+                self._record(name, start, seconds, pid=pid, tid=pid, thread_name=f"渲染进程 {pid}")
+
+    def start_trace(self):
+        """开始记录跟踪事件（清空之前的事件）"""
+        with self._lock:
+            self._events = []
+            self._thread_names = {}
+            self.dropped_events = 0
+            self.tracing = True
+
+    def stop_trace(self):
+        """停止记录跟踪事件（已记录的保留，可继续导出）"""
+        self.tracing = False
+
+    def snapshot(self):
+        """全部指标的字典（JSON导出与诊断窗口使用）"""
+        with self._lock:
+            uptime = time.perf_counter() - self.started
+            return {
+                'started': self.started_wall,
+                'uptime': round(uptime, 3),
+                'histograms': {name: h.to_dict() for name, h in sorted(self.histograms.items())},
+                'counters': {
+                    name: {'value': value, 'per_second': round(value / uptime, 1) if uptime > 0 else None}
+                    for name, value in sorted(self.counters.items())
+                },
+                'trace_events': len(self._events),
+                'dropped_trace_events': self.dropped_events
+            }
+
+    def to_json(self):
+        """JSON文本"""
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus文本格式（直方图以秒为单位，计数带 _total 后缀）"""
+        lines = []
+        with self._lock:
+            for name, h in sorted(self.histograms.items()):
+                metric = prometheus_name(name) + "_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, n in zip(list(BUCKETS) + ["+Inf"], h.counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum {h.sum:.6f}")
+                lines.append(f"{metric}_count {h.count}")
+            for name, value in sorted(self.counters.items()):
+                metric = prometheus_name(name) + "_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    def chrome_trace(self):
+        """Chrome跟踪格式（完整事件 ph="X"，时间单位微秒，以注册表创建时刻为零点）"""
+        with self._lock:
+            events = [
+                {'name': name, 'cat': name.split(".", 1)[0], 'ph': "X",
+                 'ts': round((start - self.started) * 1e6, 1), 'dur': round(seconds * 1e6, 1),
+                 'pid': pid, 'tid': tid}
+                for name, start, seconds, pid, tid in self._events
+            ]
+            events.extend(
+                {'name': "thread_name", 'ph': "M", 'pid': pid, 'tid': tid, 'args': {'name': thread_name}}
+                for (pid, tid), thread_name in self._thread_names.items()
+            )
+        return {'traceEvents': events, 'displayTimeUnit': "ms"}
+
+    def write(self, path):
+        """按扩展名导出：.prom / .txt 为Prometheus文本，.trace.json 为Chrome跟踪，其余为JSON"""
+        if path.endswith(".trace.json"):
+            self.write_trace(path)
+            return
+        data = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        write_atomic(path, data.encode('utf-8'))
+
+    def write_trace(self, path):
+        """导出Chrome跟踪文件"""
+        write_atomic(path, json.dumps(self.chrome_trace(), ensure_ascii=False).encode('utf-8'))
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """进程内共享的指标注册表"""
+    return _metrics
@@ -0,0 +1,635 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频元数据提取
+功能: 只用HTTP Range请求读取音频对象的头部字节（ID3v2、MP4 moov、FLAC STREAMINFO、WAV fmt 等），
+      解析时长、码率、编码、采样率、声道与标题/艺术家/专辑，不下载整个文件；
+      多线程共用一个带连接池的 requests.Session 并发提取（见 http_pool）
+
+requests 在创建会话时才导入，导入本模块本身只依赖标准库。
+"""
+
+import re
+import struct
+import threading
+import uuid
+
+from app_logging import get_logger
+from file_catalog import AudioMetadata
+from http_pool import create_session, run_bounded
+
+logger = get_logger("metadata")
+
+DEFAULT_METADATA_CONCURRENCY = 16
+# 按块读取并缓存，相邻的小读取合并为一次请求
+BLOCK_SIZE = 64 * 1024
+# 单个文件最多读取的字节数，超过时放弃（例如把整段封面图片放在头部之前的异常文件）
+MAX_READ_BYTES = 1024 * 1024
+REQUEST_TIMEOUT = (5, 30)
+# 在最后读取Ogg末尾的字节数（最后一页的granule即总采样数）
+OGG_TAIL_BYTES = 64 * 1024
+MAX_CHUNKS = 64
+
+MPEG_VERSIONS = {3: 1, 2: 2, 0: 2.5}
+MPEG_LAYERS = {3: 1, 2: 2, 1: 3}
+MPEG_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_SAMPLE_RATES = (44100, 48000, 32000)
+ADTS_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+ID3_TEXT_FRAMES = {
+    b'TIT2': 'title', b'TPE1': 'artist', b'TALB': 'album',
+    b'TT2': 'title', b'TP1': 'artist', b'TAL': 'album'
+}
+ID3_ENCODINGS = ('latin-1', 'utf-16', 'utf-16-be', 'utf-8')
+VORBIS_FIELDS = {'TITLE': 'title', 'ARTIST': 'artist', 'ALBUM': 'album'}
+RIFF_INFO_FIELDS = {b'INAM': 'title', b'IART': 'artist', b'IPRD': 'album'}
+MP4_TAG_FIELDS = {b'\xa9nam': 'title', b'\xa9ART': 'artist', b'\xa9alb': 'album'}
+MP4_CODECS = {
+    b'mp4a': 'aac', b'alac': 'alac', b'fLaC': 'flac', b'Opus': 'opus',
+    b'.mp3': 'mp3', b'ac-3': 'ac3', b'ec-3': 'eac3'
+}
+WAV_CODECS = {1: 'pcm', 2: 'adpcm', 3: 'pcm_float', 6: 'alaw', 7: 'mulaw', 0x55: 'mp3', 0xFFFE: 'pcm'}
+
+ASF_HEADER = uuid.UUID('75b22630-668e-11cf-a6d9-00aa0062ce6c').bytes_le
+ASF_FILE_PROPERTIES = uuid.UUID('8cabdca1-a947-11cf-8ee4-00c00c205365').bytes_le
+ASF_CONTENT_DESCRIPTION = uuid.UUID('75b22633-668e-11cf-a6d9-00aa0062ce6c').bytes_le
+
+_CONTENT_RANGE = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+class MetadataError(Exception):
+    """音频头部无法解析（格式不支持或文件损坏），结果会记录下来不再重复读取"""
+
+
+def _runs(numbers):
+    """把升序的整数分成连续的段，返回 [(first, last), ...]"""
+    runs = []
+    for number in numbers:
+        if runs and runs[-1][1] == number - 1:
+            runs[-1][1] = number
+        else:
+            runs.append([number, number])
+    return [tuple(run) for run in runs]
+
+
+class RangeReader:
+    """
+    按偏移读取远程对象的字节
+
+    读取按 BLOCK_SIZE 对齐成块并缓存，每段连续的缺失块合并成一次 Range 请求，已缓存的块不重复下载；
+    解析器跳过的大段数据（封面图片、音频数据、采样表）不会被下载。
+    服务器忽略 Range 返回 200 时只读取需要的前缀后断开连接，收到的完整块都会缓存。
+    bytes_read 为实际收到的字节数，超过 max_bytes 时抛出 MetadataError。
+    """
+
+    def __init__(self, session, url, size=None, block_size=BLOCK_SIZE, max_bytes=MAX_READ_BYTES,
+                 timeout=REQUEST_TIMEOUT):
+        self.session = session
+        self.url = url
+        self.size = size
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.requests = 0
+        self.bytes_read = 0
+        self._blocks = {}
+
+    def read(self, offset, length):
+        """读取 [offset, offset+length)，超出文件末尾的部分被截断"""
+        if offset < 0:
+            length += offset
+            offset = 0
+        if self.size is not None:
+            length = min(length, self.size - offset)
+        if length <= 0:
+            return b""
+
+        first = offset // self.block_size
+        last = (offset + length - 1) // self.block_size
+        for run_first, run_last in _runs([i for i in range(first, last + 1) if i not in self._blocks]):
+            # 忽略 Range 的服务器返回整个前缀后，后面的段可能已经缓存
+            if any(i not in self._blocks for i in range(run_first, run_last + 1)):
+                self._fetch(run_first, run_last)
+
+        data = b"".join(self._blocks.get(i, b"") for i in range(first, last + 1))
+        start = offset - first * self.block_size
+        return data[start:start + length]
+
+    def _check_limit(self, received):
+        """累计收到的字节数超过上限时抛出 MetadataError"""
+        if self.bytes_read + received > self.max_bytes:
+            raise MetadataError(f"需要读取的头部超过 {self.max_bytes // 1024} KB")
+
+    def _fetch(self, first, last):
+        """用一次 Range 请求读取第 first 到 last 块"""
+        start = first * self.block_size
+        end = (last + 1) * self.block_size - 1
+        if self.size is not None:
+            end = min(end, self.size - 1)
+        self._check_limit(end - start + 1)
+
+        self.requests += 1
+        response = self.session.get(self.url, headers={'Range': f"bytes={start}-{end}"},
+                                    stream=True, timeout=self.timeout)
+        try:
+            if response.status_code == 416:
+                data = b""
+            else:
+                response.raise_for_status()
+                if response.status_code == 206:
+                    match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ""))
+                    if match:
+                        self.size = int(match.group(1))
+                    data = response.content
+                    self._check_limit(len(data))
+                else:
+                    # 不支持 Range：从文件开头读取到需要的位置为止，按实际收到的字节计入上限
+                    if self.size is None and response.headers.get('Content-Length'):
+                        self.size = int(response.headers['Content-Length'])
+                    chunks = []
+                    received = 0
+                    for chunk in response.iter_content(self.block_size):
+                        chunks.append(chunk)
+                        received += len(chunk)
+                        self._check_limit(received)
+                        if received > end:
+                            break
+                    data = b"".join(chunks)
+                    first = start = 0
+        finally:
+            response.close()
+
+        self.bytes_read += len(data)
+        if len(data) < end - start + 1 and self.size is None:
+            self.size = start + len(data)
+        # 请求的块（超出文件末尾的为空）以及顺带收到的完整块
+        for i in range(max(last + 1 - first, len(data) // self.block_size)):
+            self._blocks[first + i] = data[i * self.block_size:(i + 1) * self.block_size]
+
+
+def _text(data, encoding='utf-8'):
+    """解码文本并去掉结尾的空字符与空白"""
+    return data.decode(encoding, errors='replace').split('\x00')[0].strip() or None
+
+
+def _syncsafe(data):
+    """ID3v2 的同步安全整数（每字节7位）"""
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def parse_vorbis_comments(data, meta):
+    """解析 Vorbis Comment（FLAC、Ogg Vorbis、Opus 共用）中的标题、艺术家、专辑"""
+    try:
+        vendor_length = struct.unpack_from('<I', data, 0)[0]
+        offset = 4 + vendor_length
+        count = struct.unpack_from('<I', data, offset)[0]
+        offset += 4
+        for _ in range(count):
+            length = struct.unpack_from('<I', data, offset)[0]
+            offset += 4
+            name, _, value = data[offset:offset + length].decode('utf-8', errors='replace').partition('=')
+            offset += length
+            field = VORBIS_FIELDS.get(name.upper())
+            if field and value and getattr(meta, field) is None:
+                setattr(meta, field, value.strip())
+    except struct.error:
+        # 注释被截断时保留已解析的部分
+        pass
+
+
+def parse_id3(reader, meta):
+    """
+    解析 ID3v2 标签中的文本帧，返回音频数据的起始偏移
+
+    逐帧读取帧头，只读取需要的文本帧内容，封面等大帧直接跳过。
+    """
+    header = reader.read(0, 10)
+    major = header[3]
+    flags = header[5]
+    end = 10 + _syncsafe(header[6:10]) + (10 if flags & 0x10 else 0)
+
+    offset = 10
+    if flags & 0x40 and major >= 3:
+        size_bytes = reader.read(offset, 4)
+        offset += _syncsafe(size_bytes) if major == 4 else 4 + struct.unpack('>I', size_bytes)[0]
+
+    id_length, header_length = (3, 6) if major == 2 else (4, 10)
+    while offset + header_length <= end:
+        frame = reader.read(offset, header_length)
+        frame_id = frame[:id_length]
+        if not frame_id.strip(b'\x00'):
+            break  # 填充区
+        if major == 2:
+            size = int.from_bytes(frame[3:6], 'big')
+        elif major == 4:
+            size = _syncsafe(frame[4:8])
+        else:
+            size = struct.unpack('>I', frame[4:8])[0]
+
+        field = ID3_TEXT_FRAMES.get(frame_id)
+        if field and 1 < size <= 4096:
+            payload = reader.read(offset + header_length, size)
+            encoding = ID3_ENCODINGS[payload[0]] if payload[0] < len(ID3_ENCODINGS) else 'latin-1'
+            setattr(meta, field, _text(payload[1:], encoding))
+        offset += header_length + size
+    return end
+
+
+def _mpeg_header(data, offset):
+    """解析 offset 处的MPEG音频帧头，不是合法帧头时返回 None"""
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version = MPEG_VERSIONS.get((b1 >> 3) & 3)
+    layer = MPEG_LAYERS.get((b1 >> 1) & 3)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[rate_index] // {1: 1, 2: 2, 2.5: 4}[version]
+    samples = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+    padding = (b2 >> 1) & 1
+    length = samples // 8 * bitrate // sample_rate + padding * (4 if layer == 1 else 1)
+    return {
+        'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+        'samples': samples, 'length': length, 'channels': 1 if b3 >> 6 == 3 else 2
+    }
+
+
+def parse_mpeg(reader, meta, start, size):
+    """
+    在 start 之后查找第一个MPEG音频帧（需与下一帧头一致才认可），
+    有 Xing/Info 或 VBRI 头时按总帧数计算时长，否则按固定码率估算
+    """
+    data = reader.read(start, 16 * 1024)
+    for offset in range(len(data) - 4):
+        frame = _mpeg_header(data, offset)
+        if frame is None or frame['length'] < 24:
+            continue
+        following = _mpeg_header(data, offset + frame['length'])
+        if following is None and offset + frame['length'] + 4 <= len(data):
+            continue
+        if following is not None and (following['version'], following['layer']) != (frame['version'], frame['layer']):
+            continue
+        break
+    else:
+        raise MetadataError("未找到MPEG音频帧")
+
+    meta.codec = f"mp{frame['layer']}"
+    meta.sample_rate = frame['sample_rate']
+    meta.channels = frame['channels']
+    audio_bytes = size - start - offset
+
+    side_info = (32 if frame['channels'] == 2 else 17) if frame['version'] == 1 else (17 if frame['channels'] == 2 else 9)
+    xing = data[offset + 4 + side_info:offset + 4 + side_info + 16]
+    vbri = data[offset + 36:offset + 36 + 18]
+    frames = None
+    if xing[:4] in (b'Xing', b'Info'):
+        xing_flags = struct.unpack('>I', xing[4:8])[0]
+        if xing_flags & 1:
+            frames = struct.unpack('>I', xing[8:12])[0]
+            if xing_flags & 2:
+                audio_bytes = struct.unpack('>I', xing[12:16])[0]
+    elif vbri[:4] == b'VBRI':
+        audio_bytes, frames = struct.unpack('>II', vbri[10:18])
+
+    if frames:
+        meta.duration = frames * frame['samples'] / frame['sample_rate']
+        meta.bitrate = int(audio_bytes * 8 / meta.duration / 1000) if meta.duration else None
+    else:
+        meta.bitrate = frame['bitrate'] // 1000
+        meta.duration = audio_bytes * 8 / frame['bitrate']
+
+
+def parse_adts(reader, meta, start, size):
+    """AAC ADTS 流：按头部若干帧的平均长度估算码率和时长"""
+    data = reader.read(start, 16 * 1024)
+    offset = 0
+    frames = 0
+    frame_bytes = 0
+    sample_rate = None
+    while offset + 7 <= len(data) and data[offset] == 0xFF and data[offset + 1] & 0xF6 == 0xF0:
+        rate_index = (data[offset + 2] >> 2) & 0xF
+        if rate_index >= len(ADTS_SAMPLE_RATES):
+            break
+        sample_rate = ADTS_SAMPLE_RATES[rate_index]
+        meta.channels = ((data[offset + 2] & 1) << 2) | (data[offset + 3] >> 6)
+        length = ((data[offset + 3] & 3) << 11) | (data[offset + 4] << 3) | (data[offset + 5] >> 5)
+        if length < 7:
+            break
+        frames += 1
+        frame_bytes += length
+        offset += length
+    if not frames:
+        raise MetadataError("ADTS帧头无效")
+
+    meta.codec = 'aac'
+    meta.sample_rate = sample_rate
+    bitrate = frame_bytes * 8 / (frames * 1024 / sample_rate)
+    meta.bitrate = int(bitrate / 1000)
+    meta.duration = (size - start) * 8 / bitrate
+
+
+def parse_flac(reader, meta, start, size):
+    """FLAC：STREAMINFO 给出采样率、声道与总采样数，VORBIS_COMMENT 给出标签"""
+    offset = start + 4
+    while True:
+        header = reader.read(offset, 4)
+        if len(header) < 4:
+            raise MetadataError("FLAC元数据块被截断")
+        last = header[0] & 0x80
+        block_type = header[0] & 0x7F
+        length = int.from_bytes(header[1:4], 'big')
+        if block_type == 0:
+            info = reader.read(offset + 4, 34)
+            packed = int.from_bytes(info[10:18], 'big')
+            meta.sample_rate = packed >> 44
+            meta.channels = ((packed >> 41) & 7) + 1
+            total_samples = packed & 0xFFFFFFFFF
+            if meta.sample_rate and total_samples:
+                meta.duration = total_samples / meta.sample_rate
+        elif block_type == 4 and length <= 64 * 1024:
+            parse_vorbis_comments(reader.read(offset + 4, length), meta)
+        offset += 4 + length
+        if last:
+            break
+
+    meta.codec = 'flac'
+    if meta.duration:
+        meta.bitrate = int((size - offset) * 8 / meta.duration / 1000)
+
+
+def parse_wav(reader, meta, size):
+    """WAV：fmt 块给出编码与字节率，data 块大小换算时长，LIST/INFO 块给出标签"""
+    offset = 12
+    byte_rate = None
+    for _ in range(MAX_CHUNKS):
+        header = reader.read(offset, 8)
+        if len(header) < 8:
+            break
+        chunk_id, length = header[:4], struct.unpack('<I', header[4:8])[0]
+        if chunk_id == b'fmt ':
+            fmt = reader.read(offset + 8, 16)
+            tag, channels, sample_rate, byte_rate = struct.unpack('<HHII', fmt[:12])
+            meta.codec = WAV_CODECS.get(tag, f"wav_0x{tag:04x}")
+            meta.channels = channels
+            meta.sample_rate = sample_rate
+            meta.bitrate = byte_rate * 8 // 1000
+        elif chunk_id == b'data' and byte_rate:
+            data_bytes = min(length, size - offset - 8)
+            meta.duration = data_bytes / byte_rate
+        elif chunk_id == b'LIST' and length <= 64 * 1024:
+            info = reader.read(offset + 8, length)
+            if info[:4] == b'INFO':
+                position = 4
+                while position + 8 <= len(info):
+                    sub_id, sub_length = info[position:position + 4], struct.unpack('<I', info[position + 4:position + 8])[0]
+                    field = RIFF_INFO_FIELDS.get(sub_id)
+                    if field:
+                        setattr(meta, field, _text(info[position + 8:position + 8 + sub_length], 'latin-1'))
+                    position += 8 + sub_length + (sub_length & 1)
+        offset += 8 + length + (length & 1)
+    if meta.codec is None:
+        raise MetadataError("WAV缺少fmt块")
+
+
+def _mp4_boxes(reader, start, end):
+    """遍历 [start, end) 范围内的MP4盒子，产生 (类型, 内容起点, 盒子终点)"""
+    offset = start
+    while offset + 8 <= end:
+        header = reader.read(offset, 16)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack('>I4s', header[:8])
+        header_length = 8
+        if size == 1:
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_length = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_length:
+            raise MetadataError("MP4盒子长度无效")
+        yield kind, offset + header_length, min(offset + size, end)
+        offset += size
+
+
+def _mp4_child(reader, start, end, *path):
+    """沿路径查找子盒子，返回 (内容起点, 终点) 或 None"""
+    for kind in path:
+        for child, child_start, child_end in _mp4_boxes(reader, start, end):
+            if child == kind:
+                start, end = child_start, child_end
+                break
+        else:
+            return None
+    return start, end
+
+
+def parse_mp4(reader, meta, size):
+    """
+    MP4/M4A：逐个读取顶层盒子头找到 moov（可能在 mdat 之后），
+    只读取 mvhd、音频轨的 stsd 与 ilst 标签，跳过采样表等大盒子
+    """
+    moov = _mp4_child(reader, 0, size, b'moov')
+    if moov is None:
+        raise MetadataError("未找到moov")
+
+    for kind, start, end in _mp4_boxes(reader, *moov):
+        if kind == b'mvhd':
+            data = reader.read(start, 32)
+            if data[0] == 1:
+                timescale, duration = struct.unpack('>IQ', data[20:32])
+            else:
+                timescale, duration = struct.unpack('>II', data[12:20])
+            if timescale:
+                meta.duration = duration / timescale
+        elif kind == b'trak' and meta.codec is None:
+            media = _mp4_child(reader, start, end, b'mdia')
+            handler = media and _mp4_child(reader, *media, b'hdlr')
+            if not handler or reader.read(handler[0] + 8, 4) != b'soun':
+                continue
+            stsd = _mp4_child(reader, *media, b'minf', b'stbl', b'stsd')
+            if stsd:
+                entry = reader.read(stsd[0] + 8, 36)
+                meta.codec = MP4_CODECS.get(entry[4:8], entry[4:8].decode('latin-1').strip())
+                meta.channels = struct.unpack('>H', entry[24:26])[0]
+                meta.sample_rate = struct.unpack('>I', entry[32:36])[0] >> 16
+        elif kind == b'udta':
+            ilst = _mp4_child(reader, start, end, b'meta')
+            if ilst:
+                # meta 是 FullBox，子盒子前有4字节版本与标志
+                ilst = _mp4_child(reader, ilst[0] + 4, ilst[1], b'ilst')
+            if ilst:
+                for tag, tag_start, tag_end in _mp4_boxes(reader, *ilst):
+                    field = MP4_TAG_FIELDS.get(tag)
+                    data = field and _mp4_child(reader, tag_start, tag_end, b'data')
+                    if data and data[1] - data[0] <= 4096:
+                        setattr(meta, field, _text(reader.read(data[0] + 8, data[1] - data[0] - 8)))
+
+    if meta.duration:
+        meta.bitrate = int(size * 8 / meta.duration / 1000)
+
+
+def parse_ogg(reader, meta, size):
+    """Ogg Vorbis/Opus：首页的标识头与注释头，末页的 granule 位置即总采样数"""
+    head = reader.read(0, 8 * 1024)
+    preskip = 0
+    if b'\x01vorbis' in head:
+        position = head.index(b'\x01vorbis') + 7
+        meta.codec = 'vorbis'
+        meta.channels = head[position + 4]
+        meta.sample_rate = struct.unpack('<I', head[position + 5:position + 9])[0]
+        granule_rate = meta.sample_rate
+        comments = head.find(b'\x03vorbis')
+        if comments >= 0:
+            parse_vorbis_comments(head[comments + 7:], meta)
+    elif b'OpusHead' in head:
+        position = head.index(b'OpusHead') + 8
+        meta.codec = 'opus'
+        meta.channels = head[position + 1]
+        preskip = struct.unpack('<H', head[position + 2:position + 4])[0]
+        meta.sample_rate = struct.unpack('<I', head[position + 4:position + 8])[0] or 48000
+        granule_rate = 48000
+        comments = head.find(b'OpusTags')
+        if comments >= 0:
+            parse_vorbis_comments(head[comments + 8:], meta)
+    else:
+        raise MetadataError("不支持的Ogg编码")
+
+    tail = reader.read(size - OGG_TAIL_BYTES, OGG_TAIL_BYTES)
+    last_page = tail.rfind(b'OggS')
+    if last_page >= 0 and last_page + 14 <= len(tail):
+        granule = struct.unpack('<q', tail[last_page + 6:last_page + 14])[0]
+        if granule > preskip:
+            meta.duration = (granule - preskip) / granule_rate
+            meta.bitrate = int(size * 8 / meta.duration / 1000)
+
+
+def parse_asf(reader, meta):
+    """WMA（ASF）：文件属性对象给出播放时长，内容描述对象给出标题与作者"""
+    header = reader.read(0, 30)
+    header_size = struct.unpack('<Q', header[16:24])[0]
+    offset = 30
+    while offset + 24 <= header_size:
+        guid, length = reader.read(offset, 16), struct.unpack('<Q', reader.read(offset + 16, 8))[0]
+        if length < 24:
+            break
+        if guid == ASF_FILE_PROPERTIES:
+            data = reader.read(offset + 24, 80)
+            play_duration, _, preroll = struct.unpack('<QQQ', data[40:64])
+            meta.duration = max(0.0, play_duration / 10 ** 7 - preroll / 1000)
+            meta.bitrate = struct.unpack('<I', data[76:80])[0] // 1000 or None
+        elif guid == ASF_CONTENT_DESCRIPTION and length <= 64 * 1024:
+            data = reader.read(offset + 24, length - 24)
+            lengths = struct.unpack('<HHHHH', data[:10])
+            position = 10
+            for field, field_length in zip(('title', 'artist'), lengths[:2]):
+                setattr(meta, field, _text(data[position:position + field_length], 'utf-16-le'))
+                position += field_length
+        offset += length
+    meta.codec = 'wma'
+
+
+def extract_metadata(reader, size):
+    """
+    按文件头部的魔数识别格式并解析
+
+    Args:
+        reader: RangeReader
+        size: 对象大小（来自列举结果）
+
+    Returns:
+        AudioMetadata（解析失败时 error 字段为原因）
+    """
+    meta = AudioMetadata()
+    try:
+        head = reader.read(0, 16)
+        start = 0
+        if head[:3] == b'ID3':
+            start = parse_id3(reader, meta)
+            head = reader.read(start, 16)
+
+        if head[:4] == b'fLaC':
+            parse_flac(reader, meta, start, size)
+        elif start == 0 and head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+            parse_wav(reader, meta, size)
+        elif start == 0 and head[4:8] == b'ftyp':
+            parse_mp4(reader, meta, size)
+        elif start == 0 and head[:4] == b'OggS':
+            parse_ogg(reader, meta, size)
+        elif start == 0 and head[:16] == ASF_HEADER:
+            parse_asf(reader, meta)
+        elif len(head) >= 2 and head[0] == 0xFF and head[1] & 0xF6 == 0xF0:
+            parse_adts(reader, meta, start, size)
+        elif len(head) >= 4:
+            parse_mpeg(reader, meta, start, size)
+        else:
+            raise MetadataError("文件过短")
+    except MetadataError as e:
+        meta.error = str(e)
+    except (struct.error, IndexError, ValueError, ZeroDivisionError) as e:
+        meta.error = f"头部数据无效: {e}"
+    return meta
+
+
+class MetadataExtractor:
+    """
+    并发提取一批音频文件的元数据
+
+    所有线程共用一个 requests.Session（连接池大小等于并发数，保持长连接），
+    在途请求数不超过 concurrency*2，结果按批交给回调（写入快照与刷新进度）。
+    网络错误作为失败返回，下次重试；格式无法解析时记录在结果中，不再重复读取。
+    """
+
+    def __init__(self, session=None, concurrency=DEFAULT_METADATA_CONCURRENCY, block_size=BLOCK_SIZE):
+        self.concurrency = max(1, int(concurrency or 1))
+        self.session = session or create_session(self.concurrency)
+        self.block_size = block_size
+        self.requests = 0
+        self.bytes_read = 0
+        self._lock = threading.Lock()
+
+    def extract(self, file_info):
+        """提取单个文件的元数据"""
+        reader = RangeReader(self.session, file_info.url, size=file_info.size, block_size=self.block_size)
+        try:
+            meta = extract_metadata(reader, file_info.size)
+        finally:
+            with self._lock:
+                self.requests += reader.requests
+                self.bytes_read += reader.bytes_read
+        meta.etag = file_info.etag
+        meta.size = file_info.size
+        logger.debug("元数据 %s: %s（%d 次请求，%d 字节）", file_info.key, meta, reader.requests, reader.bytes_read)
+        return meta
+
+    def run(self, files, on_results, should_stop=None):
+        """
+        并发提取
+
+        Args:
+            files: 文件记录列表
+            on_results: on_results([(file_info, AudioMetadata), ...]) 每批结果回调
+            should_stop: 可选的 should_stop()（如 JobProgress.checkpoint），可阻塞（暂停），返回 True 时停止提交
+
+        Returns:
+            list: 网络失败的 [(file_info, 错误信息), ...]
+        """
+        errors = run_bounded(self.extract, files, on_results, self.concurrency, should_stop=should_stop,
+                             thread_name_prefix="metadata")
+        for file_info, e in errors:
+            logger.warning("读取元数据失败 %s: %s", file_info.key, e)
+        return [(file_info, str(e)) for file_info, e in errors]
+
+    def close(self):
+        """关闭会话的连接池"""
+        self.session.close()
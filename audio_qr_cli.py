@@ -0,0 +1,633 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频二维码管理 - 命令行入口（无需图形界面）
+功能: 在无显示器的构建服务器上列举COS音频文件、生成二维码
+
+用法:
+    python audio_qr_cli.py list [--json] [--all-sources]
+    python audio_qr_cli.py generate [--mode wechat] [--output ./qr_codes] [--force] [--dedup canonical] [--verify]
+    python audio_qr_cli.py sync [--mode wechat] [--output ./qr_codes] [--force] [--dedup group] [--verify] [--stream | --all-sources]
+    python audio_qr_cli.py resume [--output ./qr_codes]
+    python audio_qr_cli.py metadata [--force] [--json]
+    python audio_qr_cli.py verify [--mode wechat] [--prefix 专辑A/] [--rate 20] [--force] [--json]
+    python audio_qr_cli.py upload ./audio [--prefix 专辑/] [--mode wechat] [--no-qr]
+    python audio_qr_cli.py export qr_codes.zip|sheets.pdf|sheets.png [--mode wechat] [--columns 4 --rows 5]
+    python audio_qr_cli.py serve [--host 127.0.0.1] [--port 8765] [--mode wechat]
+    python audio_qr_cli.py watch [--prefix 专辑A/] [--interval 5] [--max-interval 120] [--mode wechat]
+    python audio_qr_cli.py --metrics metrics.prom --trace run.trace.json sync
+
+--metrics 在命令结束时导出分阶段耗时（.prom 为Prometheus文本，其余为JSON），
+--trace 记录Chrome跟踪文件（chrome://tracing 或 Perfetto 打开）。
+
+密钥可通过环境变量 COS_SECRET_ID / COS_SECRET_KEY 提供，优先于 config.json。
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+
+import audio_qr_core as core
+from app_logging import setup_logging
+from app_metrics import get_metrics
+
+
+def build_parser():
+    """构造命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog="audio-qr", description="音频二维码管理命令行工具")
+    parser.add_argument("--config", default=core.CONFIG_PATH, help="配置文件路径（默认: config.json）")
+    parser.add_argument("--bucket", help="存储桶名称（覆盖配置文件）")
+    parser.add_argument("--region", help="地域（覆盖配置文件）")
+    parser.add_argument("--concurrency", type=int, help="列举并发数（覆盖配置文件）")
+    parser.add_argument("--log-level", help="日志级别 TRACE/DEBUG/INFO/WARNING（覆盖配置文件）")
+    parser.add_argument("--metrics", metavar="PATH", help="结束时导出分阶段耗时与计数（.prom 为Prometheus文本，其余为JSON）")
+    parser.add_argument("--trace", metavar="PATH", help="记录Chrome跟踪文件（如 run.trace.json）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="列举存储桶中的音频文件并更新本地快照")
+    list_parser.add_argument("--json", action="store_true", help="以JSON Lines格式输出")
+    list_parser.add_argument("--all-sources", action="store_true",
+                             help="并发列举配置中 sources 的全部存储桶，输出带来源名称")
+
+    for name, help_text in (("generate", "根据本地快照生成二维码（不访问COS）"),
+                            ("sync", "列举存储桶、更新本地快照并生成新增或变化的二维码")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("--mode", choices=core.QR_MODES, default=core.DEFAULT_QR_MODE, help="二维码生成方式")
+        sub.add_argument("--output", help="输出目录（覆盖配置文件）")
+        sub.add_argument("--workers", type=int, help="渲染进程数（覆盖配置文件）")
+        sub.add_argument("--force", action="store_true", help="忽略生成清单，全部重新生成")
+        sub.add_argument("--dedup", choices=core.DEDUP_MODES,
+                         help="内容相同（ETag与大小一致）的音频：group 每组只生成一个，canonical 都指向同一地址（覆盖配置文件）")
+        sub.add_argument("--all-sources", action="store_true",
+                         help="在一个批次中处理配置中 sources 的全部存储桶，二维码写入 输出目录/来源名称/")
+        sub.add_argument("--verify", action="store_true",
+                         help="生成后检查音频地址与播放页面能否公开访问，有无法访问的地址时返回非零")
+        if name == "sync":
+            sub.add_argument("--stream", action="store_true",
+                             help="边列举边生成，不等待完整列举（不检测已删除的对象，不合并重复内容）")
+
+    resume_parser = subparsers.add_parser("resume", help="继续输出目录中未完成的批量任务（图形界面或命令行中断的任务）")
+    resume_parser.add_argument("--output", help="输出目录（覆盖配置文件）")
+    resume_parser.add_argument("--workers", type=int, help="渲染进程数（覆盖配置文件）")
+
+    metadata_parser = subparsers.add_parser("metadata", help="用Range请求读取本地快照中音频文件的头部，提取时长、码率与标签")
+    metadata_parser.add_argument("--threads", type=int, help="并发请求数（覆盖配置文件）")
+    metadata_parser.add_argument("--force", action="store_true", help="忽略已保存的元数据，全部重新读取")
+    metadata_parser.add_argument("--json", action="store_true", help="完成后以JSON Lines格式输出文件与元数据")
+
+    verify_parser = subparsers.add_parser("verify", help="用HEAD请求检查快照中文件的音频地址与二维码指向的播放页面能否公开访问")
+    verify_parser.add_argument("--mode", choices=core.QR_MODES, default=core.DEFAULT_QR_MODE, help="二维码生成方式")
+    verify_parser.add_argument("--prefix", default="", help="只检查对象键以此开头的文件")
+    verify_parser.add_argument("--threads", type=int, help="并发请求数（覆盖配置文件）")
+    verify_parser.add_argument("--rate", type=float, help="每个主机每秒的请求数上限（覆盖配置文件）")
+    verify_parser.add_argument("--force", action="store_true", help="忽略已保存的检查结果，全部重新检查")
+    verify_parser.add_argument("--json", action="store_true", help="以JSON Lines格式输出每个文件的检查结果")
+
+    upload_parser = subparsers.add_parser("upload", help="上传本地文件夹中新增或变化的音频文件，并直接生成二维码")
+    upload_parser.add_argument("directory", help="本地文件夹")
+    upload_parser.add_argument("--prefix", default="", help="上传到的对象键前缀（目录）")
+    upload_parser.add_argument("--mode", choices=core.QR_MODES, default=core.DEFAULT_QR_MODE, help="二维码生成方式")
+    upload_parser.add_argument("--output", help="输出目录（覆盖配置文件）")
+    upload_parser.add_argument("--workers", type=int, help="渲染进程数（覆盖配置文件）")
+    upload_parser.add_argument("--threads", type=int, help="并发上传数（覆盖配置文件）")
+    upload_parser.add_argument("--force", action="store_true", help="忽略生成清单，重新生成这些文件的二维码")
+    upload_parser.add_argument("--no-qr", action="store_true", help="只上传并写入本地快照，不生成二维码")
+
+    export_parser = subparsers.add_parser("export", help="把本地快照中文件的二维码直接导出为ZIP压缩包或可打印的PDF/PNG页面")
+    export_parser.add_argument("path", help="导出文件（.zip / .pdf / .png，PNG页面按序号保存为多个文件）")
+    export_parser.add_argument("--format", choices=("zip", "pdf", "png"), help="导出格式（默认按扩展名判断）")
+    export_parser.add_argument("--mode", choices=core.QR_MODES, default=core.DEFAULT_QR_MODE, help="二维码生成方式")
+    export_parser.add_argument("--prefix", default="", help="只导出对象键以此开头的文件")
+    export_parser.add_argument("--workers", type=int, help="渲染进程数（覆盖配置文件）")
+    export_parser.add_argument("--page", help="打印页纸张 A4/A3/A5/Letter（覆盖配置文件）")
+    export_parser.add_argument("--columns", type=int, help="打印页每行二维码数（覆盖配置文件）")
+    export_parser.add_argument("--rows", type=int, help="打印页每列二维码数（覆盖配置文件）")
+    export_parser.add_argument("--dpi", type=int, help="打印页分辨率（覆盖配置文件）")
+
+    serve_parser = subparsers.add_parser("serve", help="启动HTTP服务，按需返回二维码: GET /qr/<对象键>.png?mode=wechat")
+    serve_parser.add_argument("--host", help="监听地址（覆盖配置文件）")
+    serve_parser.add_argument("--port", type=int, help="监听端口（覆盖配置文件）")
+    serve_parser.add_argument("--mode", choices=core.QR_MODES, default=core.DEFAULT_QR_MODE,
+                              help="请求未指定 mode 时的生成方式")
+    serve_parser.add_argument("--workers", type=int, help="渲染进程数（覆盖配置文件）")
+    serve_parser.add_argument("--max-age", type=int, help="Cache-Control 的 max-age 秒数（覆盖配置文件）")
+
+    watch_parser = subparsers.add_parser("watch", help="持续监视存储桶，为新上传或变化的音频自动生成二维码（Ctrl+C 停止）")
+    watch_parser.add_argument("--prefix", action="append", dest="watch_prefixes", metavar="PREFIX",
+                              help="只监视该前缀，可重复指定（默认按顶层目录自动分区，覆盖配置文件）")
+    watch_parser.add_argument("--mode", choices=core.QR_MODES, default=core.DEFAULT_QR_MODE, help="二维码生成方式")
+    watch_parser.add_argument("--output", help="输出目录（覆盖配置文件）")
+    watch_parser.add_argument("--workers", type=int, help="渲染进程数（覆盖配置文件）")
+    watch_parser.add_argument("--interval", type=float, help="活跃分区的轮询间隔秒数（覆盖配置文件）")
+    watch_parser.add_argument("--max-interval", type=float, help="空闲分区退避的最长间隔秒数（覆盖配置文件）")
+
+    return parser
+
+
+def resolve_config(args):
+    """合并配置文件、环境变量和命令行参数（命令行显式给出的 0 也会覆盖配置，如 --port 0、--rate 0）"""
+    config = core.load_config(args.config)
+    config['secret_id'] = os.environ.get("COS_SECRET_ID", config['secret_id'])
+    config['secret_key'] = os.environ.get("COS_SECRET_KEY", config['secret_key'])
+    if args.bucket is not None:
+        config['bucket_name'] = args.bucket
+    if args.region is not None:
+        config['region'] = args.region
+    if args.concurrency is not None:
+        config['list_concurrency'] = args.concurrency
+    if args.log_level is not None:
+        config['log_level'] = args.log_level
+    if getattr(args, 'output', None) is not None:
+        config['output_dir'] = args.output
+    if getattr(args, 'workers', None) is not None:
+        config['qr_workers'] = args.workers
+    if getattr(args, 'threads', None) is not None:
+        config['metadata_concurrency'] = args.threads
+        config['upload_concurrency'] = args.threads
+        config['verify_concurrency'] = args.threads
+    for option, key in (('page', 'sheet_page'), ('columns', 'sheet_columns'),
+                        ('rows', 'sheet_rows'), ('dpi', 'sheet_dpi'),
+                        ('host', 'serve_host'), ('port', 'serve_port'), ('max_age', 'serve_max_age'),
+                        ('watch_prefixes', 'watch_prefixes'), ('interval', 'watch_interval'),
+                        ('max_interval', 'watch_max_interval'), ('dedup', 'qr_dedup'), ('rate', 'verify_rate')):
+        if getattr(args, option, None) is not None:
+            config[key] = getattr(args, option)
+    return config
+
+
+def refresh_catalog(config, catalog):
+    """列举存储桶并写入本地快照，返回最新文件列表"""
+    check_credentials(config)
+
+    client = core.create_cos_client(config['secret_id'], config['secret_key'],
+                                    config['region'], config['list_concurrency'])
+    files, scanned = core.list_audio_files(client, config['bucket_name'], config['region'],
+                                           concurrency=config['list_concurrency'],
+                                           shards=config['list_shards'])
+    diff = catalog.apply_snapshot(config['bucket_name'], files)
+    print(f"扫描完成: 总文件数 {scanned}, 音频文件数 {len(files)}, "
+          f"新增 {len(diff['added'])}, 变更 {len(diff['changed'])}, 删除 {len(diff['deleted'])}",
+          file=sys.stderr)
+    return files
+
+
+def refresh_sources(config, catalog):
+    """并发列举配置中的全部来源并写入本地快照，返回 (合并后的文件列表, SourceCatalog)"""
+    check_credentials(config)
+
+    view = core.SourceCatalog(catalog, core.load_sources(config))
+    pool = core.create_client_pool(config['secret_id'], config['secret_key'], config['list_concurrency'])
+    files, results = view.refresh(pool, concurrency=config['list_concurrency'])
+    for result in results:
+        name = f"{result['source'].name} ({result['source'].region})"
+        if result['error']:
+            print(f"{name}: 列举失败，使用上次的快照: {result['error']}", file=sys.stderr)
+        else:
+            print(f"{name}: 扫描 {result['scanned']}, 新增 {result['added']}, "
+                  f"变更 {result['changed']}, 删除 {result['deleted']}", file=sys.stderr)
+    print(f"共 {len(view.sources)} 个存储桶，{len(pool)} 个地域客户端，音频文件 {len(files)} 个", file=sys.stderr)
+    return files, view
+
+
+def generate_sources(config, args, catalog, files, view):
+    """在一个批次中为多个来源的文件生成二维码并输出汇总"""
+    from job_progress import JobProgress
+    from qr_engine import QRBatchEngine
+
+    progress = JobProgress(len(files))
+
+    def on_progress(done, total, completed):
+        progress.update(done)
+        print(f"\r生成进度: {progress.describe()}    ", end="", file=sys.stderr, flush=True)
+
+    short_ids = None
+    if args.mode == "short":
+        short_ids = core.prepare_short_ids(catalog, files, config['short_id_dir'])
+
+    engine = QRBatchEngine(workers=config['qr_workers'], settings=core.render_settings(config),
+                           cache=core.create_render_cache(config))
+    try:
+        failures, skipped = core.generate_source_qr_codes(
+            view, files, args.mode, config['output_dir'], engine=engine, force=args.force,
+            on_progress=on_progress, short_ids=short_ids, on_skipped=lambda skipped: progress.skip(len(skipped)),
+            dedup=config['qr_dedup'])
+    finally:
+        engine.shutdown()
+
+    print(file=sys.stderr)
+    for index, error in failures:
+        print(f"失败: {view.source_of(files[index]).name}: {files[index].key}: {error}", file=sys.stderr)
+    print(f"生成 {progress.done - len(skipped) - len(failures)}，跳过 {len(skipped)}，失败 {len(failures)}",
+          file=sys.stderr)
+    return 1 if failures else 0
+
+
+def check_credentials(config):
+    """缺少密钥时退出"""
+    if not config['secret_id'] or not config['secret_key']:
+        raise SystemExit("错误: 缺少SecretId/SecretKey，请在config.json或环境变量中配置")
+
+
+def stream_sync(config, args, catalog):
+    """边列举边生成二维码并输出汇总"""
+    from qr_engine import QRBatchEngine
+
+    check_credentials(config)
+
+    def on_progress(done, total, scanned):
+        print(f"\r已扫描 {scanned}, 生成进度: {done}/{total}", end="", file=sys.stderr, flush=True)
+
+    client = core.create_cos_client(config['secret_id'], config['secret_key'],
+                                    config['region'], config['list_concurrency'])
+    engine = QRBatchEngine(workers=config['qr_workers'], settings=core.render_settings(config),
+                           cache=core.create_render_cache(config))
+    try:
+        pipeline = core.create_stream_pipeline(
+            client, config['bucket_name'], config['region'], args.mode, config['output_dir'], engine,
+            catalog=catalog, force=args.force, concurrency=config['list_concurrency'],
+            shards=config['list_shards'], short_id_dir=config['short_id_dir'], on_progress=on_progress)
+        summary = pipeline.run()
+    finally:
+        engine.shutdown()
+
+    print(file=sys.stderr)
+    for key, error in summary['failures']:
+        print(f"失败: {key}: {error}", file=sys.stderr)
+    first = summary['first_result_seconds']
+    print(f"扫描 {summary['scanned']}，音频 {summary['listed']}，生成 {summary['generated']}，"
+          f"跳过 {summary['skipped']}，失败 {len(summary['failures'])}，"
+          f"首个二维码 {f'{first:.2f}s' if first is not None else '-'}，总用时 {summary['seconds']:.1f}s",
+          file=sys.stderr)
+    if engine.cache is not None:
+        print(engine.cache.summary(), file=sys.stderr)
+    return 1 if summary['failures'] else 0
+
+
+def generate(config, files, catalog, job, resume=False):
+    """执行（或继续）批量生成任务并输出汇总"""
+    from job_progress import JobProgress
+    from qr_engine import QRBatchEngine
+
+    progress = JobProgress(len(files))
+
+    def on_progress(done, total, completed):
+        progress.update(done)
+        print(f"\r生成进度: {progress.describe()}    ", end="", file=sys.stderr, flush=True)
+
+    short_ids = None
+    if job.mode == "short":
+        short_ids = core.prepare_short_ids(catalog, files, config['short_id_dir'])
+        print(f"短ID映射已导出到 {config['short_id_dir']}", file=sys.stderr)
+
+    engine = QRBatchEngine(workers=config['qr_workers'], settings=core.render_settings(config),
+                           cache=core.create_render_cache(config))
+    try:
+        failures, skipped, finished = core.run_batch_job(
+            job, files, engine=engine, short_ids=short_ids, resume=resume, on_progress=on_progress,
+            on_skipped=lambda skipped: progress.skip(len(skipped)))
+    finally:
+        engine.shutdown()
+
+    print(file=sys.stderr)
+    for index, error in failures:
+        print(f"失败: {files[index].key}: {error}", file=sys.stderr)
+    print(f"生成 {progress.done - len(skipped) - len(failures)}，跳过 {len(skipped)}，失败 {len(failures)}",
+          file=sys.stderr)
+    if not finished:
+        print("任务未完成，可运行 resume 继续", file=sys.stderr)
+    if engine.cache is not None:
+        print(engine.cache.summary(), file=sys.stderr)
+    return 1 if failures or not finished else 0
+
+
+def resume_job(config, catalog):
+    """继续输出目录中未完成的批量任务"""
+    from batch_job import BatchJob
+
+    job = BatchJob.load(config['output_dir'])
+    if job is None:
+        print(f"{config['output_dir']} 中没有未完成的任务", file=sys.stderr)
+        return 0
+    files = job.select_files(catalog.load(job.bucket))
+    print(f"继续任务: {job.describe()}，共 {len(files)} 个文件", file=sys.stderr)
+    return generate(config, files, catalog, job, resume=True)
+
+
+def extract_metadata(config, args, catalog):
+    """读取快照中音频文件的元数据并输出汇总"""
+    from job_progress import JobProgress
+
+    bucket = config['bucket_name']
+    files = catalog.load(bucket)
+    if not files:
+        print("本地快照为空，请先运行 list 或 sync", file=sys.stderr)
+        return 1
+
+    progress = JobProgress()
+
+    def on_progress(done, total):
+        progress.update(done, total=total)
+        print(f"\r读取元数据: {progress.describe()}    ", end="", file=sys.stderr, flush=True)
+
+    summary = core.extract_audio_metadata(catalog, bucket, files, concurrency=config['metadata_concurrency'],
+                                          force=args.force, on_progress=on_progress)
+    print(file=sys.stderr)
+    for key, error in summary['failures']:
+        print(f"失败: {key}: {error}", file=sys.stderr)
+    print(f"读取 {summary['fetched']}，已有 {summary['skipped']}，失败 {len(summary['failures'])}，"
+          f"请求 {summary['requests']} 次，共 {summary['bytes'] / 1024 / 1024:.1f} MB", file=sys.stderr)
+
+    if args.json:
+        metadata = catalog.load_metadata(bucket)
+        for f in files:
+            meta = metadata.get(f.key)
+            print(json.dumps(dict(f.to_dict(), metadata=meta.to_dict() if meta else None), ensure_ascii=False))
+    return 1 if summary['failures'] else 0
+
+
+def verify(config, catalog, files, mode, force=False, as_json=False, view=None):
+    """检查文件的音频地址与播放页面能否公开访问并输出汇总，view 为多来源视图时输出带来源名称"""
+    from job_progress import JobProgress
+
+    short_ids = None
+    if mode == "short":
+        short_ids = core.prepare_short_ids(catalog, files, config['short_id_dir'])
+
+    progress = JobProgress()
+
+    def on_progress(done, total):
+        progress.update(done, total=total)
+        print(f"\r检查地址: {progress.describe()}    ", end="", file=sys.stderr, flush=True)
+
+    summary = core.verify_links(catalog, files, mode, short_ids=short_ids, concurrency=config['verify_concurrency'],
+                                rate=config['verify_rate'], ttl=config['verify_ttl'], force=force,
+                                on_progress=on_progress)
+    problems = summary['problems']
+    print(file=sys.stderr)
+
+    def name(f):
+        return f"{view.source_of(f).name}: {f.key}" if view is not None else f.key
+
+    for index, problem in problems.items():
+        print(f"无法访问: {name(files[index])}: {problem}", file=sys.stderr)
+    print(f"检查 {summary['checked']} 个地址，沿用 {summary['cached']} 个，"
+          f"{len(problems)} / {summary['total']} 个文件的二维码无法使用", file=sys.stderr)
+
+    if as_json:
+        for i, f in enumerate(files):
+            print(json.dumps(dict(f.to_dict(), problem=problems.get(i)), ensure_ascii=False))
+    return 1 if problems else 0
+
+
+def upload(config, args, catalog):
+    """上传本地文件夹，完成的文件直接写入快照并生成二维码"""
+    from cos_uploader import CosUploader
+    from job_progress import JobProgress
+    from qr_engine import QRBatchEngine
+
+    check_credentials(config)
+    if not os.path.isdir(args.directory):
+        print(f"文件夹不存在: {args.directory}", file=sys.stderr)
+        return 1
+
+    progress = JobProgress()
+
+    def on_upload_progress(done, total, uploaded_bytes):
+        progress.update(done, total=total)
+        print(f"\r上传进度: {progress.describe()}  已上传 {uploaded_bytes / 1024 / 1024:.1f} MB    ",
+              end="", file=sys.stderr, flush=True)
+
+    client = core.create_cos_client(config['secret_id'], config['secret_key'],
+                                    config['region'], config['upload_concurrency'])
+    part_size = int(config['upload_part_size_mb']) * 1024 * 1024
+    summary = None
+    if args.no_qr:
+        uploader = CosUploader(client, config['bucket_name'], config['region'], catalog, args.directory,
+                               prefix=args.prefix, concurrency=config['upload_concurrency'], part_size=part_size,
+                               on_progress=on_upload_progress)
+        uploader.run(emit=lambda files: catalog.upsert_files(config['bucket_name'], files))
+    else:
+        engine = QRBatchEngine(workers=config['qr_workers'], settings=core.render_settings(config),
+                               cache=core.create_render_cache(config))
+        try:
+            pipeline = core.create_upload_pipeline(
+                client, config['bucket_name'], config['region'], args.directory, args.mode,
+                config['output_dir'], engine, catalog, prefix=args.prefix, force=args.force,
+                concurrency=config['upload_concurrency'], part_size=part_size,
+                short_id_dir=config['short_id_dir'], on_upload_progress=on_upload_progress)
+            summary = pipeline.run()
+        finally:
+            engine.shutdown()
+        uploader = pipeline.lister
+
+    print(file=sys.stderr)
+    result = uploader.summary()
+    failures = result['failures'] + (summary['failures'] if summary else [])
+    for key, error in failures:
+        print(f"失败: {key}: {error}", file=sys.stderr)
+    print(f"上传 {result['uploaded']}，内容相同跳过 {result['skipped']}，"
+          f"共 {result['bytes'] / 1024 / 1024:.1f} MB", file=sys.stderr)
+    if summary:
+        print(f"二维码 生成 {summary['generated']}，未变化跳过 {summary['skipped']}", file=sys.stderr)
+    return 1 if failures or result['cancelled'] else 0
+
+
+def export(config, args, catalog):
+    """把快照中文件的二维码导出为压缩包或打印页"""
+    from job_progress import JobProgress
+    from qr_engine import QRBatchEngine
+
+    files = [f for f in catalog.load(config['bucket_name']) if f.key.startswith(args.prefix)]
+    if not files:
+        print("没有可导出的文件，请先运行 list 或 sync", file=sys.stderr)
+        return 1
+
+    short_ids = None
+    if args.mode == "short":
+        short_ids = core.prepare_short_ids(catalog, files, config['short_id_dir'])
+
+    progress = JobProgress(len(files))
+
+    def on_progress(done, total):
+        progress.update(done)
+        print(f"\r导出进度: {progress.describe()}    ", end="", file=sys.stderr, flush=True)
+
+    engine = QRBatchEngine(workers=config['qr_workers'], settings=core.render_settings(config),
+                           cache=core.create_render_cache(config))
+    try:
+        summary = core.export_qr_codes(files, args.mode, args.path, fmt=args.format, engine=engine,
+                                       short_ids=short_ids, layout=core.sheet_layout(config),
+                                       on_progress=on_progress)
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    finally:
+        engine.shutdown()
+
+    print(file=sys.stderr)
+    for name, error in summary['failures']:
+        print(f"失败: {name}: {error}", file=sys.stderr)
+    pages = f"，共 {summary['pages']} 页" if summary['pages'] else ""
+    print(f"已导出 {summary['exported']} 个二维码到 {args.path}{pages}，失败 {len(summary['failures'])}",
+          file=sys.stderr)
+    return 1 if summary['failures'] else 0
+
+
+def serve(config, args, catalog):
+    """运行按需生成二维码的HTTP服务，Ctrl+C 退出"""
+    from qr_engine import QRBatchEngine
+    from qr_server import QRServer
+
+    if not catalog.count(config['bucket_name']):
+        print("本地快照为空，请先运行 list 或 sync", file=sys.stderr)
+        return 1
+
+    engine = QRBatchEngine(workers=config['qr_workers'], settings=core.render_settings(config),
+                           cache=core.create_render_cache(config))
+    server = QRServer(catalog, config['bucket_name'], engine, mode=args.mode,
+                      max_age=int(config['serve_max_age']), short_id_dir=config['short_id_dir'],
+                      memory_bytes=int(config['qr_cache_memory_mb']) * 1024 * 1024)
+    print(f"二维码服务: http://{config['serve_host']}:{config['serve_port']}/qr/<对象键>.png?mode={args.mode}"
+          f"（运行统计 /health，Ctrl+C 退出）", file=sys.stderr)
+    try:
+        server.serve_forever(config['serve_host'], int(config['serve_port']))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.shutdown()
+    return 0
+
+
+def watch(config, args, catalog):
+    """持续监视存储桶并为变化的音频生成二维码，Ctrl+C 退出"""
+    from qr_engine import QRBatchEngine
+
+    check_credentials(config)
+
+    def on_changes(diff, failures):
+        for key, error in failures:
+            print(f"失败: {key}: {error}", file=sys.stderr)
+        print(f"新增 {len(diff['added'])}，变更 {len(diff['changed'])}，删除 {len(diff['deleted'])}，"
+              f"生成失败 {len(failures)}", file=sys.stderr)
+
+    client = core.create_cos_client(config['secret_id'], config['secret_key'],
+                                    config['region'], config['list_concurrency'])
+    engine = QRBatchEngine(workers=config['qr_workers'], settings=core.render_settings(config),
+                           cache=core.create_render_cache(config))
+    watcher = core.create_bucket_watcher(
+        client, config['bucket_name'], config['region'], args.mode, config['output_dir'], engine, catalog,
+        prefixes=config['watch_prefixes'], interval=config['watch_interval'],
+        max_interval=config['watch_max_interval'], concurrency=config['list_concurrency'],
+        short_id_dir=config['short_id_dir'], on_changes=on_changes)
+    scope = "、".join(config['watch_prefixes']) or "全部顶层目录"
+    print(f"正在监视 {config['bucket_name']}（{scope}），Ctrl+C 退出", file=sys.stderr)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    finally:
+        engine.shutdown()
+
+    summary = watcher.summary()
+    print(f"轮询 {summary['rounds']} 轮，扫描 {summary['scanned']} 个对象，新增 {summary['added']}，"
+          f"变更 {summary['changed']}，删除 {summary['deleted']}，生成失败 {len(summary['failures'])}",
+          file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    """命令行主函数"""
+    args = build_parser().parse_args(argv)
+    config = resolve_config(args)
+    setup_logging(config['log_level'])
+    metrics = get_metrics()
+    if args.trace:
+        metrics.start_trace()
+
+    from file_catalog import FileCatalog
+    catalog = FileCatalog()
+    try:
+        if args.command == "list" and args.all_sources:
+            files, view = refresh_sources(config, catalog)
+            for f in files:
+                source = view.source_of(f).name
+                if args.json:
+                    print(json.dumps(dict(f.to_dict(), source=source), ensure_ascii=False))
+                else:
+                    print(f"{source}\t{f.key}\t{f.size}\t{f.last_modified}")
+            return 0
+        if args.command == "list":
+            files = refresh_catalog(config, catalog)
+            for f in files:
+                if args.json:
+                    print(json.dumps(f.to_dict(), ensure_ascii=False))
+                else:
+                    print(f"{f.key}\t{f.size}\t{f.last_modified}")
+            return 0
+
+        if args.command == "upload":
+            return upload(config, args, catalog)
+        if args.command == "serve":
+            return serve(config, args, catalog)
+        if args.command == "watch":
+            return watch(config, args, catalog)
+        if args.command == "export":
+            return export(config, args, catalog)
+        if args.command == "metadata":
+            return extract_metadata(config, args, catalog)
+        if args.command == "verify":
+            files = [f for f in catalog.load(config['bucket_name']) if f.key.startswith(args.prefix)]
+            if not files:
+                print("没有可检查的文件，请先运行 list 或 sync", file=sys.stderr)
+                return 1
+            return verify(config, catalog, files, args.mode, force=args.force, as_json=args.json)
+        if args.command == "resume":
+            return resume_job(config, catalog)
+        if args.command == "sync" and args.stream:
+            if args.all_sources:
+                print("--stream 只支持单个存储桶", file=sys.stderr)
+                return 1
+            if args.verify:
+                print("--stream 不支持 --verify，可在完成后运行 verify 命令", file=sys.stderr)
+                return 1
+            return stream_sync(config, args, catalog)
+        if args.command in ("generate", "sync") and args.all_sources:
+            if args.command == "sync":
+                files, view = refresh_sources(config, catalog)
+            else:
+                view = core.SourceCatalog(catalog, core.load_sources(config))
+                files = view.load()
+            if not files:
+                print("本地快照为空，请先运行 list --all-sources 或 sync --all-sources", file=sys.stderr)
+                return 1
+            code = generate_sources(config, args, catalog, files, view)
+            if args.verify:
+                code = verify(config, catalog, files, args.mode, view=view) or code
+            return code
+        if args.command == "sync":
+            files = refresh_catalog(config, catalog)
+        else:
+            files = catalog.load(config['bucket_name'])
+            if not files:
+                print("本地快照为空，请先运行 list 或 sync", file=sys.stderr)
+                return 1
+        from batch_job import BatchJob
+        job = BatchJob(config['output_dir'], config['bucket_name'], args.mode, force=args.force,
+                       dedup=config['qr_dedup'])
+        code = generate(config, files, catalog, job)
+        if args.verify:
+            code = verify(config, catalog, files, args.mode) or code
+        return code
+    finally:
+        catalog.close()
+        if args.metrics:
+            metrics.write(args.metrics)
+        if args.trace:
+            metrics.write_trace(args.trace)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
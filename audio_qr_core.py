@@ -0,0 +1,711 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频二维码核心逻辑（不依赖Tk）
+功能: 配置读写、COS连接与列举、二维码内容生成与批量渲染，供GUI和命令行共用
+
+腾讯云COS SDK、qrcode、PIL、requests 均在实际使用时才导入，导入本模块本身只依赖标准库。
+"""
+
+import hashlib
+import json
+import os
+import time
+import urllib.parse
+
+from audio_metadata import MetadataExtractor, DEFAULT_METADATA_CONCURRENCY
+from batch_job import BatchJob
+from bucket_sources import BucketSource, CosClientPool, SourceCatalog
+from bucket_watcher import BucketWatcher, DEFAULT_WATCH_CONCURRENCY, DEFAULT_WATCH_INTERVAL, DEFAULT_WATCH_MAX_INTERVAL
+from cos_lister import ShardedLister, DEFAULT_LIST_CONCURRENCY
+from cos_uploader import CosUploader, DEFAULT_UPLOAD_CONCURRENCY, DEFAULT_PART_SIZE
+from link_checker import LinkChecker, DEFAULT_CHECK_CONCURRENCY, DEFAULT_CHECK_RATE, DEFAULT_CHECK_TTL
+from qr_cache import QRRenderCache, DEFAULT_CACHE_DIR
+from qr_engine import QRBatchEngine, QRManifest, DEFAULT_RENDER_SETTINGS
+from qr_export import DEFAULT_SHEET_LAYOUT, export_qr_codes as export_entries
+from qr_pipeline import ListRenderPipeline
+from short_ids import DEFAULT_ID_DIR, shard_prefix, write_id_shards
+
+CONFIG_PATH = "config.json"
+
+DEFAULT_BUCKET = "audio-qr-1361719303"
+DEFAULT_REGION = "ap-chengdu"
+
+QR_MODES = ("direct", "player", "wechat", "short")
+DEFAULT_QR_MODE = "wechat"
+
+# 内容相同（ETag 与大小一致）的音频：off 不合并；group 每组只生成代表文件的二维码；
+# canonical 每个文件仍有自己的输出，但都指向代表文件的地址，只渲染一次，其余从渲染缓存硬链接
+DEDUP_MODES = ("off", "group", "canonical")
+
+# Windows 文件名中不允许的字符与设备保留名
+UNSAFE_PATH_CHARS = frozenset('<>:"\\|?*')
+RESERVED_NAMES = frozenset(["CON", "PRN", "AUX", "NUL"] + [f"COM{i}" for i in range(1, 10)] +
+                           [f"LPT{i}" for i in range(1, 10)])
+
+# 微信适配模式使用的在线播放器
+# 方案1: 使用Vercel（推荐，全球CDN，国内访问速度不错）
+# 注意：需要重新部署包含wechat_player.html的Vercel项目
+WECHAT_PLAYER_URL = "https://audio-qr-system2-3lm6.vercel.app/wechat_player.html"
+# 方案2: 使用GitHub Pages（备用方案，如果Vercel有问题）
+# WECHAT_PLAYER_URL = "https://yourusername.github.io/audio-player/wechat_player.html"
+# 方案3: 使用腾讯云静态网站托管（推荐，国内访问最快）
+# WECHAT_PLAYER_URL = "https://你的腾讯云域名/wechat_player.html"
+
+# 短ID模式使用的播放器地址（Vercel根路径即 wechat_player.html），ID映射分片需与之一起部署在 ids/ 下
+SHORT_PLAYER_URL = "https://audio-qr-system2-3lm6.vercel.app/"
+
+
+def default_config():
+    """默认配置"""
+    return {
+        'secret_id': '',
+        'secret_key': '',
+        'bucket_name': DEFAULT_BUCKET,
+        'region': DEFAULT_REGION,
+        'output_dir': os.path.join(os.getcwd(), "qr_codes"),
+        'list_concurrency': DEFAULT_LIST_CONCURRENCY,
+        'list_shards': [],
+        'qr_workers': os.cpu_count() or 1,
+        'log_level': "INFO",
+        'qr_cache_dir': DEFAULT_CACHE_DIR,
+        'qr_cache_memory_mb': 64,
+        'qr_cache_disk_mb': 512,
+        'qr_compress_level': DEFAULT_RENDER_SETTINGS['png_compress_level'],
+        'short_id_dir': DEFAULT_ID_DIR,
+        'metadata_concurrency': DEFAULT_METADATA_CONCURRENCY,
+        'upload_concurrency': DEFAULT_UPLOAD_CONCURRENCY,
+        'upload_part_size_mb': DEFAULT_PART_SIZE // (1024 * 1024),
+        'sheet_page': DEFAULT_SHEET_LAYOUT['page'],
+        'sheet_columns': DEFAULT_SHEET_LAYOUT['columns'],
+        'sheet_rows': DEFAULT_SHEET_LAYOUT['rows'],
+        'sheet_dpi': DEFAULT_SHEET_LAYOUT['dpi'],
+        'sheet_font': DEFAULT_SHEET_LAYOUT['font'],
+        'serve_host': "127.0.0.1",
+        'serve_port': 8765,
+        'serve_max_age': 86400,
+        'watch_prefixes': [],
+        'watch_interval': DEFAULT_WATCH_INTERVAL,
+        'watch_max_interval': DEFAULT_WATCH_MAX_INTERVAL,
+        'sources': [],
+        'qr_dedup': "off",
+        'verify_concurrency': DEFAULT_CHECK_CONCURRENCY,
+        'verify_rate': DEFAULT_CHECK_RATE,
+        'verify_ttl': DEFAULT_CHECK_TTL
+    }
+
+
+def load_config(path=CONFIG_PATH):
+    """读取配置文件，缺失的项使用默认值"""
+    config = default_config()
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    return config
+
+
+def save_config(config, path=CONFIG_PATH):
+    """保存配置文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def create_cos_client(secret_id, secret_key, region, concurrency=DEFAULT_LIST_CONCURRENCY):
+    """创建COS客户端，连接池大小与列举并发数匹配"""
+    from qcloud_cos import CosConfig
+    from qcloud_cos import CosS3Client
+
+    pool_size = max(10, concurrency)
+    config = CosConfig(
+        Region=region,
+        SecretId=secret_id,
+        SecretKey=secret_key,
+        PoolConnections=concurrency,
+        PoolMaxSize=pool_size
+    )
+    client = CosS3Client(config)
+    # 内置连接池在客户端间共享，按并发数调整大小
+    client.set_built_in_connection_pool_max_size(concurrency, pool_size)
+    return client
+
+
+def create_client_pool(secret_id, secret_key, concurrency=DEFAULT_LIST_CONCURRENCY):
+    """创建按地域复用的COS客户端池（多存储桶使用同一对密钥）"""
+    return CosClientPool(lambda region: create_cos_client(secret_id, secret_key, region, concurrency))
+
+
+def load_sources(config):
+    """
+    配置中的文件来源
+
+    sources 为 [{"bucket": ..., "region": ..., "name": 可选}, ...]，未配置时只有 bucket_name / region 一个来源。
+    """
+    if config.get('sources'):
+        return [BucketSource.from_dict(item) for item in config['sources']]
+    return [BucketSource(config['bucket_name'], config['region'])]
+
+
+def create_render_cache(config):
+    """按配置创建二维码渲染缓存，qr_cache_disk_mb 为 0 时只使用内存层"""
+    return QRRenderCache(
+        cache_dir=config['qr_cache_dir'],
+        memory_bytes=int(config['qr_cache_memory_mb']) * 1024 * 1024,
+        disk_bytes=int(config.get('qr_cache_disk_mb') or 0) * 1024 * 1024
+    )
+
+
+def render_settings(config):
+    """按配置得到二维码渲染参数"""
+    settings = dict(DEFAULT_RENDER_SETTINGS)
+    settings['png_compress_level'] = int(config.get('qr_compress_level', settings['png_compress_level']))
+    return settings
+
+
+def sheet_layout(config):
+    """按配置得到打印页排版参数"""
+    return {
+        'page': config.get('sheet_page', DEFAULT_SHEET_LAYOUT['page']),
+        'columns': int(config.get('sheet_columns', DEFAULT_SHEET_LAYOUT['columns'])),
+        'rows': int(config.get('sheet_rows', DEFAULT_SHEET_LAYOUT['rows'])),
+        'dpi': int(config.get('sheet_dpi', DEFAULT_SHEET_LAYOUT['dpi'])),
+        'font': config.get('sheet_font', DEFAULT_SHEET_LAYOUT['font'])
+    }
+
+
+def list_audio_files(client, bucket, region, concurrency=DEFAULT_LIST_CONCURRENCY, shards=None, on_progress=None):
+    """
+    列举存储桶中的全部音频文件
+
+    Returns:
+        (files, total_scanned): 按对象键排序的文件信息列表，以及扫描的对象总数
+    """
+    lister = ShardedLister(client, bucket, region, concurrency=concurrency,
+                           shards=shards, on_progress=on_progress)
+    files = lister.list_audio_files()
+    return files, lister.total_scanned
+
+
+def get_qr_content(file_info, mode, short_ids=None):
+    """
+    根据生成方式生成二维码内容
+
+    short 模式需要 short_ids（{url: 短ID}，由 prepare_short_ids() 得到）。
+    """
+    audio_url = file_info.url
+
+    if mode == "direct":
+        # 直接链接模式
+        return audio_url
+    elif mode == "player":
+        # 本地播放页面模式
+        return f"./player.html?url={audio_url}"
+    elif mode == "wechat":
+        # 微信适配模式 - 使用在线播放器
+        encoded_url = urllib.parse.quote(audio_url, safe='')
+        return f"{WECHAT_PLAYER_URL}?url={encoded_url}"
+    elif mode == "short":
+        # 短ID模式 - 只编码播放器地址和短ID，二维码版本更低
+        if short_ids is None or audio_url not in short_ids:
+            raise ValueError(f"未分配短ID: {file_info.key}")
+        return f"{SHORT_PLAYER_URL}?id={short_ids[audio_url]}"
+    else:
+        return audio_url
+
+
+def link_targets(file_info, mode, short_ids=None):
+    """
+    二维码能否使用所依赖的公网地址 [(说明, url), ...]
+
+    包括音频对象本身和二维码指向的播放页面；播放页面的查询参数只是传给页面的音频地址或短ID，
+    去掉后同一页面只检查一次。short 模式另外检查页面要加载的ID映射分片 ids/<前缀>.json。
+    相对地址（player 模式的本地播放页面）无法从外部访问，不检查。
+    """
+    targets = [("音频", file_info.url)]
+    content = get_qr_content(file_info, mode, short_ids)
+    if content != file_info.url:
+        parts = urllib.parse.urlsplit(content)
+        if parts.scheme in ("http", "https"):
+            targets.append(("播放页", urllib.parse.urlunsplit(parts._replace(query="", fragment=""))))
+    if mode == "short":
+        shard = f"ids/{shard_prefix(short_ids[file_info.url])}.json"
+        targets.append(("短ID映射", urllib.parse.urljoin(SHORT_PLAYER_URL, shard)))
+    return targets
+
+
+def safe_path_segment(segment):
+    """对象键中的一级目录或文件名转换为各平台都能使用的名称"""
+    cleaned = "".join("_" if c in UNSAFE_PATH_CHARS or ord(c) < 32 else c for c in segment).rstrip(". ")
+    if not cleaned:
+        return "_"
+    if cleaned.split(".")[0].upper() in RESERVED_NAMES:
+        return "_" + cleaned
+    return cleaned
+
+
+def qr_output_path(file_info, output_dir):
+    """
+    二维码输出路径：保留对象键的目录层级，文件名为音频文件名加 .png（专辑A/01.mp3 -> 输出目录/专辑A/01.mp3.png）
+
+    不同目录下的同名文件、只有扩展名不同的文件各自对应不同的路径。对象键中有文件系统不允许的字符时
+    替换为 _；对象键含有大写字母时，在不区分大小写的文件系统（Windows、macOS默认）上可能与只差大小写的
+    对象键重名（Song.mp3 与 song.mp3）。这两种情况都在文件名后附加对象键摘要，保证不同的对象键不会映射到
+    同一路径；路径只由对象键决定。
+    """
+    return key_output_path(file_info.key, output_dir)
+
+
+def key_output_path(key, output_dir):
+    """对象键对应的二维码输出路径（见 qr_output_path()），对象已删除、只剩对象键时使用"""
+    segments = key.split("/")
+    safe = [safe_path_segment(segment) for segment in segments]
+    name = safe[-1]
+    folded = "/".join(safe)
+    if safe != segments or folded != folded.casefold():
+        name += "~" + hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(output_dir, *safe[:-1], name + ".png")
+
+
+def remove_qr_outputs(keys, output_dir):
+    """
+    删除这些对象键的二维码输出，并从生成清单中移除记录（对象已从存储桶删除）
+
+    Returns:
+        int: 实际删除的文件数
+    """
+    paths = [key_output_path(key, output_dir) for key in keys]
+    manifest = QRManifest(output_dir)
+    manifest.forget(paths)
+    manifest.save()
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def group_duplicates(files):
+    """
+    按 ETag 与大小把内容相同的音频分组（没有 ETag 的文件不参与）
+
+    每组的代表为访问地址最小的文件，与列举顺序无关。分块上传的 ETag 与分块大小有关，
+    同一内容用不同分块大小上传时不会被识别为重复（只会少合并，不会误合并）。
+
+    Returns:
+        list: 与 files 一一对应的代表文件下标，不重复的文件为自身下标
+    """
+    first = {}
+    for i, f in enumerate(files):
+        if not f.etag:
+            continue
+        j = first.setdefault((f.etag, f.size), i)
+        if f.url < files[j].url:
+            first[(f.etag, f.size)] = i
+    return [first[(f.etag, f.size)] if f.etag else i for i, f in enumerate(files)]
+
+
+def prepare_short_ids(catalog, files, id_dir=DEFAULT_ID_DIR):
+    """
+    为文件分配短ID，并重新导出涉及到的映射分片
+
+    Returns:
+        dict: {url: 短ID}
+    """
+    short_ids = catalog.assign_short_ids(f.url for f in files)
+    prefixes = {shard_prefix(short_id) for short_id in short_ids.values()}
+    write_id_shards(id_dir, {prefix: catalog.short_id_shard(prefix) for prefix in prefixes})
+    return short_ids
+
+
+def build_qr_tasks(files, mode, output_dir, short_ids=None, canonical=None):
+    """
+    为文件列表构造渲染任务 [(content, path), ...]
+
+    canonical 为 group_duplicates() 的结果时，重复文件的二维码内容指向其代表文件。
+    """
+    return [(get_qr_content(files[canonical[i]] if canonical else f, mode, short_ids), qr_output_path(f, output_dir))
+            for i, f in enumerate(files)]
+
+
+def build_source_tasks(view, files, mode, output_dir, short_ids=None, canonical=None):
+    """
+    为多个来源的文件构造渲染任务，每个来源的二维码写入 输出目录/来源名称/
+
+    不同存储桶中的同名文件不会互相覆盖；canonical 同 build_qr_tasks()。
+    """
+    return [(get_qr_content(files[canonical[i]] if canonical else f, mode, short_ids),
+             qr_output_path(f, os.path.join(output_dir, view.source_of(f).name)))
+            for i, f in enumerate(files)]
+
+
+def generate_qr_codes(files, mode, output_dir, engine=None, force=False, on_progress=None, short_ids=None,
+                      on_skipped=None, should_stop=None, dedup="off"):
+    """
+    为文件列表批量生成二维码，跳过内容未变化的输出
+
+    Args:
+        dedup: 内容相同的音频如何处理，见 DEDUP_MODES
+
+    Returns:
+        (failures, skipped): 失败的 [(index, error), ...] 与跳过的文件下标
+    """
+    canonical = group_duplicates(files) if dedup != "off" else None
+    tasks = build_qr_tasks(files, mode, output_dir, short_ids, canonical)
+    return run_qr_tasks(tasks, mode, output_dir, engine, force, on_progress, on_skipped, should_stop,
+                        canonical, dedup)
+
+
+def generate_source_qr_codes(view, files, mode, output_dir, engine=None, force=False, on_progress=None,
+                             short_ids=None, on_skipped=None, should_stop=None, dedup="off"):
+    """
+    在一个批次中为多个来源的文件生成二维码（见 build_source_tasks()），跳过内容未变化的输出
+
+    Args:
+        view: SourceCatalog，用于查出文件所属的来源
+        dedup: 同 generate_qr_codes()，不同存储桶中的相同内容也会合并
+
+    Returns:
+        (failures, skipped): 失败的 [(index, error), ...] 与跳过的文件下标
+    """
+    canonical = group_duplicates(files) if dedup != "off" else None
+    tasks = build_source_tasks(view, files, mode, output_dir, short_ids, canonical)
+    return run_qr_tasks(tasks, mode, output_dir, engine, force, on_progress, on_skipped, should_stop,
+                        canonical, dedup)
+
+
+def run_qr_tasks(tasks, mode, output_dir, engine=None, force=False, on_progress=None, on_skipped=None,
+                 should_stop=None, canonical=None, dedup="off"):
+    """按输出目录清单增量执行渲染任务（可合并重复内容，见 run_deduplicated()），未传入 engine 时临时创建"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    own_engine = engine is None
+    if own_engine:
+        engine = QRBatchEngine()
+    try:
+        def run(pass_tasks, progress, skip, use_cache):
+            return engine.run_incremental(pass_tasks, output_dir, mode, force, progress, on_skipped=skip,
+                                          should_stop=should_stop, use_cache=use_cache)
+        return run_deduplicated(tasks, canonical, dedup, run, on_progress, on_skipped, should_stop)
+    finally:
+        if own_engine:
+            engine.shutdown()
+
+
+def run_deduplicated(tasks, canonical, dedup, run, on_progress=None, on_skipped=None, should_stop=None):
+    """
+    分一到两轮执行渲染任务，重复内容只渲染一次
+
+    - group：只执行代表文件的任务，重复文件直接计为跳过（不生成输出）
+    - canonical：先执行代表文件的任务，再执行重复文件的任务；两者内容相同，
+      第二轮全部命中渲染缓存（硬链接），不再渲染
+
+    Args:
+        tasks: 与 canonical 一一对应的渲染任务
+        canonical: group_duplicates() 的结果，为 None 或 dedup 为 off 时一次执行全部任务
+        run: run(tasks, on_progress, on_skipped, use_cache) -> (failures, skipped)，下标对应传入的任务；
+             use_cache 为 None 时按是否强制重新生成决定
+        on_progress / on_skipped: 同 QRBatchEngine.run_incremental()，下标对应 tasks
+
+    Returns:
+        (failures, skipped): 下标对应 tasks
+    """
+    duplicates = [i for i, c in enumerate(canonical or ()) if c != i]
+    if dedup == "off" or not duplicates:
+        return run(tasks, on_progress, on_skipped, None)
+
+    total = len(tasks)
+    unique = [i for i, c in enumerate(canonical) if c == i]
+    failures = []
+    skipped = []
+    offset = 0
+    passes = [(unique, None)]
+    if dedup == "group":
+        skipped.extend(duplicates)
+        offset = len(duplicates)
+        if on_skipped:
+            on_skipped(list(duplicates))
+        if on_progress:
+            on_progress(offset, total, list(duplicates))
+    else:
+        passes.append((duplicates, True))
+
+    for n, (indices, use_cache) in enumerate(passes):
+        if n and should_stop and should_stop():
+            break
+
+        def progress(done, _, completed, indices=indices, offset=offset):
+            if on_progress:
+                on_progress(offset + done, total, [indices[i] for i in completed])
+
+        def skip(local, indices=indices):
+            if on_skipped:
+                on_skipped([indices[i] for i in local])
+
+        pass_failures, pass_skipped = run([tasks[i] for i in indices], progress, skip, use_cache)
+        failures.extend((indices[i], error) for i, error in pass_failures)
+        skipped.extend(indices[i] for i in pass_skipped)
+        offset += len(indices)
+    return failures, skipped
+
+
+def run_batch_job(job, files, engine=None, short_ids=None, resume=False,
+                  on_progress=None, on_skipped=None, should_stop=None):
+    """
+    执行或继续一个可续传的批量任务
+
+    开始时写入任务文件（resume=True 时沿用已有的任务文件），每个完成的输出立即记入清单日志；
+    全部任务都处理完（未被取消）才删除任务文件，否则下次可以继续。
+
+    Args:
+        job: BatchJob
+        files: 本任务的文件（通常为 job.select_files(catalog.load(job.bucket))）
+        short_ids: short 模式的 {url: 短ID}
+
+    Returns:
+        (failures, skipped, finished): 失败的 [(index, error), ...]、跳过的文件下标、是否已全部处理
+    """
+    os.makedirs(job.output_dir, exist_ok=True)
+    canonical = group_duplicates(files) if job.dedup != "off" else None
+    tasks = build_qr_tasks(files, job.mode, job.output_dir, short_ids, canonical)
+    if not resume:
+        job.start(tasks)
+
+    processed = [0]
+
+    def progress(done, total, completed):
+        processed[0] = done
+        if on_progress:
+            on_progress(done, total, completed)
+
+    own_engine = engine is None
+    if own_engine:
+        engine = QRBatchEngine()
+    try:
+        # 强制重新生成的输出在开始时已从清单中移除，这里按普通任务筛选，续传时不会从头开始
+        def run(pass_tasks, pass_progress, skip, use_cache):
+            return engine.run_incremental(
+                pass_tasks, job.output_dir, job.mode, False, pass_progress, on_skipped=skip,
+                should_stop=should_stop, use_cache=not job.force if use_cache is None else use_cache)
+        failures, skipped = run_deduplicated(tasks, canonical, job.dedup, run, progress, on_skipped, should_stop)
+    finally:
+        if own_engine:
+            engine.shutdown()
+
+    finished = processed[0] >= len(tasks)
+    if finished:
+        job.finish()
+    return failures, skipped, finished
+
+
+def export_qr_codes(files, mode, path, fmt=None, engine=None, short_ids=None, layout=None,
+                    on_progress=None, should_stop=None):
+    """
+    把二维码直接导出为ZIP压缩包或可打印的PDF/PNG页面，不在输出目录生成单个文件
+
+    压缩包内的条目名与 qr_output_path() 的文件名一致，打印页标签为音频文件名（不含扩展名）。
+
+    Args:
+        path: 导出文件路径，fmt 未指定时按扩展名（.zip / .pdf / .png）判断格式
+        short_ids: short 模式的 {url: 短ID}
+        layout: 打印页排版参数（见 sheet_layout()）
+        on_progress: 进度回调 on_progress(done, total)
+        should_stop: 可选的 should_stop()，可阻塞（暂停），返回 True 时取消
+
+    Returns:
+        dict: total、exported、failures [(条目名, 错误)]、pages、cancelled
+    """
+    entries = [(get_qr_content(f, mode, short_ids), qr_output_path(f, ""), os.path.splitext(f.name)[0])
+               for f in files]
+
+    own_engine = engine is None
+    if own_engine:
+        engine = QRBatchEngine()
+    try:
+        return export_entries(engine, entries, path, fmt=fmt, layout=layout,
+                              on_progress=on_progress, should_stop=should_stop)
+    finally:
+        if own_engine:
+            engine.shutdown()
+
+
+def build_pipeline(source, mode, output_dir, engine, catalog=None, force=False, short_id_dir=DEFAULT_ID_DIR,
+                   on_progress=None, should_stop=None):
+    """
+    由页面来源（ShardedLister 列举，或 CosUploader 上传）创建边获取边生成的流水线
+
+    short 模式需要 catalog，每页分配短ID，全部完成后导出涉及到的映射分片。
+    """
+    if mode == "short" and catalog is None:
+        raise ValueError("短ID模式需要本地快照 catalog")
+    os.makedirs(output_dir, exist_ok=True)
+    prefixes = set()
+
+    def make_tasks(files):
+        short_ids = None
+        if mode == "short":
+            short_ids = catalog.assign_short_ids(f.url for f in files)
+            prefixes.update(shard_prefix(short_id) for short_id in short_ids.values())
+        return build_qr_tasks(files, mode, output_dir, short_ids)
+
+    def on_finish():
+        if prefixes:
+            write_id_shards(short_id_dir, {prefix: catalog.short_id_shard(prefix) for prefix in prefixes})
+
+    return ListRenderPipeline(source, engine, output_dir, mode, make_tasks, catalog=catalog, force=force,
+                              on_progress=on_progress, on_finish=on_finish, should_stop=should_stop)
+
+
+def create_stream_pipeline(client, bucket, region, mode, output_dir, engine, catalog=None, force=False,
+                           concurrency=DEFAULT_LIST_CONCURRENCY, shards=None, short_id_dir=DEFAULT_ID_DIR,
+                           on_progress=None, should_stop=None):
+    """创建边列举边生成的流水线，调用其 run() 执行、cancel() 取消"""
+    lister = ShardedLister(client, bucket, region, concurrency=concurrency, shards=shards)
+    return build_pipeline(lister, mode, output_dir, engine, catalog=catalog, force=force,
+                          short_id_dir=short_id_dir, on_progress=on_progress, should_stop=should_stop)
+
+
+def create_upload_pipeline(client, bucket, region, directory, mode, output_dir, engine, catalog, prefix="",
+                           force=False, concurrency=DEFAULT_UPLOAD_CONCURRENCY, part_size=DEFAULT_PART_SIZE,
+                           short_id_dir=DEFAULT_ID_DIR, on_upload_progress=None, on_uploaded=None,
+                           should_stop=None):
+    """
+    创建边上传边生成的流水线
+
+    上传完成（或存储桶中已有相同内容）的文件直接写入快照并生成二维码，不需要重新列举存储桶；
+    上传进度与结果见 pipeline.lister（CosUploader）。
+
+    Args:
+        directory: 本地文件夹
+        prefix: 上传到的对象键前缀
+        on_upload_progress: 上传进度回调 on_upload_progress(done, total, bytes_uploaded)
+        on_uploaded: 每个完成的文件回调 on_uploaded(file_info, uploaded)
+    """
+    uploader = CosUploader(client, bucket, region, catalog, directory, prefix=prefix, concurrency=concurrency,
+                           part_size=part_size, on_progress=on_upload_progress, on_uploaded=on_uploaded,
+                           should_stop=should_stop)
+    return build_pipeline(uploader, mode, output_dir, engine, catalog=catalog, force=force,
+                          short_id_dir=short_id_dir, should_stop=should_stop)
+
+
+def create_bucket_watcher(client, bucket, region, mode, output_dir, engine, catalog, prefixes=None,
+                          interval=DEFAULT_WATCH_INTERVAL, max_interval=DEFAULT_WATCH_MAX_INTERVAL,
+                          concurrency=DEFAULT_WATCH_CONCURRENCY, short_id_dir=DEFAULT_ID_DIR, on_changes=None):
+    """
+    创建存储桶监视器：按前缀分区轮询，新增或变更的音频立即生成二维码，已删除对象的二维码随之删除，
+    调用其 run() 执行、stop() 停止
+
+    Args:
+        prefixes: 要监视的前缀列表，为空时自动按顶层目录分区
+        interval / max_interval: 活跃分区的轮询间隔与空闲分区退避的上限（秒）
+        concurrency: 同时列举的分区数上限
+        on_changes: 每轮有变化时回调 on_changes(diff, failures)
+    """
+    def generate(files):
+        short_ids = prepare_short_ids(catalog, files, short_id_dir) if mode == "short" else None
+        failures, _ = generate_qr_codes(files, mode, output_dir, engine=engine, short_ids=short_ids)
+        return [(files[index].key, error) for index, error in failures]
+
+    def discard(keys):
+        remove_qr_outputs(keys, output_dir)
+
+    lister = ShardedLister(client, bucket, region)
+    return BucketWatcher(lister, catalog, generate, prefixes=prefixes, interval=interval,
+                         max_interval=max_interval, concurrency=concurrency, on_changes=on_changes,
+                         discard=discard)
+
+
+def extract_audio_metadata(catalog, bucket, files, concurrency=DEFAULT_METADATA_CONCURRENCY, force=False,
+                           on_progress=None, should_stop=None):
+    """
+    用 Range 请求读取音频头部，提取时长、码率、编码与标签并写入本地快照
+
+    已有元数据且对象未变化（ETag/大小相同）的文件直接跳过，force=True 时全部重新读取。
+
+    Args:
+        on_progress: 进度回调 on_progress(done, total)
+        should_stop: 可选的 should_stop()，可阻塞（暂停），返回 True 时停止
+
+    Returns:
+        dict: total、fetched、skipped、failures [(key, error)]、requests、bytes
+    """
+    pending = list(files) if force else catalog.missing_metadata(bucket, files)
+    done = [0]
+
+    def on_results(results):
+        catalog.save_metadata(bucket, results)
+        done[0] += len(results)
+        if on_progress:
+            on_progress(done[0], len(pending))
+
+    extractor = MetadataExtractor(concurrency=concurrency)
+    try:
+        failures = extractor.run(pending, on_results, should_stop=should_stop)
+    finally:
+        extractor.close()
+    return {
+        'total': len(files),
+        'fetched': done[0],
+        'skipped': len(files) - len(pending),
+        'failures': [(f.key, error) for f, error in failures],
+        'requests': extractor.requests,
+        'bytes': extractor.bytes_read
+    }
+
+
+def verify_links(catalog, files, mode, short_ids=None, concurrency=DEFAULT_CHECK_CONCURRENCY,
+                 rate=DEFAULT_CHECK_RATE, ttl=DEFAULT_CHECK_TTL, force=False, checker=None,
+                 on_progress=None, should_stop=None):
+    """
+    用HEAD请求检查文件的音频地址与二维码指向的播放页面（见 link_targets()）能否公开访问
+
+    多个文件共用的地址（如同一个播放页面）只检查一次；结果保存在本地快照中，
+    ttl 秒内检查过且可访问的地址直接沿用，无法访问的地址每次都重新检查，force=True 时全部重新检查。
+
+    Args:
+        short_ids: short 模式的 {url: 短ID}
+        rate: 每个主机每秒的请求数上限
+        checker: 可选的 LinkChecker，未传入时临时创建
+        on_progress: 进度回调 on_progress(done, total)，total 为需要请求的地址数
+        should_stop: 可选的 should_stop()，可阻塞（暂停），返回 True 时停止
+
+    Returns:
+        dict: total、checked（本次请求的地址数）、cached（沿用的地址数）、
+              problems {文件下标: "播放页 HTTP 404 不存在；..."}（取消时只包含已知的结果）
+    """
+    targets = [link_targets(f, mode, short_ids) for f in files]
+    urls = list(dict.fromkeys(url for file_targets in targets for _, url in file_targets))
+    results = catalog.load_link_checks(urls)
+    now = time.time()
+    pending = [url for url in urls if force or url not in results or not results[url].is_fresh(ttl, now)]
+    done = [0]
+
+    def on_results(batch):
+        catalog.save_link_checks(batch)
+        results.update((r.url, r) for r in batch)
+        done[0] += len(batch)
+        if on_progress:
+            on_progress(done[0], len(pending))
+
+    own_checker = checker is None
+    if own_checker:
+        checker = LinkChecker(concurrency=concurrency, rate=rate)
+    try:
+        checker.run(pending, on_results, should_stop=should_stop)
+    finally:
+        if own_checker:
+            checker.close()
+
+    problems = {}
+    for i, file_targets in enumerate(targets):
+        errors = [f"{label} {results[url].error}" for label, url in file_targets
+                  if url in results and not results[url].ok]
+        if errors:
+            problems[i] = "；".join(errors)
+    return {
+        'total': len(files),
+        'checked': done[0],
+        'cached': len(urls) - len(pending),
+        'problems': problems
+    }
@@ -7,27 +7,71 @@
 功能: 连接腾讯云COS，获取音频文件，生成永久二维码
 """
 
+import time
+
+# 进程启动时刻，用于统计启动到显示首屏文件列表的耗时
+STARTUP_TIME = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import threading
+import multiprocessing
+import importlib
 import os
 import json
 from datetime import datetime
 import webbrowser
+from collections import deque
+
+import audio_qr_core as core
+from app_logging import get_logger, setup_logging
+from app_metrics import get_metrics
+from cos_lister import DEFAULT_LIST_CONCURRENCY
+from batch_job import BatchJob
+from file_catalog import FileCatalog, FileIndex
+from job_progress import JobProgress, format_duration
+from qr_engine import QRBatchEngine
+
+logger = get_logger("gui")
+metrics = get_metrics()
+
+# 腾讯云与二维码相关库导入较慢，窗口显示后在后台线程导入
+BACKGROUND_MODULES = ("qcloud_cos", "qrcode", "PIL.Image", "requests")
+
+
+def preload_modules(names=BACKGROUND_MODULES):
+    """导入依赖库，返回缺失的 [(模块名, 错误信息)]"""
+    missing = []
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            missing.append((name, str(e)))
+    return missing
 
-# 导入腾讯云和二维码相关库
-try:
-    from qcloud_cos import CosConfig
-    from qcloud_cos import CosS3Client
-    import qrcode
-    from PIL import Image, ImageTk
-    import requests
-except ImportError as e:
-    print(f"请安装必要的依赖库: {e}")
-    print("运行命令: pip install -r requirements.txt")
-    exit(1)
 
 class AudioQRManager:
+    # 列表可排序的列及其排序键
+    SORT_KEYS = {
+        '文件名': lambda f: f.name.lower(),
+        '大小': lambda f: f.size,
+        '修改时间': lambda f: f.last_modified
+    }
+    
+    # 列表各列宽度
+    COLUMN_WIDTHS = {'文件名': 240, '大小': 90, '时长': 70, '格式': 100, '标题': 220, '修改时间': 150, '状态': 90}
+    
+    # 分片填充列表时每片占用Tk线程的最长时间（秒）
+    LIST_SLICE_SECONDS = 0.02
+    
+    # 批量任务进度的刷新节拍（毫秒），与任务完成速度无关
+    PROGRESS_TICK_MS = 200
+    
+    # 启动时先从快照读取并显示的行数（约几屏），其余行读取后追加
+    STARTUP_ROWS = 500
+    
+    FILE_PANEL_TITLE = "📁 音频文件列表"
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("🎵 音频二维码管理上位机 v1.0")
@@ -37,17 +81,71 @@ class AudioQRManager:
         # 配置变量
         self.secret_id = tk.StringVar()
         self.secret_key = tk.StringVar()
-        self.bucket_name = tk.StringVar(value="audio-qr-1361719303")
-        self.region = tk.StringVar(value="ap-chengdu")
+        self.bucket_name = tk.StringVar(value=core.DEFAULT_BUCKET)
+        self.region = tk.StringVar(value=core.DEFAULT_REGION)
         
         # COS客户端
         self.cos_client = None
         self.audio_files = []
         self.qr_codes = []
         
+        # 列举并发配置（config.json 中的 list_concurrency / list_shards）
+        self.list_concurrency = DEFAULT_LIST_CONCURRENCY
+        self.list_shards = []
+        self.log_level = "INFO"
+        self.cache_config = {}
+        self.short_id_dir = core.DEFAULT_ID_DIR
+        self.metadata_concurrency = core.DEFAULT_METADATA_CONCURRENCY
+        self.upload_config = {
+            'upload_concurrency': core.DEFAULT_UPLOAD_CONCURRENCY,
+            'upload_part_size_mb': core.DEFAULT_PART_SIZE // (1024 * 1024)
+        }
+        # 打印页排版（config.json 中的 sheet_page / sheet_columns / sheet_rows / sheet_dpi / sheet_font）
+        self.sheet_config = {k: v for k, v in core.default_config().items() if k.startswith('sheet_')}
+        # 存储桶监视（config.json 中的 watch_prefixes / watch_interval / watch_max_interval）
+        self.watch_config = {k: v for k, v in core.default_config().items() if k.startswith('watch_')}
+        self.watcher = None
+        # 多存储桶来源（config.json 中的 sources）与按地域复用的客户端池（连接COS时重建）
+        self.source_config = []
+        self.client_pool = None
+        # 内容相同的音频如何合并（config.json 中的 qr_dedup，见 core.DEDUP_MODES）
+        self.dedup = "off"
+        # 公网地址检查（config.json 中的 verify_concurrency / verify_rate / verify_ttl），
+        # 以及上次检查中无法访问的文件 {对象键: 原因}，在状态列中标出
+        self.verify_config = {k: v for k, v in core.default_config().items() if k.startswith('verify_')}
+        self.link_problems = {}
+        
+        # 本地文件目录快照，以及按对象键/列表行索引的内存目录
+        self.catalog = FileCatalog()
+        self.file_index = FileIndex()
+        self.listed_bucket = None
+        # 当前存储桶已读取的音频元数据 {对象键: AudioMetadata}
+        self.metadata = {}
+        
+        # 列表排序状态与分片填充任务
+        self.sort_column = None
+        self.sort_reverse = False
+        self.list_job = None
+        # 列表是否为尚未与存储桶核对的本地快照（None 表示还没有显示过列表），以及启动到首屏的耗时
+        self.list_stale = None
+        self.startup_ms = None
+        self.diagnostics_window = None
+        
+        # 二维码渲染引擎（进程池在首次批量生成时创建）
+        self.qr_engine = QRBatchEngine()
+        
+        # 当前批量任务的共享进度（界面按 PROGRESS_TICK_MS 节拍刷新）
+        self.active_job = None
+        self.job_title = ""
+        self.job_done_items = deque()
+        
         # 初始化界面
         self.setup_ui()
         self.load_config()
+        self.check_unfinished_job()
+        
+        # 窗口显示后再读取快照、导入依赖库并在后台校验
+        self.root.after_idle(self.restore_snapshot)
         
     def setup_ui(self):
         """设置用户界面"""
@@ -88,6 +186,9 @@ class AudioQRManager:
         menubar.add_cascade(label="工具", menu=tools_menu)
         tools_menu.add_command(label="批量生成二维码", command=self.batch_generate_qr)
         tools_menu.add_command(label="打开播放页面", command=self.open_player_page)
+        tools_menu.add_command(label="检查公网访问", command=self.verify_links)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="性能诊断", command=self.show_diagnostics)
         
         # 帮助菜单
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -124,23 +225,39 @@ class AudioQRManager:
         connect_btn = ttk.Button(config_frame, text="🔗 连接COS", command=self.connect_cos)
         connect_btn.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(15, 0))
         
-        # 刷新按钮
-        refresh_btn = ttk.Button(config_frame, text="🔄 刷新文件列表", command=self.refresh_files)
-        refresh_btn.grid(row=2, column=2, columnspan=2, sticky=tk.W, pady=(15, 0), padx=(20, 0))
+        # 刷新与上传按钮
+        list_btn_frame = ttk.Frame(config_frame)
+        list_btn_frame.grid(row=2, column=2, columnspan=2, sticky=tk.W, pady=(15, 0), padx=(20, 0))
+        
+        refresh_btn = ttk.Button(list_btn_frame, text="🔄 刷新文件列表", command=self.refresh_files)
+        refresh_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        upload_btn = ttk.Button(list_btn_frame, text="⬆ 上传文件夹", command=self.upload_folder)
+        upload_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.watch_btn = ttk.Button(list_btn_frame, text="👁 监视存储桶", command=self.toggle_watch)
+        self.watch_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        sources_btn = ttk.Button(list_btn_frame, text="🌐 全部存储桶", command=self.generate_all_sources)
+        sources_btn.pack(side=tk.LEFT)
         
     def create_file_panel(self):
         """创建文件列表面板"""
-        file_frame = ttk.LabelFrame(self.main_frame, text="📁 音频文件列表", padding=15)
+        file_frame = ttk.LabelFrame(self.main_frame, text=self.FILE_PANEL_TITLE, padding=15)
         file_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        self.file_frame = file_frame
         
         # 创建Treeview
-        columns = ('文件名', '大小', '修改时间', '状态')
+        columns = ('文件名', '大小', '时长', '格式', '标题', '修改时间', '状态')
         self.file_tree = ttk.Treeview(file_frame, columns=columns, show='headings', height=15)
         
-        # 设置列标题
+        # 设置列标题（文件名、大小、修改时间可点击排序）
         for col in columns:
-            self.file_tree.heading(col, text=col)
-            self.file_tree.column(col, width=200)
+            if col in self.SORT_KEYS:
+                self.file_tree.heading(col, text=col, command=lambda c=col: self.sort_file_list(c))
+            else:
+                self.file_tree.heading(col, text=col)
+            self.file_tree.column(col, width=self.COLUMN_WIDTHS[col])
         
         # 滚动条
         scrollbar_v = ttk.Scrollbar(file_frame, orient=tk.VERTICAL, command=self.file_tree.yview)
@@ -174,7 +291,10 @@ class AudioQRManager:
         player_radio.grid(row=0, column=2, sticky=tk.W, padx=(0, 15))
         
         wechat_radio = ttk.Radiobutton(qr_frame, text="微信适配", variable=self.qr_type, value="wechat")
-        wechat_radio.grid(row=0, column=3, sticky=tk.W)
+        wechat_radio.grid(row=0, column=3, sticky=tk.W, padx=(0, 15))
+        
+        short_radio = ttk.Radiobutton(qr_frame, text="短ID（二维码更小）", variable=self.qr_type, value="short")
+        short_radio.grid(row=0, column=4, sticky=tk.W)
         
         # 输出目录
         ttk.Label(qr_frame, text="输出目录:").grid(row=1, column=0, sticky=tk.W, padx=(0, 10), pady=(10, 0))
@@ -185,6 +305,11 @@ class AudioQRManager:
         browse_btn = ttk.Button(qr_frame, text="浏览", command=self.browse_output_dir)
         browse_btn.grid(row=1, column=3, pady=(10, 0))
         
+        # 强制重新生成（忽略输出目录中的生成清单）
+        self.force_regenerate = tk.BooleanVar(value=False)
+        force_check = ttk.Checkbutton(qr_frame, text="强制重新生成（忽略未变化检测）", variable=self.force_regenerate)
+        force_check.grid(row=1, column=4, sticky=tk.W, padx=(15, 0), pady=(10, 0))
+        
         # 操作按钮
         btn_frame = ttk.Frame(qr_frame)
         btn_frame.grid(row=2, column=0, columnspan=4, pady=(15, 0))
@@ -195,6 +320,21 @@ class AudioQRManager:
         generate_all_btn = ttk.Button(btn_frame, text="⚡ 批量生成", command=self.batch_generate_qr)
         generate_all_btn.pack(side=tk.LEFT, padx=(0, 10))
         
+        stream_btn = ttk.Button(btn_frame, text="🚀 边列举边生成", command=self.stream_generate_qr)
+        stream_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        resume_btn = ttk.Button(btn_frame, text="⏯ 继续未完成任务", command=self.resume_batch_job)
+        resume_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        metadata_btn = ttk.Button(btn_frame, text="🎵 读取音频信息", command=self.extract_metadata)
+        metadata_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        export_btn = ttk.Button(btn_frame, text="📦 导出", command=self.export_qr_codes)
+        export_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        verify_btn = ttk.Button(btn_frame, text="🔍 检查公网访问", command=self.verify_links)
+        verify_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
         open_folder_btn = ttk.Button(btn_frame, text="📂 打开输出目录", command=self.open_output_folder)
         open_folder_btn.pack(side=tk.LEFT)
         
@@ -211,6 +351,17 @@ class AudioQRManager:
         self.progress = ttk.Progressbar(self.status_bar, length=200)
         self.progress.pack(side=tk.RIGHT, padx=10, pady=5)
         
+        # 批量任务的取消/暂停（仅在任务运行时可用）
+        self.cancel_btn = ttk.Button(self.status_bar, text="⏹ 取消", command=self.cancel_job, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.RIGHT, pady=5)
+        self.pause_btn = ttk.Button(self.status_bar, text="⏸ 暂停", command=self.toggle_pause_job, state=tk.DISABLED)
+        self.pause_btn.pack(side=tk.RIGHT, padx=(10, 5), pady=5)
+        
+        # 渲染缓存统计
+        self.cache_text = tk.StringVar(value="")
+        cache_label = ttk.Label(self.status_bar, textvariable=self.cache_text)
+        cache_label.pack(side=tk.RIGHT, padx=10, pady=5)
+        
     def create_context_menu(self):
         """创建右键菜单"""
         self.context_menu = tk.Menu(self.root, tearoff=0)
@@ -234,34 +385,32 @@ class AudioQRManager:
             return
             
         try:
-            print(f"正在连接COS...")
-            print(f"Region: {self.region.get()}")
-            print(f"Bucket: {self.bucket_name.get()}")
-            print(f"SecretId: {self.secret_id.get()[:10]}...")
-            
-            config = CosConfig(
-                Region=self.region.get(),
-                SecretId=self.secret_id.get(),
-                SecretKey=self.secret_key.get()
-            )
-            self.cos_client = CosS3Client(config)
-            
-            # 测试连接
-            print("正在测试COS连接...")
-            response = self.cos_client.list_objects(Bucket=self.bucket_name.get(), MaxKeys=1)
-            print(f"COS连接测试响应: {response}")
+            logger.info("正在连接COS... Region: %s, Bucket: %s", self.region.get(), self.bucket_name.get())
+            logger.debug("SecretId: %s...", self.secret_id.get()[:4])
+            
+            self.client_pool = None
+            with metrics.timer("cos.connect"):
+                self.cos_client = core.create_cos_client(
+                    self.secret_id.get(),
+                    self.secret_key.get(),
+                    self.region.get(),
+                    self.list_concurrency
+                )
+                
+                # 测试连接
+                logger.info("正在测试COS连接...")
+                response = self.cos_client.list_objects(Bucket=self.bucket_name.get(), MaxKeys=1)
+            logger.debug("COS连接测试响应: %s", response)
             
             self.status_text.set("COS连接成功！")
             messagebox.showinfo("成功", "已成功连接到腾讯云COS！")
             
             # 自动刷新文件列表
-            print("自动刷新文件列表...")
+            logger.info("自动刷新文件列表...")
             self.refresh_files()
             
         except Exception as e:
-            print(f"COS连接失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("COS连接失败: %s", e)
             self.status_text.set("COS连接失败")
             messagebox.showerror("连接失败", f"无法连接到COS：{str(e)}")
             
@@ -271,130 +420,451 @@ class AudioQRManager:
             messagebox.showwarning("警告", "请先连接到COS！")
             return
             
+        bucket = self.bucket_name.get()
+        
+        # 切换了存储桶时，当前列表不能作为增量更新的基础
+        if bucket != self.listed_bucket:
+            self.set_audio_files([])
+            self.file_index.clear_items()
+            self.listed_bucket = bucket
+            
+        # 先显示上次的快照，再在后台增量更新
+        if not self.audio_files:
+            cached_files = self.catalog.load(bucket)
+            if cached_files:
+                self.set_audio_files(cached_files)
+                self.update_file_list()
+                self.status_text.set(f"已显示上次的列表（{len(cached_files)} 个音频文件），正在后台更新...")
+            
         def refresh_thread():
             try:
-                self.root.after(0, lambda: self.status_text.set("正在获取文件列表..."))
-                self.audio_files = []
+                if not self.audio_files:
+                    self.root.after(0, lambda: self.status_text.set("正在获取文件列表..."))
                 
-                # 获取所有文件
-                marker = ""
-                audio_extensions = ('.mp3', '.wav', '.m4a', '.flac', '.aac', '.ogg', '.wma')
-                total_files_scanned = 0
-                audio_files_found = 0
+                logger.info("开始扫描存储桶: %s (并发数: %d)", bucket, self.list_concurrency)
                 
-                print(f"开始扫描存储桶: {self.bucket_name.get()}")
-                
-                while True:
-                    print(f"正在获取文件列表，marker: {marker}")
-                    response = self.cos_client.list_objects(
-                        Bucket=self.bucket_name.get(),
-                        Marker=marker,
-                        MaxKeys=1000
+                # 按前缀分片并发列举（每页请求的耗时记录在 cos.list_objects 中）
+                with metrics.timer("cos.list_bucket"):
+                    files, total_files_scanned = core.list_audio_files(
+                        self.cos_client,
+                        bucket,
+                        self.region.get(),
+                        concurrency=self.list_concurrency,
+                        shards=self.list_shards,
+                        on_progress=lambda n: self.root.after(0, lambda: self.status_text.set(f"正在获取文件列表... 已扫描 {n} 个对象"))
                     )
-                    
-                    print(f"API响应: {response}")
-                    
-                    if 'Contents' in response:
-                        for obj in response['Contents']:
-                            key = obj['Key']
-                            total_files_scanned += 1
-                            print(f"扫描文件: {key}")
-                            
-                            if key.lower().endswith(audio_extensions):
-                                audio_files_found += 1
-                                file_info = {
-                                    'key': key,
-                                    'name': os.path.basename(key),
-                                    'size': int(obj['Size']),
-                                    'last_modified': obj['LastModified'],
-                                    'url': f"https://{self.bucket_name.get()}.cos.{self.region.get()}.myqcloud.com/{key}"
-                                }
-                                self.audio_files.append(file_info)
-                                print(f"找到音频文件: {key}")
-                    else:
-                        print("响应中没有Contents字段")
-                    
-                    if response.get('IsTruncated') == 'false':
-                        print("已获取所有文件")
-                        break
-                    
-                    if 'NextMarker' in response:
-                        marker = response['NextMarker']
-                        print(f"继续获取，下一个marker: {marker}")
-                    else:
-                        print("没有NextMarker，停止获取")
-                        break
+                audio_files_found = len(files)
                 
-                print(f"扫描完成！总文件数: {total_files_scanned}, 音频文件数: {audio_files_found}")
+                logger.info("扫描完成！总文件数: %d, 音频文件数: %d", total_files_scanned, audio_files_found)
+                
+                # 与上次快照比较，只更新有变化的行
+                with metrics.timer("catalog.apply_snapshot"):
+                    diff = self.catalog.apply_snapshot(bucket, files)
+                logger.info("增量更新: 新增 %d, 变更 %d, 删除 %d",
+                            len(diff['added']), len(diff['changed']), len(diff['deleted']))
                 
                 # 更新界面
-                self.root.after(0, self.update_file_list)
+                self.root.after(0, lambda: self.apply_file_diff(files, diff))
                 
             except Exception as e:
-                print(f"获取文件列表时发生错误: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                self.root.after(0, lambda: messagebox.showerror("错误", f"获取文件列表失败：{str(e)}"))
+                logger.exception("获取文件列表时发生错误: %s", e)
+                error = str(e)
+                self.root.after(0, lambda: messagebox.showerror("错误", f"获取文件列表失败：{error}"))
                 self.root.after(0, lambda: self.status_text.set("获取文件列表失败"))
         
         threading.Thread(target=refresh_thread, daemon=True).start()
         
-    def get_qr_content(self, file_info):
+    def set_list_stale(self, stale):
+        """标记列表是否为尚未核对的本地快照（显示在列表标题中）"""
+        self.list_stale = stale
+        title = self.FILE_PANEL_TITLE + ("（上次的快照，可能已过期）" if stale else "")
+        self.file_frame.configure(text=title)
+        
+    def restore_snapshot(self):
+        """
+        启动时在后台恢复上次的文件列表，不等待依赖库导入和网络列举
+        
+        先读取并显示前 STARTUP_ROWS 行，再读取完整快照追加其余行；列表标记为过期，
+        依赖库导入完成且已配置密钥时自动连接并在后台重新列举校验。
+        """
+        bucket = self.bucket_name.get()
+        
+        def startup_thread():
+            first = self.catalog.load(bucket, limit=self.STARTUP_ROWS)
+            complete = len(first) < self.STARTUP_ROWS
+            # 首屏不等待读取全部元数据，完整快照读取后再补上
+            first_metadata = self.catalog.load_metadata(bucket) if complete else {}
+            if first:
+                self.root.after(0, lambda: self.show_snapshot(bucket, first, first_metadata, complete))
+            if not complete:
+                files = self.catalog.load(bucket)
+                metadata = self.catalog.load_metadata(bucket)
+                self.root.after(0, lambda: self.show_snapshot(bucket, files, metadata, True))
+                
+            started = time.perf_counter()
+            missing = preload_modules()
+            logger.info("依赖库后台导入耗时 %.0f ms", (time.perf_counter() - started) * 1000)
+            if missing:
+                details = "\n".join(f"{name}: {error}" for name, error in missing)
+                logger.error("缺少依赖库: %s", details)
+                self.root.after(0, lambda: messagebox.showerror(
+                    "缺少依赖库", f"请安装必要的依赖库:\n{details}\n\n运行命令: pip install -r requirements.txt"))
+                return
+            if first:
+                self.root.after(0, lambda: self.revalidate_snapshot(bucket))
+                
+        threading.Thread(target=startup_thread, daemon=True).start()
+        
+    def show_snapshot(self, bucket, files, metadata, complete):
+        """
+        显示后台读取的快照；complete 为 False 时 files 只是首屏
+        
+        已有最新列表或切换了存储桶时忽略。
+        """
+        if self.list_stale is False or bucket != self.bucket_name.get():
+            return
+        self.listed_bucket = bucket
+        
+        def on_done():
+            if complete:
+                self.on_snapshot_shown()
+            else:
+                self.status_text.set(f"已显示上次列表的前 {len(files)} 个音频文件，正在读取其余...")
+                
+        # 首屏之后读取到完整快照：首屏是完整列表的前缀，补上首屏的元数据列并追加其余行
+        shown = len(self.audio_files)
+        if shown and self.sort_column is None and self.list_job is None and files[:shown] == self.audio_files:
+            self.set_audio_files(files, metadata)
+            if metadata:
+                for file_info in files[:shown]:
+                    self.update_metadata_row(file_info)
+            self.run_in_slices(files[shown:], self.insert_file_row, on_done=on_done)
+            return
+            
+        first_screen = not self.audio_files
+        self.set_audio_files(files, metadata)
+        self.set_list_stale(True)
+        self.update_file_list(on_done=on_done)
+        if first_screen:
+            # 第一片行已同步插入，强制绘制后统计启动到首屏的耗时
+            self.root.update_idletasks()
+            self.startup_ms = (time.perf_counter() - STARTUP_TIME) * 1000
+            metrics.observe("ui.startup_first_screen", self.startup_ms / 1000, STARTUP_TIME)
+            logger.info("启动到显示首屏文件列表耗时 %.0f ms（%d 行）", self.startup_ms, len(files))
+            
+    def on_snapshot_shown(self):
+        """快照显示完成后在状态栏说明列表来源与启动耗时"""
+        if not self.list_stale:
+            return
+        startup = f"，首屏 {self.startup_ms:.0f} ms" if self.startup_ms is not None else ""
+        action = "正在后台校验..." if self.secret_id.get() and self.secret_key.get() else "连接COS后可刷新"
+        self.status_text.set(f"已显示上次的列表（{len(self.audio_files)} 个音频文件{startup}），{action}")
+        
+    def revalidate_snapshot(self, bucket):
+        """依赖库就绪后用已保存的密钥连接COS，在后台重新列举并增量更新快照"""
+        if self.cos_client is not None or not self.list_stale or bucket != self.bucket_name.get():
+            return
+        if not self.secret_id.get() or not self.secret_key.get():
+            return
+        try:
+            self.cos_client = core.create_cos_client(
+                self.secret_id.get(), self.secret_key.get(), self.region.get(), self.list_concurrency)
+        except Exception as e:
+            logger.exception("创建COS客户端失败: %s", e)
+            self.status_text.set(f"无法连接COS，显示的是上次的列表：{e}")
+            return
+        logger.info("后台校验文件列表: %s", bucket)
+        self.refresh_files()
+        
+    def get_qr_content(self, file_info, short_ids=None):
         """根据选择的模式生成二维码内容"""
-        qr_mode = self.qr_type.get()
-        audio_url = file_info['url']
-        
-        if qr_mode == "direct":
-            # 直接链接模式
-            return audio_url
-        elif qr_mode == "player":
-            # 本地播放页面模式
-            return f"./player.html?url={audio_url}"
-        elif qr_mode == "wechat":
-            # 微信适配模式 - 使用在线播放器
-            import urllib.parse
-            encoded_url = urllib.parse.quote(audio_url, safe='')
-            
-            # 方案1: 使用Vercel（推荐，全球CDN，国内访问速度不错）
-            # 注意：需要重新部署包含wechat_player.html的Vercel项目
-            return f"https://audio-qr-system2-3lm6.vercel.app/wechat_player.html?url={encoded_url}"
-            
-            # 方案2: 使用GitHub Pages（备用方案，如果Vercel有问题）
-            # return f"https://yourusername.github.io/audio-player/wechat_player.html?url={encoded_url}"
-            
-            # 方案3: 使用腾讯云静态网站托管（推荐，国内访问最快）
-            # return f"https://你的腾讯云域名/wechat_player.html?url={encoded_url}"
-        else:
-            return audio_url
+        return core.get_qr_content(file_info, self.qr_type.get(), short_ids)
 
-    def update_file_list(self):
-        """更新文件列表界面"""
-        print(f"开始更新文件列表界面，音频文件数: {len(self.audio_files)}")
+    def set_audio_files(self, files, metadata=None):
+        """替换当前文件列表并重建对象键索引（metadata 为已在后台读取的元数据）"""
+        self.audio_files = files
+        self.file_index.set_files(files)
+        if metadata is None:
+            metadata = self.catalog.load_metadata(self.bucket_name.get()) if files else {}
+        self.metadata = metadata
+        
+    def selected_files(self, items=None):
+        """返回选中行对应的 (行id, 文件记录) 列表"""
+        if items is None:
+            items = self.file_tree.selection()
+        selected = []
+        for item in items:
+            file_info = self.file_index.file_for_item(item)
+            if file_info is not None:
+                selected.append((item, file_info))
+        return selected
+        
+    def format_file_row(self, file_info, status="就绪"):
+        """生成列表行的显示值（上次检查无法访问的文件状态列显示原因）"""
+        problem = self.link_problems.get(file_info.key)
+        if problem:
+            status = f"⚠ {problem}"
+        size_mb = file_info.size / (1024 * 1024)
+        size_str = f"{size_mb:.2f} MB"
+        return (
+            file_info.name,
+            size_str,
+            *self.format_metadata(file_info),
+            file_info.last_modified[:19],
+            status
+        )
+        
+    def format_metadata(self, file_info):
+        """元数据列（时长、格式、标题）的显示值，未读取或对象已变化时为空"""
+        meta = self.metadata.get(file_info.key)
+        if meta is None or not meta.is_current(file_info):
+            return "", "", ""
+        if meta.error:
+            return "", "无法解析", ""
+        duration = format_duration(meta.duration) if meta.duration is not None else ""
+        codec = (meta.codec or "").upper()
+        if meta.bitrate:
+            codec += f" {meta.bitrate}k"
+        return duration, codec, meta.label or ""
+        
+    def sorted_files(self, files):
+        """按当前排序列返回文件列表，未排序时保持对象键顺序"""
+        if self.sort_column is None:
+            return files
+        return sorted(files, key=self.SORT_KEYS[self.sort_column], reverse=self.sort_reverse)
+        
+    def run_in_slices(self, items, func, on_progress=None, on_done=None):
+        """
+        将逐项操作切成时间片，通过after调度在Tk线程执行，避免界面卡死
+        
+        每个时间片最多占用 LIST_SLICE_SECONDS，新任务会取消尚未完成的旧任务。
+        """
+        self.cancel_list_job()
+        total = len(items)
         
-        # 清空现有列表
-        for item in self.file_tree.get_children():
-            self.file_tree.delete(item)
+        def run_slice(start):
+            started = time.perf_counter()
+            deadline = started + self.LIST_SLICE_SECONDS
+            i = start
+            while i < total:
+                func(items[i])
+                i += 1
+                # 每插入一小批检查一次时间，减少计时调用
+                if i % 64 == 0 and time.perf_counter() >= deadline:
+                    break
+            metrics.observe("ui.tk_slice", time.perf_counter() - started, started)
+            if i < total:
+                if on_progress:
+                    on_progress(i, total)
+                self.list_job = self.root.after(1, run_slice, i)
+            else:
+                self.list_job = None
+                if on_done:
+                    on_done()
+                    
+        run_slice(0)
+        
+    def cancel_list_job(self):
+        """取消尚未完成的分片任务"""
+        if self.list_job is not None:
+            self.root.after_cancel(self.list_job)
+            self.list_job = None
+            
+    def insert_file_row(self, file_info):
+        """在列表末尾添加一行"""
+        try:
+            item = self.file_tree.insert('', 'end', values=self.format_file_row(file_info))
+            self.file_index.bind_item(file_info.key, item)
+        except Exception as e:
+            logger.warning("添加文件到列表时出错: %r, 错误: %s", file_info, e)
             
+    def update_file_list(self, on_done=None):
+        """更新文件列表界面（分片插入，不阻塞界面），填充完成后调用 on_done()"""
+        files = self.sorted_files(self.audio_files)
+        logger.debug("开始更新文件列表界面，音频文件数: %d", len(files))
+        started = time.perf_counter()
+        
+        # 清空现有列表（一次调用删除全部行）
+        self.cancel_list_job()
+        self.file_tree.delete(*self.file_tree.get_children())
+        self.file_index.clear_items()
+        
+        def finish():
+            metrics.observe("ui.update_file_list", time.perf_counter() - started, started)
+            metrics.count("ui.rows_inserted", len(files))
+            status_msg = f"已获取 {len(files)} 个音频文件"
+            self.status_text.set(status_msg)
+            logger.info("文件列表更新完成: %s", status_msg)
+            if on_done:
+                on_done()
+                
         # 添加文件
-        for i, file_info in enumerate(self.audio_files):
-            try:
-                size_mb = file_info['size'] / (1024 * 1024)
-                size_str = f"{size_mb:.2f} MB"
+        self.run_in_slices(
+            files,
+            self.insert_file_row,
+            on_progress=lambda done, total: self.status_text.set(f"正在加载文件列表... {done}/{total}"),
+            on_done=finish
+        )
+        
+    def sort_file_list(self, column):
+        """按列排序，只移动已有行而不重建列表"""
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+            
+        for col in self.SORT_KEYS:
+            arrow = (" ▼" if self.sort_reverse else " ▲") if col == column else ""
+            self.file_tree.heading(col, text=col + arrow)
+            
+        # 列表仍在分片填充时，直接按新顺序重新填充
+        if self.list_job is not None:
+            self.update_file_list()
+            return
+            
+        order = list(enumerate(self.sorted_files(self.audio_files)))
+        
+        def move_row(entry):
+            index, file_info = entry
+            item = self.file_index.item_for_key(file_info.key)
+            if item is not None:
+                self.file_tree.move(item, '', index)
                 
-                self.file_tree.insert('', 'end', values=(
-                    file_info['name'],
-                    size_str,
-                    file_info['last_modified'][:19],
-                    "就绪"
-                ))
-                print(f"添加文件到列表: {file_info['name']}")
-            except Exception as e:
-                print(f"添加文件到列表时出错: {file_info}, 错误: {e}")
+        self.run_in_slices(
+            order,
+            move_row,
+            on_progress=lambda done, total: self.status_text.set(f"正在排序... {done}/{total}"),
+            on_done=lambda: self.status_text.set(f"已按{column}排序，共 {len(order)} 个音频文件")
+        )
+        
+    def apply_file_diff(self, files, diff):
+        """按快照差异增量更新文件列表界面"""
+        # 界面上的行与上次快照一致时才能增量更新（启动时可能只显示了首屏）
+        previous_count = len(files) - len(diff['added']) + len(diff['deleted'])
+        complete = len(self.file_index.key_to_item) == previous_count
+        previous = self.file_index.by_key
+        self.set_audio_files(files)
+        self.set_list_stale(False)
+        
+        # 列表为空（首次获取）、不完整或仍在分片填充时直接整体填充
+        if not self.file_index.key_to_item or not complete or self.list_job is not None:
+            self.update_file_list()
+            return
+            
+        for key in diff['deleted']:
+            item = self.file_index.unbind_key(key)
+            if item is not None:
+                self.file_tree.delete(item)
+                
+        # 排序列（大小、修改时间）的值变化的行先摘下，稍后与新增行一起放回
+        sort_key = self.SORT_KEYS.get(self.sort_column)
+        moved = []
+        for file_info in diff['changed']:
+            item = self.file_index.item_for_key(file_info.key)
+            if item is not None:
+                self.file_tree.item(item, values=self.format_file_row(file_info))
+                old = previous.get(file_info.key)
+                if sort_key is not None and old is not None and sort_key(old) != sort_key(file_info):
+                    self.file_tree.detach(item)
+                    moved.append(file_info)
+                    
+        # 新增行和摘下的行按当前排序放到正确位置：其余行的相对顺序不变，按位置从小到大依次放入
+        if diff['added'] or moved:
+            positions = {f.key: i for i, f in enumerate(self.sorted_files(files))}
+            for file_info in sorted(diff['added'] + moved, key=lambda f: positions[f.key]):
+                item = self.file_index.item_for_key(file_info.key)
+                if item is None:
+                    item = self.file_tree.insert('', positions[file_info.key], values=self.format_file_row(file_info))
+                    self.file_index.bind_item(file_info.key, item)
+                else:
+                    self.file_tree.move(item, '', positions[file_info.key])
+                
+        self.status_text.set(
+            f"已获取 {len(files)} 个音频文件（新增 {len(diff['added'])}，"
+            f"变更 {len(diff['changed'])}，删除 {len(diff['deleted'])}）"
+        )
+        
+    def qr_output_path(self, file_info):
+        """二维码输出路径：输出目录/音频文件名.png"""
+        return core.qr_output_path(file_info, self.output_dir.get())
+        
+    def update_cache_status(self):
+        """在状态栏显示渲染缓存的命中、未命中与淘汰计数"""
+        cache = self.qr_engine.cache
+        self.cache_text.set(cache.summary() if cache is not None else "")
+        
+    def start_job(self, title, total=0):
+        """
+        开始一个批量任务：创建共享进度计数，启用暂停/取消按钮并开始定时刷新
+
+        同一时间只运行一个任务，已有任务运行时返回 None。
+        """
+        if self.active_job is not None:
+            messagebox.showwarning("警告", "已有任务正在运行，请等待完成或先取消！")
+            return None
             
-        status_msg = f"已获取 {len(self.audio_files)} 个音频文件"
-        self.status_text.set(status_msg)
-        print(f"文件列表更新完成: {status_msg}")
+        self.active_job = JobProgress(total)
+        self.job_title = title
+        self.job_done_items = deque()
+        self.pause_btn.configure(text="⏸ 暂停", state=tk.NORMAL)
+        self.cancel_btn.configure(state=tk.NORMAL)
+        self.tick_job_progress()
+        return self.active_job
+        
+    def tick_job_progress(self):
+        """按固定节拍读取任务进度并刷新界面（每个节拍只刷新一次）"""
+        job = self.active_job
+        if job is None:
+            return
+            
+        with metrics.timer("ui.progress_tick"):
+            # 工作线程只往队列里追加完成的行，这里统一更新状态列
+            done_items = self.job_done_items
+            for _ in range(len(done_items)):
+                item = done_items.popleft()
+                if self.file_tree.exists(item):
+                    self.file_tree.set(item, '状态', '已生成')
+                    
+            snapshot = job.snapshot()
+            self.progress.configure(value=snapshot['percent'])
+            current = f" {snapshot['current']}" if snapshot['current'] else ""
+            self.status_text.set(f"{self.job_title}:{current} ({job.describe(snapshot)})")
+        self.root.after(self.PROGRESS_TICK_MS, self.tick_job_progress)
         
+    def finish_job(self, message=None):
+        """任务结束（在主线程中调用）：最后刷新一次并恢复按钮"""
+        if self.active_job is None:
+            return
+        self.tick_job_progress()
+        self.active_job = None
+        self.pause_btn.configure(text="⏸ 暂停", state=tk.DISABLED)
+        self.cancel_btn.configure(state=tk.DISABLED)
+        self.progress.configure(value=0)
+        self.update_cache_status()
+        if message:
+            self.status_text.set(message)
+            
+    def toggle_pause_job(self):
+        """暂停或继续当前任务"""
+        job = self.active_job
+        if job is None:
+            return
+        if job.paused:
+            job.resume()
+            self.pause_btn.configure(text="⏸ 暂停")
+        else:
+            job.pause()
+            self.pause_btn.configure(text="▶ 继续")
+            
+    def cancel_job(self):
+        """取消当前任务（已提交的块完成后停止）"""
+        job = self.active_job
+        if job is not None and not job.cancelled:
+            job.cancel()
+            self.pause_btn.configure(text="⏸ 暂停", state=tk.DISABLED)
+            self.status_text.set(f"{self.job_title}: 正在取消...")
+            
     def generate_selected_qr(self):
         """生成选中文件的二维码"""
         selected_items = self.file_tree.selection()
@@ -402,88 +872,572 @@ class AudioQRManager:
             messagebox.showwarning("警告", "请先选择音频文件！")
             return
             
-        def generate_thread():
+        # 通过行id索引找到对应的文件信息
+        selected = self.selected_files(selected_items)
+        files = [f for _, f in selected]
+        batch_job = BatchJob(self.output_dir.get(), self.bucket_name.get(), self.qr_type.get(),
+                             keys=[f.key for f in files], force=self.force_regenerate.get(), dedup=self.dedup)
+        self.run_batch_job(batch_job, files, "正在生成选中项", items=[item for item, _ in selected])
+        
+    def batch_generate_qr(self):
+        """批量生成所有音频文件的二维码"""
+        if not self.audio_files:
+            messagebox.showwarning("警告", "没有音频文件，请先刷新文件列表！")
+            return
+            
+        if not messagebox.askyesno("确认", f"将为 {len(self.audio_files)} 个音频文件生成二维码，是否继续？"):
+            return
+            
+        batch_job = BatchJob(self.output_dir.get(), self.bucket_name.get(), self.qr_type.get(),
+                             force=self.force_regenerate.get(), dedup=self.dedup)
+        self.run_batch_job(batch_job, list(self.audio_files), "正在生成")
+        
+    def extract_metadata(self):
+        """用Range请求读取音频头部，补全列表中的时长、格式与标题"""
+        if not self.audio_files:
+            messagebox.showwarning("警告", "没有音频文件，请先刷新文件列表！")
+            return
+            
+        bucket = self.bucket_name.get()
+        files = list(self.audio_files)
+        job = self.start_job("正在读取音频信息", len(files))
+        if job is None:
+            return
+            
+        def metadata_thread():
+            message = None
             try:
-                os.makedirs(self.output_dir.get(), exist_ok=True)
+                summary = core.extract_audio_metadata(
+                    self.catalog, bucket, files, concurrency=self.metadata_concurrency,
+                    on_progress=lambda done, total: job.update(done, total=total),
+                    should_stop=job.checkpoint)
+                failures = summary['failures']
+                message = (f"音频信息读取完成（读取 {summary['fetched']}，已有 {summary['skipped']}，"
+                           f"失败 {len(failures)}，共下载 {summary['bytes'] / 1024 / 1024:.1f} MB）")
+                if failures:
+                    first_error = failures[0][1]
+                    self.root.after(0, lambda: messagebox.showwarning(
+                        "部分失败", f"{len(failures)} 个文件读取失败，下次会重试。\n首个错误：{first_error}"))
+            except Exception as e:
+                logger.exception("读取音频信息失败: %s", e)
+                error = str(e)
+                message = "读取音频信息失败"
+                self.root.after(0, lambda: messagebox.showerror("错误", f"读取音频信息失败：{error}"))
+            finally:
+                self.root.after(0, lambda: self.finish_job(message))
+                self.root.after(0, self.refresh_metadata_columns)
                 
-                for item in selected_items:
-                    values = self.file_tree.item(item, 'values')
-                    file_name = values[0]
+        threading.Thread(target=metadata_thread, daemon=True).start()
+        
+    def export_qr_codes(self):
+        """把选中（未选中时为全部）文件的二维码导出为ZIP压缩包或可打印的PDF/PNG页面"""
+        if not self.audio_files:
+            messagebox.showwarning("警告", "没有音频文件，请先刷新文件列表！")
+            return
+            
+        selected_items = self.file_tree.selection()
+        files = [f for _, f in self.selected_files(selected_items)] if selected_items else list(self.audio_files)
+        path = filedialog.asksaveasfilename(
+            title=f"导出 {len(files)} 个二维码",
+            defaultextension=".zip",
+            filetypes=[("ZIP压缩包", "*.zip"), ("PDF打印页", "*.pdf"), ("PNG打印页", "*.png")])
+        if not path:
+            return
+            
+        mode = self.qr_type.get()
+        layout = core.sheet_layout(self.sheet_config)
+        job = self.start_job("正在导出", len(files))
+        if job is None:
+            return
+            
+        def export_thread():
+            message = None
+            try:
+                short_ids = None
+                if mode == "short":
+                    short_ids = core.prepare_short_ids(self.catalog, files, self.short_id_dir)
                     
-                    # 找到对应的文件信息
-                    file_info = next((f for f in self.audio_files if f['name'] == file_name), None)
-                    if not file_info:
-                        continue
-                        
-                    # 生成二维码
-                    qr_content = self.get_qr_content(file_info)
-                        
-                    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                    qr.add_data(qr_content)
-                    qr.make(fit=True)
+                summary = core.export_qr_codes(
+                    files, mode, path, engine=self.qr_engine, short_ids=short_ids, layout=layout,
+                    on_progress=lambda done, total: job.update(done), should_stop=job.checkpoint)
+                failures = summary['failures']
+                pages = f"，共 {summary['pages']} 页" if summary['pages'] else ""
+                if summary['cancelled']:
+                    message = "导出已取消"
+                else:
+                    message = f"导出完成：{summary['exported']} 个二维码{pages}，失败 {len(failures)}"
+                if failures and not summary['cancelled']:
+                    first_error = failures[0][1]
+                    self.root.after(0, lambda: messagebox.showwarning(
+                        "部分失败", f"{len(failures)} 个二维码生成失败，未写入导出文件。\n首个错误：{first_error}"))
+            except Exception as e:
+                logger.exception("导出失败: %s", e)
+                error = str(e)
+                message = "导出失败"
+                self.root.after(0, lambda: messagebox.showerror("错误", f"导出失败：{error}"))
+            finally:
+                self.root.after(0, lambda: self.finish_job(message))
+                
+        threading.Thread(target=export_thread, daemon=True).start()
+        
+    def verify_links(self):
+        """用HEAD请求检查选中（未选中时为全部）文件的音频地址与播放页面能否公开访问"""
+        if not self.audio_files:
+            messagebox.showwarning("警告", "没有音频文件，请先刷新文件列表！")
+            return
+            
+        selected_items = self.file_tree.selection()
+        files = [f for _, f in self.selected_files(selected_items)] if selected_items else list(self.audio_files)
+        mode = self.qr_type.get()
+        job = self.start_job("正在检查公网访问", len(files))
+        if job is None:
+            return
+            
+        def verify_thread():
+            message = None
+            try:
+                short_ids = None
+                if mode == "short":
+                    short_ids = core.prepare_short_ids(self.catalog, files, self.short_id_dir)
                     
-                    img = qr.make_image(fill_color="black", back_color="white")
+                summary = core.verify_links(
+                    self.catalog, files, mode, short_ids=short_ids,
+                    concurrency=self.verify_config['verify_concurrency'], rate=self.verify_config['verify_rate'],
+                    ttl=self.verify_config['verify_ttl'],
+                    on_progress=lambda done, total: job.update(done, total=total), should_stop=job.checkpoint)
+                problems = {files[i].key: problem for i, problem in summary['problems'].items()}
+                message = (f"公网访问检查完成（检查 {summary['checked']} 个地址，沿用 {summary['cached']} 个），"
+                           f"{len(problems)} 个文件的二维码无法使用")
+                self.root.after(0, lambda: self.update_link_status(files, problems))
+                if problems:
+                    first = next(iter(summary['problems']))
+                    first_problem = f"{files[first].name}：{summary['problems'][first]}"
+                    self.root.after(0, lambda: messagebox.showwarning(
+                        "无法访问", f"{len(problems)} 个文件的二维码扫码后无法播放，已在状态列标出。\n首个：{first_problem}"))
+            except Exception as e:
+                logger.exception("检查公网访问失败: %s", e)
+                error = str(e)
+                message = "检查公网访问失败"
+                self.root.after(0, lambda: messagebox.showerror("错误", f"检查公网访问失败：{error}"))
+            finally:
+                self.root.after(0, lambda: self.finish_job(message))
+                
+        threading.Thread(target=verify_thread, daemon=True).start()
+        
+    def update_link_status(self, files, problems):
+        """记录本次检查的结果并分片刷新这些文件的状态列"""
+        for file_info in files:
+            self.link_problems.pop(file_info.key, None)
+        self.link_problems.update(problems)
+        
+        # 列表仍在分片填充时直接重新填充，新插入的行会带上检查结果
+        if self.list_job is not None:
+            self.update_file_list()
+            return
+            
+        self.run_in_slices(files, self.update_link_status_row)
+        
+    def update_link_status_row(self, file_info):
+        """刷新一行的状态列：无法访问时显示原因，恢复访问的行改回“就绪”"""
+        item = self.file_index.item_for_key(file_info.key)
+        if item is None:
+            return
+        problem = self.link_problems.get(file_info.key)
+        if problem:
+            self.file_tree.set(item, '状态', f"⚠ {problem}")
+        elif self.file_tree.set(item, '状态').startswith("⚠"):
+            self.file_tree.set(item, '状态', "就绪")
+        
+    def refresh_metadata_columns(self):
+        """重新加载元数据并分片刷新列表中的元数据列"""
+        self.metadata = self.catalog.load_metadata(self.bucket_name.get())
+        
+        # 列表仍在分片填充时直接重新填充，新插入的行会带上元数据
+        if self.list_job is not None:
+            self.update_file_list()
+            return
+            
+        self.run_in_slices(list(self.audio_files), self.update_metadata_row)
+        
+    def update_metadata_row(self, file_info):
+        """刷新一行的元数据列"""
+        item = self.file_index.item_for_key(file_info.key)
+        if item is not None:
+            for col, value in zip(('时长', '格式', '标题'), self.format_metadata(file_info)):
+                self.file_tree.set(item, col, value)
+        
+    def resume_batch_job(self):
+        """继续输出目录中未完成的批量任务（图形界面或命令行中断的都可以）"""
+        batch_job = BatchJob.load(self.output_dir.get())
+        if batch_job is None:
+            messagebox.showinfo("提示", "输出目录中没有未完成的批量任务。")
+            return
+            
+        files = batch_job.select_files(self.catalog.load(batch_job.bucket))
+        if not messagebox.askyesno("继续任务", f"{batch_job.describe()}\n共 {len(files)} 个文件，已完成的不会重新生成，是否继续？"):
+            return
+        self.run_batch_job(batch_job, files, "正在继续任务", resume=True)
+        
+    def check_unfinished_job(self):
+        """启动或切换输出目录时提示未完成的批量任务"""
+        batch_job = BatchJob.load(self.output_dir.get())
+        if batch_job is not None:
+            self.status_text.set(f"发现未完成的批量任务：{batch_job.describe()}，点击“⏯ 继续未完成任务”继续")
+            
+    def run_batch_job(self, batch_job, files, title, items=None, resume=False):
+        """
+        在后台线程中执行可续传的批量任务
+        
+        Args:
+            batch_job: BatchJob（任务文件写在输出目录中，中断后可继续）
+            files: 本任务的文件
+            title: 状态栏中的任务名称
+            items: 与 files 对应的列表行，完成后更新状态列
+            resume: 是否继续已有的任务文件
+        """
+        job = self.start_job(title, len(files))
+        if job is None:
+            return
+            
+        def batch_thread():
+            message = None
+            try:
+                total = len(files)
+                short_ids = None
+                if batch_job.mode == "short":
+                    short_ids = core.prepare_short_ids(self.catalog, files, self.short_id_dir)
                     
-                    # 保存二维码
-                    name_without_ext = os.path.splitext(file_name)[0]
-                    qr_path = os.path.join(self.output_dir.get(), f"{name_without_ext}.png")
-                    img.save(qr_path)
+                def on_progress(done, total, completed):
+                    # 进程池每完成一块汇报一次，只更新共享计数，界面由定时节拍刷新
+                    if items is not None:
+                        self.job_done_items.extend(items[i] for i in completed)
+                    job.update(done, current=files[completed[-1]].name if completed else None)
                     
-                    # 更新状态
-                    self.root.after(0, lambda item=item: self.file_tree.set(item, '状态', '已生成'))
+                failures, skipped, finished = core.run_batch_job(
+                    batch_job, files, engine=self.qr_engine, short_ids=short_ids, resume=resume,
+                    on_progress=on_progress, on_skipped=lambda skipped: job.skip(len(skipped)),
+                    should_stop=job.checkpoint)
+                generated = job.done - len(skipped) - len(failures)
                     
-                self.root.after(0, lambda: self.status_text.set("二维码生成完成！"))
-                self.root.after(0, lambda: messagebox.showinfo("成功", "二维码生成完成！"))
+                if not finished:
+                    message = (f"任务已暂停保存（生成 {generated}，跳过 {len(skipped)}，失败 {len(failures)}，"
+                               f"未处理 {total - job.done}），可点击“⏯ 继续未完成任务”继续")
+                elif failures:
+                    failed_names = ", ".join(files[i].name for i, _ in failures[:5])
+                    first_error = failures[0][1]
+                    message = f"批量生成完成，{len(failures)} 个失败"
+                    self.root.after(0, lambda: messagebox.showwarning(
+                        "部分失败", f"已生成 {generated} 个，未变化跳过 {len(skipped)} 个，失败 {len(failures)} 个：{failed_names}\n首个错误：{first_error}"))
+                else:
+                    message = f"批量生成完成！（生成 {generated}，跳过 {len(skipped)}）"
+                    self.root.after(0, lambda: messagebox.showinfo("成功", f"已为 {total} 个音频文件生成二维码！\n其中 {len(skipped)} 个内容未变化，已跳过。"))
                 
             except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("错误", f"生成二维码失败：{str(e)}"))
+                logger.exception("批量生成失败: %s", e)
+                error = str(e)
+                message = "批量生成失败"
+                self.root.after(0, lambda: messagebox.showerror("错误", f"批量生成失败：{error}"))
+            finally:
+                self.root.after(0, lambda: self.finish_job(message))
                 
-        threading.Thread(target=generate_thread, daemon=True).start()
+        threading.Thread(target=batch_thread, daemon=True).start()
         
-    def batch_generate_qr(self):
-        """批量生成所有音频文件的二维码"""
-        if not self.audio_files:
-            messagebox.showwarning("警告", "没有音频文件，请先刷新文件列表！")
+    def current_sources(self):
+        """配置中的全部来源（未配置 sources 时只有当前存储桶）"""
+        return core.load_sources({'sources': self.source_config,
+                                  'bucket_name': self.bucket_name.get(), 'region': self.region.get()})
+        
+    def generate_all_sources(self):
+        """并发列举配置中的全部存储桶，并在一个批次中为它们生成二维码（按来源写入输出子目录）"""
+        if not self.cos_client:
+            messagebox.showwarning("警告", "请先连接到COS！")
             return
             
-        if not messagebox.askyesno("确认", f"将为 {len(self.audio_files)} 个音频文件生成二维码，是否继续？"):
+        try:
+            view = core.SourceCatalog(self.catalog, self.current_sources())
+        except ValueError as e:
+            messagebox.showerror("错误", f"来源配置有误：{e}")
+            return
+        names = "、".join(f"{source.name} ({source.region})" for source in view.sources)
+        if not messagebox.askyesno("确认", f"将列举以下 {len(view.sources)} 个存储桶并生成全部二维码：\n{names}\n\n"
+                                         f"二维码按来源写入 {self.output_dir.get()} 下的子目录，是否继续？"):
             return
             
-        def batch_thread():
+        job = self.start_job("多存储桶生成")
+        if job is None:
+            return
+        if self.client_pool is None:
+            self.client_pool = core.create_client_pool(self.secret_id.get(), self.secret_key.get(),
+                                                       self.list_concurrency)
+        pool = self.client_pool
+        mode = self.qr_type.get()
+        
+        def sources_thread():
+            message = None
             try:
-                os.makedirs(self.output_dir.get(), exist_ok=True)
-                total = len(self.audio_files)
+                files, results = view.refresh(
+                    pool, concurrency=self.list_concurrency,
+                    on_progress=lambda n: job.update(0, current=f"已扫描 {n} 个对象"))
+                failed_sources = [f"{r['source'].name}: {r['error']}" for r in results if r['error']]
+                job.update(0, total=len(files))
                 
-                for i, file_info in enumerate(self.audio_files):
-                    # 更新进度
-                    progress = (i + 1) / total * 100
-                    self.root.after(0, lambda p=progress: self.progress.configure(value=p))
-                    self.root.after(0, lambda: self.status_text.set(f"正在生成: {file_info['name']} ({i+1}/{total})"))
+                short_ids = None
+                if mode == "short":
+                    short_ids = core.prepare_short_ids(self.catalog, files, self.short_id_dir)
                     
-                    # 生成二维码
-                    qr_content = self.get_qr_content(file_info)
-                        
-                    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-                    qr.add_data(qr_content)
-                    qr.make(fit=True)
+                def on_progress(done, total, completed):
+                    job.update(done, current=files[completed[-1]].name if completed else None)
+                    
+                failures, skipped = core.generate_source_qr_codes(
+                    view, files, mode, self.output_dir.get(), engine=self.qr_engine,
+                    force=self.force_regenerate.get(), on_progress=on_progress, short_ids=short_ids,
+                    on_skipped=lambda skipped: job.skip(len(skipped)), should_stop=job.checkpoint,
+                    dedup=self.dedup)
+                generated = job.done - len(skipped) - len(failures)
+                
+                counts = "，".join(f"{r['source'].name} {r['scanned']}" for r in results if not r['error'])
+                result = (f"{len(view.sources)} 个存储桶（{len(pool)} 个地域），音频 {len(files)} 个，"
+                          f"生成 {generated}，跳过 {len(skipped)}，失败 {len(failures)}")
+                message = f"多存储桶生成完成：{result}"
+                if failed_sources or failures:
+                    details = failed_sources + [f"{files[i].key}: {error}" for i, error in failures[:5]]
+                    self.root.after(0, lambda: messagebox.showwarning(
+                        "部分失败", f"{result}\n扫描对象：{counts}\n" + "\n".join(details)))
+                else:
+                    self.root.after(0, lambda: messagebox.showinfo("成功", f"{result}\n扫描对象：{counts}"))
+                    
+            except Exception as e:
+                logger.exception("多存储桶生成失败: %s", e)
+                error = str(e)
+                message = "多存储桶生成失败"
+                self.root.after(0, lambda: messagebox.showerror("错误", f"多存储桶生成失败：{error}"))
+            finally:
+                self.root.after(0, self.reload_listed_bucket)
+                self.root.after(0, lambda: self.finish_job(message))
+                
+        threading.Thread(target=sources_thread, daemon=True).start()
+        
+    def reload_listed_bucket(self):
+        """当前显示的存储桶快照已在其他地方更新时，从快照重新填充列表"""
+        if self.listed_bucket is None or self.list_job is not None:
+            return
+        self.set_audio_files(self.catalog.load(self.listed_bucket))
+        self.update_file_list()
+        
+    def stream_generate_qr(self):
+        """边列举存储桶边生成二维码，不等待完整列举和列表刷新"""
+        if not self.cos_client:
+            messagebox.showwarning("警告", "请先连接到COS！")
+            return
+            
+        if not messagebox.askyesno("确认", "将边列举存储桶边生成全部音频文件的二维码（不刷新文件列表），是否继续？"):
+            return
+            
+        job = self.start_job("边列举边生成")
+        if job is None:
+            return
+            
+        def stream_thread():
+            message = None
+            try:
+                def on_progress(done, total, scanned):
+                    # 总数随列举增长，只更新共享计数
+                    job.update(done, total=total, current=f"已扫描 {scanned} 个对象")
                     
-                    img = qr.make_image(fill_color="black", back_color="white")
+                pipeline = core.create_stream_pipeline(
+                    self.cos_client,
+                    self.bucket_name.get(),
+                    self.region.get(),
+                    self.qr_type.get(),
+                    self.output_dir.get(),
+                    self.qr_engine,
+                    catalog=self.catalog,
+                    force=self.force_regenerate.get(),
+                    concurrency=self.list_concurrency,
+                    shards=self.list_shards,
+                    short_id_dir=self.short_id_dir,
+                    on_progress=on_progress,
+                    should_stop=job.checkpoint
+                )
+                summary = pipeline.run()
+                
+                failures = summary['failures']
+                result = (f"音频 {summary['listed']} 个，生成 {summary['generated']}，跳过 {summary['skipped']}，"
+                          f"失败 {len(failures)}，首个二维码用时 {summary['first_result_seconds'] or 0:.2f}s")
+                if summary['cancelled']:
+                    message = f"边列举边生成已取消：{result}"
+                else:
+                    message = f"边列举边生成完成：{result}"
+                    if failures:
+                        first_key, first_error = failures[0]
+                        self.root.after(0, lambda: messagebox.showwarning(
+                            "部分失败", f"{result}\n首个错误：{first_key}: {first_error}"))
+                    else:
+                        self.root.after(0, lambda: messagebox.showinfo("成功", result))
                     
-                    # 保存二维码
-                    name_without_ext = os.path.splitext(file_info['name'])[0]
-                    qr_path = os.path.join(self.output_dir.get(), f"{name_without_ext}.png")
-                    img.save(qr_path)
+            except Exception as e:
+                logger.exception("边列举边生成失败: %s", e)
+                error = str(e)
+                message = "边列举边生成失败"
+                self.root.after(0, lambda: messagebox.showerror("错误", f"边列举边生成失败：{error}"))
+            finally:
+                self.root.after(0, lambda: self.finish_job(message))
+                
+        threading.Thread(target=stream_thread, daemon=True).start()
+        
+    def upload_folder(self):
+        """上传本地文件夹中新增或变化的音频文件，完成的文件直接加入列表并生成二维码"""
+        if not self.cos_client:
+            messagebox.showwarning("警告", "请先连接到COS！")
+            return
+            
+        directory = filedialog.askdirectory(title="选择要上传的音频文件夹")
+        if not directory:
+            return
+        prefix = simpledialog.askstring("上传到", "对象键前缀（存储桶中的目录，可留空）：",
+                                        initialvalue=os.path.basename(directory), parent=self.root)
+        if prefix is None:
+            return
+            
+        job = self.start_job("正在上传")
+        if job is None:
+            return
+            
+        bucket = self.bucket_name.get()
+        uploaded_files = []
+        
+        def upload_thread():
+            message = None
+            try:
+                def on_upload_progress(done, total, uploaded_bytes):
+                    job.update(done, total=total, current=f"已上传 {uploaded_bytes / 1024 / 1024:.1f} MB")
                     
-                # 重置进度条
-                self.root.after(0, lambda: self.progress.configure(value=0))
-                self.root.after(0, lambda: self.status_text.set("批量生成完成！"))
-                self.root.after(0, lambda: messagebox.showinfo("成功", f"已为 {total} 个音频文件生成二维码！"))
+                pipeline = core.create_upload_pipeline(
+                    self.cos_client,
+                    bucket,
+                    self.region.get(),
+                    directory,
+                    self.qr_type.get(),
+                    self.output_dir.get(),
+                    self.qr_engine,
+                    self.catalog,
+                    prefix=prefix,
+                    force=self.force_regenerate.get(),
+                    concurrency=int(self.upload_config['upload_concurrency']),
+                    part_size=int(self.upload_config['upload_part_size_mb']) * 1024 * 1024,
+                    short_id_dir=self.short_id_dir,
+                    on_upload_progress=on_upload_progress,
+                    on_uploaded=lambda file_info, uploaded: uploaded_files.append(file_info),
+                    should_stop=job.checkpoint
+                )
+                summary = pipeline.run()
+                result = pipeline.lister.summary()
                 
+                failures = result['failures'] + summary['failures']
+                text = (f"上传 {result['uploaded']}，内容相同跳过 {result['skipped']}，失败 {len(failures)}，"
+                        f"共 {result['bytes'] / 1024 / 1024:.1f} MB；生成二维码 {summary['generated']}")
+                if result['cancelled'] or summary['cancelled']:
+                    message = f"上传已取消：{text}（再次上传同一文件夹会从中断处继续）"
+                else:
+                    message = f"上传完成：{text}"
+                    if failures:
+                        first_key, first_error = failures[0]
+                        self.root.after(0, lambda: messagebox.showwarning(
+                            "部分失败", f"{text}\n首个错误：{first_key}: {first_error}"))
+                    else:
+                        self.root.after(0, lambda: messagebox.showinfo("成功", text))
+                        
             except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("错误", f"批量生成失败：{str(e)}"))
-                self.root.after(0, lambda: self.progress.configure(value=0))
+                logger.exception("上传失败: %s", e)
+                error = str(e)
+                message = "上传失败"
+                self.root.after(0, lambda: messagebox.showerror("错误", f"上传失败：{error}"))
+            finally:
+                self.root.after(0, lambda: self.merge_file_changes(bucket, uploaded_files))
+                self.root.after(0, lambda: self.finish_job(message))
                 
-        threading.Thread(target=batch_thread, daemon=True).start()
+        threading.Thread(target=upload_thread, daemon=True).start()
+        
+    def merge_file_changes(self, bucket, updated_files, deleted=()):
+        """把上传完成或监视到的变化合并到当前列表（已写入快照，不重新列举存储桶）"""
+        if not updated_files and not deleted:
+            return
+        if bucket != self.listed_bucket:
+            self.listed_bucket = bucket
+            self.set_audio_files(self.catalog.load(bucket))
+            self.update_file_list()
+            return
+            
+        by_key = dict(self.file_index.by_key)
+        added = [f for f in updated_files if f.key not in by_key]
+        changed = [f for f in updated_files if f.key in by_key and by_key[f.key] != f]
+        by_key.update((f.key, f) for f in updated_files)
+        deleted = [key for key in deleted if by_key.pop(key, None) is not None]
+        files = sorted(by_key.values(), key=lambda f: f.key)
+        self.apply_file_diff(files, {'added': added, 'changed': changed, 'deleted': deleted})
+        
+    def toggle_watch(self):
+        """开始或停止监视存储桶：新上传或变化的音频自动生成二维码并更新列表"""
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watch_btn.configure(text="正在停止...", state=tk.DISABLED)
+            return
+            
+        if not self.cos_client:
+            messagebox.showwarning("警告", "请先连接到COS！")
+            return
+            
+        bucket = self.bucket_name.get()
+        self.watcher = core.create_bucket_watcher(
+            self.cos_client,
+            bucket,
+            self.region.get(),
+            self.qr_type.get(),
+            self.output_dir.get(),
+            self.qr_engine,
+            self.catalog,
+            prefixes=self.watch_config['watch_prefixes'],
+            interval=self.watch_config['watch_interval'],
+            max_interval=self.watch_config['watch_max_interval'],
+            concurrency=self.list_concurrency,
+            short_id_dir=self.short_id_dir,
+            on_changes=lambda diff, failures: self.root.after(
+                0, lambda: self.on_watch_changes(bucket, diff, failures))
+        )
+        self.watch_btn.configure(text="⏹ 停止监视")
+        self.status_text.set(f"正在监视 {bucket}，新上传的音频会自动生成二维码")
+        
+        def watch_thread():
+            try:
+                summary = self.watcher.run()
+                message = (f"已停止监视：轮询 {summary['rounds']} 轮，新增 {summary['added']}，"
+                           f"变更 {summary['changed']}，删除 {summary['deleted']}")
+            except Exception as e:
+                logger.exception("监视存储桶失败: %s", e)
+                error = str(e)
+                message = "监视存储桶失败"
+                self.root.after(0, lambda: messagebox.showerror("错误", f"监视存储桶失败：{error}"))
+            self.root.after(0, lambda: self.on_watch_stopped(message))
+            
+        threading.Thread(target=watch_thread, daemon=True).start()
+        
+    def on_watch_changes(self, bucket, diff, failures):
+        """监视到变化：合并到列表，并标记已生成二维码的行"""
+        updated_files = diff['added'] + diff['changed']
+        self.merge_file_changes(bucket, updated_files, diff['deleted'])
+        failed = {key for key, _ in failures}
+        for file_info in updated_files:
+            item = self.file_index.item_for_key(file_info.key)
+            if item is not None and self.file_tree.exists(item):
+                self.file_tree.set(item, '状态', '生成失败' if file_info.key in failed else '已生成')
+        self.status_text.set(f"监视 {bucket}（{time.strftime('%H:%M:%S')}）：新增 {len(diff['added'])}，"
+                             f"变更 {len(diff['changed'])}，删除 {len(diff['deleted'])}，生成失败 {len(failures)}")
+        
+    def on_watch_stopped(self, message):
+        """监视线程结束"""
+        self.watcher = None
+        self.watch_btn.configure(text="👁 监视存储桶", state=tk.NORMAL)
+        self.status_text.set(message)
         
     def play_selected_audio(self):
         """播放选中的音频"""
@@ -492,13 +1446,9 @@ class AudioQRManager:
             messagebox.showwarning("警告", "请先选择音频文件！")
             return
             
-        item = selected_items[0]
-        values = self.file_tree.item(item, 'values')
-        file_name = values[0]
-        
-        file_info = next((f for f in self.audio_files if f['name'] == file_name), None)
+        file_info = self.file_index.file_for_item(selected_items[0])
         if file_info:
-            webbrowser.open(file_info['url'])
+            webbrowser.open(file_info.url)
             
     def copy_selected_url(self):
         """复制选中文件的URL"""
@@ -507,14 +1457,10 @@ class AudioQRManager:
             messagebox.showwarning("警告", "请先选择音频文件！")
             return
             
-        item = selected_items[0]
-        values = self.file_tree.item(item, 'values')
-        file_name = values[0]
-        
-        file_info = next((f for f in self.audio_files if f['name'] == file_name), None)
+        file_info = self.file_index.file_for_item(selected_items[0])
         if file_info:
             self.root.clipboard_clear()
-            self.root.clipboard_append(file_info['url'])
+            self.root.clipboard_append(file_info.url)
             messagebox.showinfo("成功", "链接已复制到剪贴板！")
             
     def browse_output_dir(self):
@@ -522,6 +1468,7 @@ class AudioQRManager:
         directory = filedialog.askdirectory()
         if directory:
             self.output_dir.set(directory)
+            self.check_unfinished_job()
             
     def open_output_folder(self):
         """打开输出文件夹"""
@@ -534,6 +1481,89 @@ class AudioQRManager:
         else:
             messagebox.showwarning("警告", "输出目录不存在！")
             
+    def show_diagnostics(self):
+        """性能诊断窗口：各阶段的延迟分位数、计数与吞吐，可导出指标和Chrome跟踪"""
+        if self.diagnostics_window is not None and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+            
+        window = tk.Toplevel(self.root)
+        window.title("性能诊断")
+        window.geometry("860x420")
+        self.diagnostics_window = window
+        
+        columns = ('阶段', '次数', '平均', 'P50', 'P95', 'P99', '最大', '每秒')
+        tree = ttk.Treeview(window, columns=columns, show='headings')
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=220 if col == '阶段' else 85, anchor=tk.W if col == '阶段' else tk.E)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        
+        info_text = tk.StringVar()
+        ttk.Label(window, textvariable=info_text).pack(anchor=tk.W, padx=10)
+        
+        btn_frame = ttk.Frame(window)
+        btn_frame.pack(fill=tk.X, padx=10, pady=10)
+        trace_btn = ttk.Button(btn_frame)
+        
+        def export(title, extension, filetypes, write):
+            path = filedialog.asksaveasfilename(parent=window, title=title, defaultextension=extension,
+                                                filetypes=filetypes)
+            if path:
+                try:
+                    write(path)
+                    info_text.set(f"已导出到 {path}")
+                except OSError as e:
+                    messagebox.showerror("错误", f"导出失败：{e}", parent=window)
+                    
+        def toggle_trace():
+            if metrics.tracing:
+                metrics.stop_trace()
+            else:
+                metrics.start_trace()
+            trace_btn.configure(text="⏹ 停止跟踪" if metrics.tracing else "⏺ 开始跟踪")
+            
+        def reset():
+            metrics.reset()
+            tree.delete(*tree.get_children())
+            
+        trace_btn.configure(text="⏹ 停止跟踪" if metrics.tracing else "⏺ 开始跟踪", command=toggle_trace)
+        trace_btn.pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="保存跟踪", command=lambda: export(
+            "保存Chrome跟踪", ".json", [("Chrome跟踪", "*.json")], metrics.write_trace)).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="导出JSON", command=lambda: export(
+            "导出指标", ".json", [("JSON", "*.json")], metrics.write)).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="导出Prometheus", command=lambda: export(
+            "导出指标", ".prom", [("Prometheus文本", "*.prom")], metrics.write)).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="清零", command=reset).pack(side=tk.LEFT)
+        
+        def ms(seconds):
+            return f"{seconds * 1000:.2f} ms" if seconds is not None else ""
+            
+        def refresh():
+            if not window.winfo_exists():
+                return
+            snapshot = metrics.snapshot()
+            for name, h in snapshot['histograms'].items():
+                values = (name, h['count'], ms(h['mean']), ms(h['p50']), ms(h['p95']), ms(h['p99']),
+                          ms(h['max']), h['per_second'] or "")
+                if tree.exists(name):
+                    tree.item(name, values=values)
+                else:
+                    tree.insert('', 'end', iid=name, values=values)
+            for name, c in snapshot['counters'].items():
+                values = (name, c['value'], "", "", "", "", "", c['per_second'] or "")
+                if tree.exists(name):
+                    tree.item(name, values=values)
+                else:
+                    tree.insert('', 'end', iid=name, values=values)
+            trace = f"，跟踪事件 {snapshot['trace_events']}" if metrics.tracing or snapshot['trace_events'] else ""
+            cache = self.qr_engine.cache.summary() if self.qr_engine.cache is not None else "渲染缓存未启用"
+            info_text.set(f"统计时长 {format_duration(snapshot['uptime'])}{trace}；{cache}")
+            window.after(1000, refresh)
+            
+        refresh()
+        
     def open_player_page(self):
         """打开播放页面"""
         player_path = os.path.join(os.getcwd(), "player.html")
@@ -549,12 +1579,25 @@ class AudioQRManager:
             'secret_key': self.secret_key.get(),
             'bucket_name': self.bucket_name.get(),
             'region': self.region.get(),
-            'output_dir': self.output_dir.get()
+            'output_dir': self.output_dir.get(),
+            'list_concurrency': self.list_concurrency,
+            'list_shards': self.list_shards,
+            'qr_workers': self.qr_engine.workers,
+            'log_level': self.log_level,
+            'qr_compress_level': self.qr_engine.settings['png_compress_level'],
+            'short_id_dir': self.short_id_dir,
+            'metadata_concurrency': self.metadata_concurrency,
+            **self.upload_config,
+            **self.sheet_config,
+            **self.watch_config,
+            'sources': self.source_config,
+            'qr_dedup': self.dedup,
+            **self.verify_config,
+            **self.cache_config
         }
         
         try:
-            with open('config.json', 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            core.save_config(config)
             messagebox.showinfo("成功", "配置已保存！")
         except Exception as e:
             messagebox.showerror("错误", f"保存配置失败：{str(e)}")
@@ -562,15 +1605,29 @@ class AudioQRManager:
     def load_config(self):
         """加载配置"""
         try:
-            if os.path.exists('config.json'):
-                with open('config.json', 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                    
-                self.secret_id.set(config.get('secret_id', ''))
-                self.secret_key.set(config.get('secret_key', ''))
-                self.bucket_name.set(config.get('bucket_name', 'audio-qr-1361719303'))
-                self.region.set(config.get('region', 'ap-chengdu'))
-                self.output_dir.set(config.get('output_dir', os.path.join(os.getcwd(), "qr_codes")))
+            config = core.load_config()
+            
+            self.secret_id.set(config['secret_id'])
+            self.secret_key.set(config['secret_key'])
+            self.bucket_name.set(config['bucket_name'])
+            self.region.set(config['region'])
+            self.output_dir.set(config['output_dir'])
+            self.list_concurrency = int(config['list_concurrency'])
+            self.list_shards = list(config['list_shards'])
+            self.qr_engine.workers = int(config['qr_workers'])
+            self.qr_engine.settings = core.render_settings(config)
+            self.qr_engine.cache = core.create_render_cache(config)
+            self.cache_config = {k: config[k] for k in ('qr_cache_dir', 'qr_cache_memory_mb', 'qr_cache_disk_mb')}
+            self.log_level = config['log_level']
+            self.short_id_dir = config['short_id_dir']
+            self.metadata_concurrency = int(config['metadata_concurrency'])
+            self.upload_config = {k: config[k] for k in ('upload_concurrency', 'upload_part_size_mb')}
+            self.sheet_config = {k: config[k] for k in self.sheet_config}
+            self.watch_config = {k: config[k] for k in self.watch_config}
+            self.source_config = list(config['sources'])
+            self.dedup = config['qr_dedup']
+            self.verify_config = {k: config[k] for k in self.verify_config}
+            setup_logging(self.log_level)
         except Exception as e:
             messagebox.showerror("错误", f"加载配置失败：{str(e)}")
             
@@ -600,7 +1657,7 @@ class AudioQRManager:
 
 5. 输出文件：
    - 二维码保存在指定的输出目录
-   - 文件名与音频文件名相同（PNG格式）
+   - 按对象键的目录层级保存，文件名为音频文件名加 .png
         """
         
         help_window = tk.Toplevel(self.root)
@@ -638,8 +1695,14 @@ class AudioQRManager:
         
     def run(self):
         """启动应用程序"""
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self.qr_engine.shutdown()
 
 if __name__ == "__main__":
+    # 打包为可执行文件时进程池需要
+    multiprocessing.freeze_support()
+    setup_logging()
     app = AudioQRManager()
     app.run()
\ No newline at end of file
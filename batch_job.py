@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可续传的批量生成任务
+功能: 批量生成开始时把任务描述原子写入输出目录，完成后删除；
+      程序关闭或崩溃后，图形界面或命令行都可以读取同一个任务继续生成，
+      已完成的输出由生成清单的日志记录，不会重复生成
+"""
+
+import json
+import os
+import time
+
+from qr_engine import QRManifest
+
+JOB_NAME = ".qr_job.json"
+
+
+class BatchJob:
+    """
+    批量生成任务描述
+
+    - bucket / mode：从本地快照 catalog.db 读取该存储桶的文件，按生成方式生成
+    - keys：只生成这些对象键（“生成选中项”）；为 None 时生成快照中的全部音频文件
+    - force：强制重新生成。开始时从清单中移除这些输出的记录，
+      之后与普通任务一样按清单续传，中断后继续不会再从头开始
+    - dedup：内容相同的音频如何合并（见 audio_qr_core.DEDUP_MODES），续传时沿用
+    """
+
+    def __init__(self, output_dir, bucket, mode, keys=None, force=False, created=None, dedup="off"):
+        self.output_dir = output_dir
+        self.bucket = bucket
+        self.mode = mode
+        self.keys = list(keys) if keys is not None else None
+        self.force = force
+        self.dedup = dedup
+        self.created = created or time.time()
+
+    @property
+    def path(self):
+        """任务文件路径"""
+        return os.path.join(self.output_dir, JOB_NAME)
+
+    @classmethod
+    def load(cls, output_dir):
+        """读取输出目录中未完成的任务，没有或已损坏时返回 None"""
+        try:
+            with open(os.path.join(output_dir, JOB_NAME), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(output_dir, data['bucket'], data['mode'], keys=data.get('keys'),
+                       force=data.get('force', False), created=data.get('created'),
+                       dedup=data.get('dedup', "off"))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self):
+        """先写临时文件再替换，避免中断时任务文件损坏"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'bucket': self.bucket,
+                'mode': self.mode,
+                'keys': self.keys,
+                'force': self.force,
+                'dedup': self.dedup,
+                'created': self.created
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def start(self, tasks):
+        """
+        开始任务：强制重新生成时先让清单忘记这些输出，再写入任务文件
+
+        Args:
+            tasks: 本任务的 [(content, path), ...]
+        """
+        if self.force:
+            manifest = QRManifest(self.output_dir)
+            manifest.forget(path for _, path in tasks)
+            manifest.save()
+        self.save()
+
+    def finish(self):
+        """任务全部完成，删除任务文件"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def select_files(self, files):
+        """从快照文件中选出本任务的文件（保持 keys 的顺序）"""
+        if self.keys is None:
+            return list(files)
+        by_key = {f.key: f for f in files}
+        return [by_key[key] for key in self.keys if key in by_key]
+
+    def describe(self):
+        """任务的简短描述"""
+        scope = f"{len(self.keys)} 个选中文件" if self.keys is not None else "全部音频文件"
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created))
+        return f"{self.bucket} / {scope} / {self.mode}（{started} 开始）"
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地COS替身
+功能: 在进程内模拟 CosS3Client.list_objects 的分页协议（Prefix/Delimiter/Marker/MaxKeys），
+      以及上传相关接口（put_object、head_object、delete_object、分块上传），
+      可生成任意数量的对象并注入每次请求的网络延迟，用于基准测试和离线调试
+"""
+
+import bisect
+import email.utils
+import hashlib
+import threading
+import time
+import uuid
+
+# 比任何合法对象键字符都大的哨兵，用于跳过某个公共前缀下的全部对象
+_PREFIX_END = "\U0010ffff"
+
+
+def generate_keys(count, folders=64, audio_ratio=0.9, root_files=16):
+    """
+    生成确定性的对象键列表
+
+    Args:
+        count: 对象总数
+        folders: 顶层目录数量（前缀分片的数量）
+        audio_ratio: 音频文件所占比例，其余为封面图片等非音频对象
+        root_files: 放在根目录下的对象数量
+    """
+    keys = []
+    audio_every = max(1, round(1 / (1 - audio_ratio))) if audio_ratio < 1 else 0
+    for i in range(count):
+        ext = ".jpg" if audio_every and i % audio_every == 0 else ".mp3"
+        if i < root_files:
+            keys.append(f"root_{i:07d}{ext}")
+        else:
+            keys.append(f"album{i % folders:04d}/track{i:07d}{ext}")
+    return keys
+
+
+class FakeCosServiceError(Exception):
+    """与 CosServiceError 接口一致的服务端错误"""
+
+    def __init__(self, status_code, error_code):
+        super().__init__(f"{status_code} {error_code}")
+        self.status_code = status_code
+        self.error_code = error_code
+
+    def get_status_code(self):
+        return self.status_code
+
+    def get_error_code(self):
+        return self.error_code
+
+
+class FakeCosClient:
+    """
+    进程内的 CosS3Client 替身
+
+    只实现本项目用到的接口，返回值结构与SDK一致：
+    IsTruncated 为字符串 'true'/'false'，Size 为字符串，ETag 带引号。
+    latency 为每次请求的模拟往返时间（秒），sleep期间释放GIL，可真实反映并发收益。
+    上传的对象内容保存在内存中（uploaded），ETag 规则与COS相同：简单上传为MD5，分块上传为
+    各分块MD5拼接后的MD5加 -分块数；fail_part_numbers 中的分块上传时返回500，用于模拟中断。
+    """
+
+    def __init__(self, keys=None, latency=0.0, last_modified="2024-01-01T00:00:00.000Z"):
+        self.keys = sorted(keys or [])
+        self.latency = latency
+        self.last_modified = last_modified
+        self.request_count = 0
+        self.uploaded = {}
+        self.multipart = {}
+        self.fail_part_numbers = set()
+        self._lock = threading.Lock()
+
+    def _request(self):
+        """统计请求次数并模拟网络延迟"""
+        with self._lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _content(self, key):
+        """构造 Contents 条目"""
+        if key in self.uploaded:
+            obj = self.uploaded[key]
+            return {
+                'Key': key,
+                'LastModified': obj['last_modified'],
+                'ETag': f'"{obj["etag"]}"',
+                'Size': str(len(obj['data'])),
+                'StorageClass': 'STANDARD'
+            }
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return {
+            'Key': key,
+            'LastModified': self.last_modified,
+            'ETag': f'"{digest}"',
+            'Size': str(1024 + len(key) * 1000),
+            'StorageClass': 'STANDARD'
+        }
+
+    def list_objects(self, Bucket, Prefix="", Delimiter="", Marker="", MaxKeys=1000, EncodingType="", **kwargs):
+        """按对象键字典序分页列举"""
+        self._request()
+
+        start = max(bisect.bisect_left(self.keys, Prefix), bisect.bisect_right(self.keys, Marker))
+        if Delimiter and Marker.endswith(Delimiter):
+            # 上一页以公共前缀结束时，跳过该前缀下的全部对象
+            start = max(start, bisect.bisect_left(self.keys, Marker + _PREFIX_END))
+        contents = []
+        common_prefixes = []
+        last = None
+        i = start
+        while i < len(self.keys) and len(contents) + len(common_prefixes) < MaxKeys:
+            key = self.keys[i]
+            if not key.startswith(Prefix):
+                break
+            if Delimiter:
+                pos = key.find(Delimiter, len(Prefix))
+                if pos >= 0:
+                    common_prefix = key[:pos + len(Delimiter)]
+                    common_prefixes.append({'Prefix': common_prefix})
+                    last = common_prefix
+                    i = bisect.bisect_left(self.keys, common_prefix + _PREFIX_END)
+                    continue
+            contents.append(self._content(key))
+            last = key
+            i += 1
+
+        truncated = i < len(self.keys) and self.keys[i].startswith(Prefix)
+        response = {
+            'Name': Bucket,
+            'Prefix': Prefix,
+            'Marker': Marker,
+            'MaxKeys': str(MaxKeys),
+            'IsTruncated': 'true' if truncated else 'false'
+        }
+        if Delimiter:
+            response['Delimiter'] = Delimiter
+        if contents:
+            response['Contents'] = contents
+        if common_prefixes:
+            response['CommonPrefixes'] = common_prefixes
+        if truncated:
+            response['NextMarker'] = last
+        return response
+
+    def set_built_in_connection_pool_max_size(self, PoolConnections, PoolMaxSize):
+        """与SDK接口保持一致，替身不需要连接池"""
+
+    def _store(self, key, data, etag, metadata):
+        """保存上传的对象（新对象按键序加入列举结果）"""
+        with self._lock:
+            if key not in self.uploaded and key not in self.keys:
+                bisect.insort(self.keys, key)
+            self.uploaded[key] = {
+                'data': data,
+                'etag': etag,
+                'metadata': dict(metadata or {}),
+                'last_modified': time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+            }
+
+    def put_object(self, Bucket, Body, Key, Metadata=None, **kwargs):
+        """简单上传，Body 可以是字节或文件对象"""
+        self._request()
+        data = Body.read() if hasattr(Body, 'read') else bytes(Body)
+        etag = hashlib.md5(data).hexdigest()
+        self._store(Key, data, etag, Metadata)
+        return {'ETag': f'"{etag}"'}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        """删除对象（不存在时与COS一样视为成功）"""
+        self._request()
+        with self._lock:
+            index = bisect.bisect_left(self.keys, Key)
+            if index < len(self.keys) and self.keys[index] == Key:
+                del self.keys[index]
+            self.uploaded.pop(Key, None)
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        """返回对象的响应头，不存在时抛出404"""
+        self._request()
+        index = bisect.bisect_left(self.keys, Key)
+        if index >= len(self.keys) or self.keys[index] != Key:
+            raise FakeCosServiceError(404, "NoSuchResource")
+        content = self._content(Key)
+        headers = {
+            'ETag': content['ETag'],
+            'Content-Length': content['Size'],
+            'Last-Modified': email.utils.formatdate(time.time(), usegmt=True)
+        }
+        headers.update(self.uploaded.get(Key, {}).get('metadata', {}))
+        return headers
+
+    def create_multipart_upload(self, Bucket, Key, Metadata=None, **kwargs):
+        """开始分块上传"""
+        self._request()
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self.multipart[upload_id] = {'key': Key, 'parts': {}, 'metadata': Metadata}
+        return {'Bucket': Bucket, 'Key': Key, 'UploadId': upload_id}
+
+    def _upload(self, UploadId, Key):
+        """查找进行中的分块上传"""
+        upload = self.multipart.get(UploadId)
+        if upload is None or upload['key'] != Key:
+            raise FakeCosServiceError(404, "NoSuchUpload")
+        return upload
+
+    def upload_part(self, Bucket, Key, Body, PartNumber, UploadId, **kwargs):
+        """上传一个分块"""
+        self._request()
+        upload = self._upload(UploadId, Key)
+        if PartNumber in self.fail_part_numbers:
+            raise FakeCosServiceError(500, "InternalError")
+        data = Body.read() if hasattr(Body, 'read') else bytes(Body)
+        etag = hashlib.md5(data).hexdigest()
+        with self._lock:
+            upload['parts'][PartNumber] = (data, etag)
+        return {'ETag': f'"{etag}"'}
+
+    def list_parts(self, Bucket, Key, UploadId, MaxParts=1000, PartNumberMarker=0, **kwargs):
+        """分页列出已上传的分块"""
+        self._request()
+        upload = self._upload(UploadId, Key)
+        numbers = sorted(n for n in upload['parts'] if n > int(PartNumberMarker))
+        page = numbers[:MaxParts]
+        response = {
+            'Part': [{'PartNumber': str(n), 'ETag': f'"{upload["parts"][n][1]}"',
+                      'Size': str(len(upload['parts'][n][0]))} for n in page],
+            'IsTruncated': 'true' if len(numbers) > MaxParts else 'false'
+        }
+        if len(numbers) > MaxParts:
+            response['NextPartNumberMarker'] = str(page[-1])
+        return response
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload=None, **kwargs):
+        """按给出的分块列表合并对象"""
+        self._request()
+        upload = self._upload(UploadId, Key)
+        parts = (MultipartUpload or {}).get('Part', [])
+        chunks = []
+        digests = []
+        for part in parts:
+            data, etag = upload['parts'][int(part['PartNumber'])]
+            if part['ETag'].strip('"') != etag:
+                raise FakeCosServiceError(400, "InvalidPart")
+            chunks.append(data)
+            digests.append(bytes.fromhex(etag))
+        etag = hashlib.md5(b"".join(digests)).hexdigest() + f"-{len(parts)}"
+        self._store(Key, b"".join(chunks), etag, upload['metadata'])
+        with self._lock:
+            del self.multipart[UploadId]
+        return {'Bucket': Bucket, 'Key': Key, 'ETag': f'"{etag}"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        """放弃分块上传"""
+        self._request()
+        self._upload(UploadId, Key)
+        with self._lock:
+            del self.multipart[UploadId]
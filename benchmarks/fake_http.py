@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地HTTP替身
+功能: 在本机端口上模拟公共读的COS对象和播放页面，供地址检查（link_checker）的基准测试与手工验证使用；
+      可指定返回403/404的路径、模拟往返延迟、模拟不支持HEAD的服务器，并统计请求次数
+"""
+
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeHttpServer:
+    """
+    本地HTTP替身
+
+    默认所有路径都返回200；statuses 为 {路径: 状态码}（路径不含查询参数，已解码）。
+    latency 为每个请求的模拟延迟（秒），head_allowed=False 时 HEAD 返回405（只接受 GET）。
+    """
+
+    def __init__(self, statuses=None, latency=0.0, head_allowed=True, host="127.0.0.1", port=0):
+        self.statuses = dict(statuses or {})
+        self.latency = latency
+        self.head_allowed = head_allowed
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def respond(self, method):
+                path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+                with server._lock:
+                    server.requests.append((method, path))
+                if server.latency:
+                    time.sleep(server.latency)
+                status = server.statuses.get(path, 200)
+                if method == "HEAD" and not server.head_allowed:
+                    status = 405
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_HEAD(self):
+                self.respond("HEAD")
+
+            def do_GET(self):
+                self.respond("GET")
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}/"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """停止服务"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
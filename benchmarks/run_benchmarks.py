@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+功能: 使用本地COS替身，分别测量列举、目录构建、二维码编码、光栅化和PNG保存的耗时，
+      以及按需生成二维码HTTP服务的吞吐、公网地址检查（本地HTTP替身）的吞吐，
+      结果写入JSON文件，便于跟踪性能回归
+
+用法:
+    python benchmarks/run_benchmarks.py --sizes 10000,100000 --latency 0.02
+    python benchmarks/run_benchmarks.py --sizes 1000000 --skip-serial --compare bench_results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_cos import FakeCosClient, generate_keys  # noqa: E402
+
+import audio_qr_core as core  # noqa: E402
+from cos_lister import ShardedLister  # noqa: E402
+from file_catalog import FileCatalog, FileIndex  # noqa: E402
+from qr_engine import DEFAULT_RENDER_SETTINGS, rasterize  # noqa: E402
+
+BUCKET = "bench-1250000000"
+REGION = "ap-chengdu"
+
+# 相对上一次结果变慢超过该比例时标记为回归
+REGRESSION_THRESHOLD = 0.10
+MIN_COMPARE_SECONDS = 0.05
+
+
+class Timer:
+    """记录单项基准的耗时"""
+
+    def __init__(self, results, name, count, **extra):
+        self.results = results
+        self.name = name
+        self.count = count
+        self.extra = extra
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            return False
+        seconds = time.perf_counter() - self.start
+        entry = {
+            'name': self.name,
+            'count': self.count,
+            'seconds': round(seconds, 6),
+            'per_second': round(self.count / seconds, 1) if seconds > 0 else None,
+            'us_per_item': round(seconds / self.count * 1e6, 2) if self.count else None
+        }
+        entry.update(self.extra)
+        self.results.append(entry)
+        print(f"  {self.name:<28} {seconds:9.3f}s  {entry['per_second'] or 0:>12,.0f}/s", flush=True)
+        return False
+
+
+def bench_listing(results, size, args):
+    """列举、目录快照与内存索引"""
+    print(f"[{size:,} 个对象, 延迟 {args.latency * 1000:.0f}ms]")
+    client = FakeCosClient(generate_keys(size, folders=args.folders), latency=args.latency)
+
+    if not args.skip_serial:
+        client.request_count = 0
+        with Timer(results, "list.serial", size, objects=size) as t:
+            serial = ShardedLister(client, BUCKET, REGION, concurrency=1).list_audio_files()
+        t.extra['requests'] = client.request_count
+    else:
+        serial = None
+
+    client.request_count = 0
+    with Timer(results, "list.sharded", size, objects=size, concurrency=args.concurrency) as t:
+        files = ShardedLister(client, BUCKET, REGION, concurrency=args.concurrency).list_audio_files()
+    t.extra['requests'] = client.request_count
+    if serial is not None and serial != files:
+        raise AssertionError("并发列举结果与串行遍历不一致")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        catalog = FileCatalog(os.path.join(tmp_dir, "catalog.db"))
+        with Timer(results, "catalog.snapshot_full", len(files), objects=size):
+            catalog.apply_snapshot(BUCKET, files)
+        with Timer(results, "catalog.snapshot_noop", len(files), objects=size):
+            catalog.apply_snapshot(BUCKET, files)
+        with Timer(results, "catalog.load", len(files), objects=size):
+            catalog.load(BUCKET)
+        catalog.close()
+
+    with Timer(results, "index.build", len(files), objects=size):
+        FileIndex().set_files(files)
+
+    return files
+
+
+def bench_qr(results, files, args):
+    """二维码编码、光栅化、PNG保存分阶段计时"""
+    import qrcode
+
+    sample = files[:args.qr_samples]
+    payloads = [core.get_qr_content(f, args.mode) for f in sample]
+    settings = DEFAULT_RENDER_SETTINGS
+    print(f"[二维码 {len(payloads):,} 个, 生成方式 {args.mode}]")
+
+    codes = []
+    with Timer(results, "qr.encode", len(payloads), mode=args.mode) as t:
+        for payload in payloads:
+            qr = qrcode.QRCode(version=settings['version'], box_size=settings['box_size'], border=settings['border'])
+            qr.add_data(payload)
+            qr.make(fit=True)
+            codes.append(qr)
+    t.extra['avg_version'] = round(sum(qr.version for qr in codes) / len(codes), 2) if codes else None
+
+    # 逐模块绘制作为对照
+    with Timer(results, "qr.rasterize_pil", len(codes), mode=args.mode):
+        for qr in codes:
+            qr.make_image(fill_color=settings['fill_color'], back_color=settings['back_color'])
+
+    images = []
+    with Timer(results, "qr.rasterize", len(codes), mode=args.mode):
+        for qr in codes:
+            images.append(rasterize(qr, settings))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with Timer(results, "qr.png_save", len(images), mode=args.mode,
+                   compress_level=settings['png_compress_level']) as t:
+            for i, img in enumerate(images):
+                img.save(os.path.join(tmp_dir, f"{i}.png"), compress_level=settings['png_compress_level'])
+        total_bytes = sum(entry.stat().st_size for entry in os.scandir(tmp_dir))
+        t.extra['avg_png_bytes'] = round(total_bytes / len(images)) if images else None
+
+
+def bench_server(results, files, args):
+    """按需生成二维码服务：冷请求（渲染）、热请求（内存LRU）与带 If-None-Match 的复查（304）"""
+    from concurrent.futures import ThreadPoolExecutor
+    from http.client import HTTPConnection
+
+    from qr_engine import QRBatchEngine
+    from qr_server import QRServer
+
+    sample = files[:args.serve_requests]
+    paths = [f"/qr/{urllib.parse.quote(f.key)}.png?mode={args.mode}" for f in sample]
+    print(f"[二维码服务 {len(paths):,} 个请求, {args.serve_clients} 个长连接客户端]")
+
+    def fetch(port, batch, etags):
+        connection = HTTPConnection("127.0.0.1", port)
+        results = []
+        for path in batch:
+            headers = {"If-None-Match": etags[path]} if etags else {}
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            results.append((path, response.status, response.getheader("ETag")))
+        connection.close()
+        return results
+
+    def run_clients(port, etags=None):
+        batches = [paths[i::args.serve_clients] for i in range(args.serve_clients)]
+        with ThreadPoolExecutor(max_workers=args.serve_clients) as pool:
+            responses = [r for batch in pool.map(lambda b: fetch(port, b, etags), batches) for r in batch]
+        return {status for _, status, _ in responses}, {path: etag for path, _, etag in responses}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        catalog = FileCatalog(os.path.join(tmp_dir, "catalog.db"))
+        catalog.apply_snapshot(BUCKET, sample)
+        engine = QRBatchEngine()
+        server = QRServer(catalog, BUCKET, engine, mode=args.mode)
+        httpd = server.serve("127.0.0.1", 0)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        port = httpd.server_address[1]
+        try:
+            with Timer(results, "serve.cold", len(paths), clients=args.serve_clients, workers=engine.workers):
+                statuses, etags = run_clients(port)
+            with Timer(results, "serve.hot", len(paths), clients=args.serve_clients):
+                statuses |= run_clients(port)[0]
+            with Timer(results, "serve.revalidate", len(paths), clients=args.serve_clients):
+                revalidated = run_clients(port, etags)[0]
+        finally:
+            server.shutdown()
+            httpd.server_close()
+            engine.shutdown()
+            catalog.close()
+    if statuses != {200} or revalidated != {304}:
+        raise AssertionError(f"二维码服务响应异常: {statuses} / {revalidated}")
+
+
+def bench_links(results, files, args):
+    """公网地址检查：首次检查（HEAD请求）与TTL内沿用快照中的结果（不发请求）"""
+    from fake_http import FakeHttpServer
+    from file_catalog import AudioFile
+
+    sample = files[:args.link_checks]
+    # 每10个对象中有一个不是公共读
+    denied = {"/" + f.key for f in sample[::10]}
+    server = FakeHttpServer(statuses={path: 403 for path in denied}, latency=args.link_latency)
+    sample = [AudioFile(f.key, f.size, f.last_modified, f.etag, server.base_url) for f in sample]
+    print(f"[地址检查 {len(sample):,} 个地址, 延迟 {args.link_latency * 1000:.0f}ms, {args.link_concurrency} 个并发]")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        catalog = FileCatalog(os.path.join(tmp_dir, "catalog.db"))
+        try:
+            with Timer(results, "links.check", len(sample), concurrency=args.link_concurrency):
+                first = core.verify_links(catalog, sample, "direct", concurrency=args.link_concurrency, rate=0)
+            requests = len(server.requests)
+            with Timer(results, "links.cached", len(sample)):
+                second = core.verify_links(catalog, sample, "direct", concurrency=args.link_concurrency, rate=0)
+        finally:
+            catalog.close()
+            server.close()
+    # 无法访问的地址每次都重新检查，其余沿用
+    if (first['checked'] != len(sample) or len(first['problems']) != len(denied) or requests != len(sample)
+            or second['checked'] != len(denied) or second['problems'].keys() != first['problems'].keys()):
+        raise AssertionError(f"地址检查结果异常: {first['checked']} / {len(first['problems'])} / {second['checked']}")
+
+
+def compare(results, previous_path):
+    """与上一次结果比较，输出变慢超过阈值的项目"""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = {(r['name'], r.get('objects')): r for r in json.load(f)['results']}
+
+    regressions = []
+    print(f"\n与 {previous_path} 比较（单项耗时 us/item）:")
+    for r in results:
+        old = previous.get((r['name'], r.get('objects')))
+        # 总耗时过短的项目受计时噪声影响大，不参与比较
+        if not old or not old.get('us_per_item') or old['seconds'] < MIN_COMPARE_SECONDS:
+            continue
+        ratio = r['us_per_item'] / old['us_per_item']
+        mark = "  <-- 回归" if ratio > 1 + REGRESSION_THRESHOLD else ""
+        print(f"  {r['name']:<28} {old['us_per_item']:10.2f} -> {r['us_per_item']:10.2f}  x{ratio:.2f}{mark}")
+        if mark:
+            regressions.append(r['name'])
+    return regressions
+
+
+def main(argv=None):
+    """基准测试主函数"""
+    parser = argparse.ArgumentParser(description="音频二维码管理性能基准测试")
+    parser.add_argument("--sizes", default="10000,100000", help="对象数量，逗号分隔（例如 10000,100000,1000000）")
+    parser.add_argument("--latency", type=float, default=0.02, help="每次list_objects的模拟延迟（秒）")
+    parser.add_argument("--folders", type=int, default=64, help="顶层目录数量")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发列举线程数")
+    parser.add_argument("--skip-serial", action="store_true", help="跳过串行列举（大规模时很慢）")
+    parser.add_argument("--qr-samples", type=int, default=500, help="二维码基准的样本数")
+    parser.add_argument("--mode", choices=core.QR_MODES, default=core.DEFAULT_QR_MODE, help="二维码生成方式")
+    parser.add_argument("--serve-requests", type=int, default=2000, help="二维码服务基准的请求数（0 跳过）")
+    parser.add_argument("--serve-clients", type=int, default=16, help="二维码服务基准的并发客户端数")
+    parser.add_argument("--link-checks", type=int, default=2000, help="地址检查基准的地址数（0 跳过）")
+    parser.add_argument("--link-latency", type=float, default=0.01, help="本地HTTP替身每个请求的模拟延迟（秒）")
+    parser.add_argument("--link-concurrency", type=int, default=16, help="地址检查的并发数")
+    parser.add_argument("--output", default="bench_results.json", help="结果输出文件")
+    parser.add_argument("--compare", help="与之前的结果文件比较")
+    args = parser.parse_args(argv)
+
+    results = []
+    files = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        files = bench_listing(results, size, args) or files
+    if args.qr_samples and files:
+        bench_qr(results, files, args)
+    if args.serve_requests and files:
+        bench_server(results, files, args)
+    if args.link_checks and files:
+        bench_links(results, files, args)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': vars(args),
+        'results': results
+    }
+
+    regressions = compare(results, args.compare) if args.compare else []
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.output}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多存储桶、多地域的文件来源
+功能: BucketSource 描述一个（存储桶, 地域）来源；CosClientPool 按地域复用COS客户端及其连接池；
+      SourceCatalog 并发列举全部来源、分别更新本地快照，并合并为按来源标记的统一视图
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app_logging import get_logger
+from app_metrics import get_metrics
+from cos_lister import ShardedLister, DEFAULT_LIST_CONCURRENCY, build_base_url
+
+logger = get_logger("sources")
+metrics = get_metrics()
+
+# 同时列举的来源数上限，每个来源内部再按 list_concurrency 分片并发
+MAX_PARALLEL_SOURCES = 4
+
+
+class BucketSource:
+    """
+    一个文件来源：存储桶与地域
+
+    name 用于界面和命令行中标记来源，也是多来源批量生成时的输出子目录，默认为存储桶名称。
+    """
+
+    def __init__(self, bucket, region, name=None):
+        self.bucket = bucket
+        self.region = region
+        self.name = name or bucket
+        self.base_url = build_base_url(bucket, region)
+
+    @classmethod
+    def from_dict(cls, data):
+        """由配置项 {"bucket": ..., "region": ..., "name": 可选} 构造"""
+        return cls(data['bucket'], data['region'], data.get('name'))
+
+    def to_dict(self):
+        """转换为配置项"""
+        return {'bucket': self.bucket, 'region': self.region, 'name': self.name}
+
+    def __repr__(self):
+        return f"BucketSource({self.bucket!r}, {self.region!r})"
+
+
+class CosClientPool:
+    """
+    按地域复用的COS客户端
+
+    COS客户端的地域在创建时确定，同一地域的多个存储桶共用一个客户端（及其内置HTTP连接池），
+    不同地域各创建一个；客户端在首次使用时创建，可被多个列举线程同时获取。
+    """
+
+    def __init__(self, factory):
+        """
+        Args:
+            factory: factory(region) -> CosS3Client
+        """
+        self.factory = factory
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, region):
+        """取得该地域的客户端"""
+        with self._lock:
+            client = self._clients.get(region)
+            if client is None:
+                client = self._clients[region] = self.factory(region)
+            return client
+
+    def __len__(self):
+        return len(self._clients)
+
+
+class SourceCatalog:
+    """
+    多个来源合并的文件视图
+
+    快照仍按存储桶保存在同一个 FileCatalog 中；合并后的列表按来源顺序、来源内按对象键排序。
+    文件记录不额外保存来源，source_of() 按共享的地址前缀（base_url）查出所属来源。
+    """
+
+    def __init__(self, catalog, sources):
+        self.catalog = catalog
+        self.sources = list(sources)
+        self._by_base_url = {source.base_url: source for source in self.sources}
+        if len(self._by_base_url) != len(self.sources):
+            raise ValueError("来源中有重复的存储桶")
+        if len({source.name for source in self.sources}) != len(self.sources):
+            raise ValueError("来源名称不能重复")
+
+    def source_of(self, file_info):
+        """文件所属的来源，不属于任何来源时返回 None"""
+        return self._by_base_url.get(file_info.base_url)
+
+    def load(self):
+        """读取全部来源的本地快照，合并为一个列表"""
+        files = []
+        for source in self.sources:
+            files.extend(self.catalog.load(source.bucket))
+        return files
+
+    def refresh(self, pool, concurrency=DEFAULT_LIST_CONCURRENCY, on_progress=None):
+        """
+        并发列举全部来源，并分别更新本地快照
+
+        最多 MAX_PARALLEL_SOURCES 个来源同时列举，总线程数不超过 concurrency；
+        某个来源列举失败不影响其他来源，失败来源的快照保持不变。
+
+        Args:
+            pool: CosClientPool
+            on_progress: 进度回调 on_progress(scanned)，scanned 为全部来源已扫描的对象总数
+
+        Returns:
+            (files, results): 合并后的文件列表，以及每个来源的
+            {'source', 'files', 'scanned', 'added', 'changed', 'deleted', 'error'}
+        """
+        parallel = max(1, min(len(self.sources), MAX_PARALLEL_SOURCES))
+        per_source = max(1, concurrency // parallel)
+        scanned = {}
+        lock = threading.Lock()
+
+        def progress(source, n):
+            with lock:
+                scanned[source.name] = n
+                total = sum(scanned.values())
+            if on_progress:
+                on_progress(total)
+
+        def list_source(source):
+            lister = ShardedLister(pool.get(source.region), source.bucket, source.region,
+                                   concurrency=per_source, on_progress=lambda n: progress(source, n))
+            result = {'source': source, 'files': [], 'scanned': 0, 'added': 0, 'changed': 0, 'deleted': 0,
+                      'error': None}
+            try:
+                with metrics.timer("cos.list_source"):
+                    files = lister.list_audio_files()
+                diff = self.catalog.apply_snapshot(source.bucket, files)
+            except Exception as e:
+                logger.exception("列举 %s (%s) 失败: %s", source.bucket, source.region, e)
+                result['error'] = str(e)
+                result['files'] = self.catalog.load(source.bucket)
+                return result
+            result.update(files=files, scanned=lister.total_scanned, added=len(diff['added']),
+                          changed=len(diff['changed']), deleted=len(diff['deleted']))
+            logger.info("%s: 扫描 %d, 音频 %d, 新增 %d, 变更 %d, 删除 %d", source.name, result['scanned'],
+                        len(files), result['added'], result['changed'], result['deleted'])
+            return result
+
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            results = list(executor.map(list_source, self.sources))
+
+        files = []
+        for result in results:
+            files.extend(result.pop('files'))
+        return files, results
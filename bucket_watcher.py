@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储桶监视
+功能: 长时间运行，按前缀分区轮询存储桶，只把新增、变更的音频交给二维码生成，
+      删除的对象从快照中移除并清理其二维码输出；
+      平时只从分区内已知的最后一个对象键之后继续列举（新上传的对象），完整核对按退避上限的周期进行；
+      最近有上传（按 LastModified 判断）的分区按基础间隔轮询，长时间没有变化的分区指数退避，
+      间隔带随机抖动，列举并发有上限，不需要反复完整列举整个存储桶
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from app_logging import get_logger
+from app_metrics import get_metrics
+
+logger = get_logger("watcher")
+metrics = get_metrics()
+
+# 活跃分区的轮询间隔与空闲分区退避的上限（秒）
+DEFAULT_WATCH_INTERVAL = 5
+DEFAULT_WATCH_MAX_INTERVAL = 120
+# 分区内最新对象在这段时间内修改过时视为活跃，保持基础间隔
+DEFAULT_HOT_WINDOW = 3600
+# 实际间隔在 ±20% 内随机，多个分区（或多个监视进程）的请求不会同时到达
+WATCH_JITTER = 0.2
+DEFAULT_WATCH_CONCURRENCY = 4
+
+# 等待下一轮时最多睡眠这么久，及时响应停止与暂停
+WAIT_SLICE_SECONDS = 1.0
+# 汇总中保留的最近失败数
+MAX_RECENT_FAILURES = 1000
+
+
+def parse_last_modified(value):
+    """COS的 LastModified（如 2024-01-01T08:00:00.000Z）转换为时间戳，无法解析时返回 None"""
+    try:
+        return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class WatchScope:
+    """
+    一个轮询分区
+
+    prefix 为对象键前缀；delimiter 不为空时只列举该层级（自动分区的根目录）。
+    keys 为上次看到的 {对象键: (大小, LastModified, ETag)}，newest 为分区内最新的 LastModified
+    （ISO时间字符串可直接比较大小），last_key 为字典序最大的对象键，full_due 为下次完整核对的时刻。
+    """
+
+    def __init__(self, prefix, delimiter=""):
+        self.prefix = prefix
+        self.delimiter = delimiter
+        self.keys = {}
+        self.newest = ""
+        self.last_key = ""
+        self.delay = 0.0
+        self.due = 0.0
+        self.full_due = 0.0
+        self.errors = 0
+        self.polls = 0
+
+    def load(self, files):
+        """用快照中的记录初始化状态"""
+        for f in files:
+            self.keys[f.key] = (f.size, f.last_modified, f.etag)
+            self.newest = max(self.newest, f.last_modified)
+            self.last_key = max(self.last_key, f.key)
+
+    def merge(self, files):
+        """
+        并入只列举了 last_key 之后部分的结果（不能据此判断删除）
+
+        Returns:
+            (added, changed): 新增、变更的文件记录
+        """
+        added = []
+        changed = []
+        for f in files:
+            state = (f.size, f.last_modified, f.etag)
+            old = self.keys.get(f.key)
+            if old is None:
+                added.append(f)
+            elif old != state:
+                changed.append(f)
+            self.keys[f.key] = state
+            self.newest = max(self.newest, f.last_modified)
+            self.last_key = max(self.last_key, f.key)
+        return added, changed
+
+    def update(self, files):
+        """
+        与本次完整列举的结果比较并替换状态
+
+        Returns:
+            (added, changed, deleted): 新增、变更的文件记录与已删除的对象键
+        """
+        added = []
+        changed = []
+        current = {}
+        for f in files:
+            state = (f.size, f.last_modified, f.etag)
+            old = self.keys.get(f.key)
+            if old is None:
+                added.append(f)
+            elif old != state:
+                changed.append(f)
+            current[f.key] = state
+            self.newest = max(self.newest, f.last_modified)
+        deleted = [key for key in self.keys if key not in current]
+        self.keys = current
+        self.last_key = max(current, default="")
+        return added, changed, deleted
+
+    def forget(self, key):
+        """忘记一个对象（生成失败），下次完整核对时重新当作新增处理"""
+        self.keys.pop(key, None)
+
+
+class BucketWatcher:
+    """
+    按前缀分区轮询存储桶并增量生成二维码
+
+    分区方式：
+    1. 配置了 prefixes 时，每个前缀（含子目录）是一个分区，其他位置的对象不监视
+    2. 未配置时自动分区：根目录用 Delimiter='/' 列举（同时发现顶层前缀），每个顶层前缀是一个分区，
+       新出现的前缀立即加入，已消失且没有对象的前缀移除
+
+    启动时用本地快照初始化各分区并全部完整列举一次（补上停止期间的变化），之后每轮只列举到期的分区：
+    本轮有变化或最新对象在 hot_window 内修改过的分区按 interval 轮询，其余每次空闲间隔翻倍，
+    直到 max_interval；列举失败同样按失败次数退避。各分区在不超过 concurrency 个线程中并发列举。
+
+    平时的轮询只从分区内字典序最大的对象键（根目录分区还包括已知的顶层前缀）之后继续列举，
+    请求数只与新上传的对象数有关；按序号或时间命名的上传总是排在最后，可以立即发现。
+    覆盖上传、删除以及排在已有对象之前的新对象，要等到每个分区约 max_interval 一次的完整核对才会发现。
+
+    变化先写入快照，新增和变更的文件再交给 generate(files) 生成，生成失败的对象从快照中移除，
+    下次完整核对时重试；删除的对象从快照中移除，并交给 discard(keys) 清理二维码输出。
+    """
+
+    def __init__(self, lister, catalog, generate, prefixes=None, interval=DEFAULT_WATCH_INTERVAL,
+                 max_interval=DEFAULT_WATCH_MAX_INTERVAL, hot_window=DEFAULT_HOT_WINDOW, jitter=WATCH_JITTER,
+                 concurrency=DEFAULT_WATCH_CONCURRENCY, on_changes=None, discard=None):
+        """
+        Args:
+            lister: ShardedLister（使用其 list_scope() 列举单个前缀）
+            catalog: FileCatalog，变化写入其中
+            generate: generate(files) -> [(key, error), ...]，为新增或变更的文件生成二维码
+            prefixes: 要监视的前缀列表，为空时自动按顶层目录分区
+            on_changes: 每轮有变化时回调 on_changes(diff, failures)，diff 与 apply_snapshot() 的返回值相同
+            discard: 可选的 discard(keys)，删除已从存储桶删除的对象的二维码输出
+        """
+        self.lister = lister
+        self.bucket = lister.bucket
+        self.catalog = catalog
+        self.generate = generate
+        self.discard = discard
+        self.interval = max(0.1, float(interval))
+        self.max_interval = max(self.interval, float(max_interval))
+        self.hot_window = hot_window
+        self.jitter = jitter
+        self.concurrency = max(1, int(concurrency or 1))
+        self.on_changes = on_changes
+
+        # 嵌套的前缀已被外层前缀覆盖，只保留外层
+        prefixes = sorted(set(prefixes or []))
+        self.prefixes = [p for i, p in enumerate(prefixes) if not any(p.startswith(q) for q in prefixes[:i])]
+        self.scopes = {}
+        self._discovered = None
+
+        self.rounds = 0
+        self.added = 0
+        self.changed = 0
+        self.deleted = 0
+        self.processed = 0
+        self.failures = deque(maxlen=MAX_RECENT_FAILURES)
+        self._stop = threading.Event()
+        self._executor = None
+
+        self._load_state()
+
+    def _owner(self, key):
+        """对象键所属分区的前缀，不在监视范围内时返回 None"""
+        if self.prefixes:
+            for prefix in self.prefixes:
+                if key.startswith(prefix):
+                    return prefix
+            return None
+        slash = key.find("/")
+        return key[:slash + 1] if slash >= 0 else ""
+
+    def _add_scope(self, prefix):
+        """加入一个分区（到期时间为0，下一轮立即轮询）"""
+        scope = WatchScope(prefix, "/" if not self.prefixes and not prefix else "")
+        self.scopes[prefix] = scope
+        return scope
+
+    def _load_state(self):
+        """按本地快照建立各分区"""
+        for prefix in self.prefixes or [""]:
+            self._add_scope(prefix)
+        grouped = {}
+        for f in self.catalog.load(self.bucket):
+            prefix = self._owner(f.key)
+            if prefix is not None:
+                grouped.setdefault(prefix, []).append(f)
+        for prefix, files in grouped.items():
+            scope = self.scopes.get(prefix) or self._add_scope(prefix)
+            scope.load(files)
+        logger.info("监视 %s: %d 个分区，快照中 %d 个音频文件",
+                    self.bucket, len(self.scopes), sum(len(s.keys) for s in self.scopes.values()))
+
+    def _is_hot(self, scope, now_wall):
+        """分区内最新对象是否在 hot_window 内修改过"""
+        newest = parse_last_modified(scope.newest)
+        return newest is not None and now_wall - newest < self.hot_window
+
+    def _schedule(self, scope, active, now, now_wall):
+        """安排分区的下次轮询"""
+        if scope.errors:
+            delay = min(self.interval * 2 ** scope.errors, self.max_interval)
+        elif active or self._is_hot(scope, now_wall):
+            delay = self.interval
+        else:
+            delay = min(max(scope.delay, self.interval) * 2, self.max_interval)
+        scope.delay = delay
+        scope.due = now + delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _marker(self, scope):
+        """只列举新对象时的起点：分区内最大的对象键，根目录分区还要跳过已知的顶层前缀"""
+        marker = scope.last_key
+        if scope.delimiter:
+            marker = max([marker] + [prefix for prefix in self.scopes if prefix])
+        return marker
+
+    def _list(self, job):
+        """列举一个分区（marker 为 None 时完整列举），返回 (files, prefixes, error)"""
+        scope, marker = job
+        try:
+            with metrics.timer("watch.list_scope" if marker is None else "watch.list_tail"):
+                files, prefixes = self.lister.list_scope(scope.prefix, scope.delimiter, marker or "")
+            return files, prefixes, None
+        except Exception as e:
+            return None, None, e
+
+    def poll_once(self):
+        """
+        轮询所有到期的分区一次
+
+        Returns:
+            dict: 本轮的 {'added', 'changed', 'deleted'}，没有到期分区时返回 None
+        """
+        now = time.monotonic()
+        due = [scope for scope in self.scopes.values() if scope.due <= now]
+        if not due:
+            return None
+
+        jobs = [(scope, None if scope.full_due <= now else self._marker(scope)) for scope in due]
+        if self._executor is None or len(jobs) == 1:
+            results = [self._list(job) for job in jobs]
+        else:
+            results = list(self._executor.map(self._list, jobs))
+
+        now_wall = time.time()
+        added = []
+        changed = []
+        deleted = []
+        for (scope, marker), (files, prefixes, error) in zip(jobs, results):
+            scope.polls += 1
+            if error is not None:
+                scope.errors += 1
+                metrics.count("watch.errors")
+                logger.warning("轮询分区 %r 失败（连续第 %d 次）: %s", scope.prefix, scope.errors, error)
+                self._schedule(scope, False, now, now_wall)
+                continue
+            scope.errors = 0
+            if marker is None:
+                scope_added, scope_changed, scope_deleted = scope.update(files)
+                scope.full_due = now + self.max_interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+                metrics.count("watch.full_polls")
+            else:
+                scope_added, scope_changed = scope.merge(files)
+                scope_deleted = []
+                metrics.count("watch.tail_polls")
+            new_prefixes = []
+            if scope.delimiter:
+                if marker is None:
+                    self._discovered = set(prefixes)
+                new_prefixes = [p for p in prefixes if p not in self.scopes]
+                for prefix in new_prefixes:
+                    logger.info("发现新的分区: %s", prefix)
+                    self._add_scope(prefix)
+                    if self._discovered is not None:
+                        self._discovered.add(prefix)
+            added.extend(scope_added)
+            changed.extend(scope_changed)
+            deleted.extend(scope_deleted)
+            self._schedule(scope, bool(scope_added or scope_changed or scope_deleted or new_prefixes), now, now_wall)
+
+        # 顶层目录已消失且其中没有对象时不再轮询
+        if self._discovered is not None:
+            for prefix in [p for p, s in self.scopes.items()
+                           if p and not s.delimiter and not s.keys and p not in self._discovered]:
+                del self.scopes[prefix]
+
+        self.rounds += 1
+        metrics.count("watch.rounds")
+        diff = {'added': added, 'changed': changed, 'deleted': sorted(deleted)}
+        if added or changed or deleted:
+            self._apply(diff)
+        return diff
+
+    def _apply(self, diff):
+        """写入快照并为新增、变更的文件生成二维码"""
+        files = diff['added'] + diff['changed']
+        self.catalog.apply_changes(self.bucket, files, diff['deleted'])
+        if diff['deleted'] and self.discard is not None:
+            try:
+                self.discard(diff['deleted'])
+            except Exception as e:
+                logger.exception("清理已删除对象的二维码失败: %s", e)
+        self.added += len(diff['added'])
+        self.changed += len(diff['changed'])
+        self.deleted += len(diff['deleted'])
+        metrics.count("watch.added", len(diff['added']))
+        metrics.count("watch.changed", len(diff['changed']))
+        metrics.count("watch.deleted", len(diff['deleted']))
+        logger.info("检测到变化: 新增 %d, 变更 %d, 删除 %d",
+                    len(diff['added']), len(diff['changed']), len(diff['deleted']))
+
+        failures = []
+        if files:
+            try:
+                failures = self.generate(files)
+            except Exception as e:
+                logger.exception("生成二维码失败: %s", e)
+                failures = [(f.key, str(e)) for f in files]
+            if failures:
+                # 忘记生成失败的对象（快照中也移除），下次完整核对时重新当作新增处理
+                failed = [key for key, _ in failures]
+                for key in failed:
+                    scope = self.scopes.get(self._owner(key))
+                    if scope is not None:
+                        scope.forget(key)
+                self.catalog.apply_changes(self.bucket, [], failed)
+            self.processed += len(files) - len(failures)
+            self.failures.extend(failures)
+            # 上传到二维码写出的延迟（依赖本机与COS的时钟一致）
+            now_wall = time.time()
+            for f in diff['added']:
+                uploaded = parse_last_modified(f.last_modified)
+                if uploaded is not None:
+                    metrics.observe("watch.upload_to_qr", max(0.0, now_wall - uploaded))
+
+        if self.on_changes:
+            self.on_changes(diff, failures)
+
+    def next_poll_in(self):
+        """距离最早一个分区到期的秒数"""
+        if not self.scopes:
+            return self.interval
+        return max(0.0, min(scope.due for scope in self.scopes.values()) - time.monotonic())
+
+    def run(self, should_stop=None):
+        """
+        持续轮询直到 stop()（或 should_stop() 返回 True）
+
+        Args:
+            should_stop: 可选的 should_stop()，每次等待前调用，可阻塞（暂停）
+
+        Returns:
+            dict: 汇总（见 summary()）
+        """
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="watch")
+        try:
+            while not self._stop.is_set():
+                if should_stop is not None and should_stop():
+                    break
+                self.poll_once()
+                self._stop.wait(min(self.next_poll_in(), WAIT_SLICE_SECONDS))
+        finally:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return self.summary()
+
+    def stop(self):
+        """停止轮询（可在其他线程调用），正在进行的一轮完成后 run() 返回"""
+        self._stop.set()
+
+    def summary(self):
+        """分区数、轮询轮数、累计新增/变更/删除、已处理与失败数"""
+        return {
+            'scopes': len(self.scopes),
+            'rounds': self.rounds,
+            'added': self.added,
+            'changed': self.changed,
+            'deleted': self.deleted,
+            'processed': self.processed,
+            'failures': list(self.failures),
+            'scanned': self.lister.total_scanned
+        }
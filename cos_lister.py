@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+COS存储桶并发列举引擎
+功能: 按前缀切分存储桶键空间，多线程并发分页列举，合并结果与串行遍历完全一致；
+      也可以逐页交出结果，供边列举边生成的流水线使用
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app_logging import TRACE, get_logger
+from app_metrics import get_metrics
+from file_catalog import AudioFile
+
+logger = get_logger("lister")
+metrics = get_metrics()
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.flac', '.aac', '.ogg', '.wma')
+
+DEFAULT_LIST_CONCURRENCY = 8
+PAGE_SIZE = 1000
+
+
+def build_base_url(bucket, region):
+    """存储桶的公网访问地址前缀"""
+    return f"https://{bucket}.cos.{region}.myqcloud.com/"
+
+
+def build_object_url(bucket, region, key):
+    """拼接对象的公网访问地址"""
+    return build_base_url(bucket, region) + key
+
+
+def is_audio_key(key):
+    """判断对象键是否为支持的音频文件"""
+    return key.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def make_file_info(obj, base_url):
+    """由list_objects返回的Contents条目构造文件记录"""
+    return AudioFile(
+        obj['Key'],
+        int(obj['Size']),
+        obj['LastModified'],
+        obj.get('ETag', '').strip('"'),
+        base_url
+    )
+
+
+class ShardedLister:
+    """
+    分片并发列举存储桶中的音频文件
+
+    分片方式：
+    1. 未配置分片时，先用 Delimiter='/' 发现顶层前缀（CommonPrefixes），
+       每个前缀作为一个分片并发列举，根目录下的对象在发现阶段直接收集
+    2. 配置了 shards（有序的切分键）时，按 Marker 将键空间切成若干连续区间，
+       适用于没有目录层级的扁平存储桶
+
+    所有分片共用同一个 CosS3Client（及其内置HTTP连接池），
+    合并后按对象键排序，顺序与串行逐页遍历完全相同。
+    """
+
+    def __init__(self, client, bucket, region, concurrency=DEFAULT_LIST_CONCURRENCY,
+                 shards=None, page_size=PAGE_SIZE, on_progress=None):
+        self.client = client
+        self.bucket = bucket
+        self.region = region
+        self.concurrency = max(1, int(concurrency or 1))
+        self.shards = sorted(set(shards or []))
+        self.page_size = page_size
+        self.on_progress = on_progress
+        self.base_url = build_base_url(bucket, region)
+
+        self.total_scanned = 0
+        self._lock = threading.Lock()
+
+    def _count(self, n):
+        """累计已扫描对象数并回调进度"""
+        metrics.count("cos.objects_scanned", n)
+        with self._lock:
+            self.total_scanned += n
+            total = self.total_scanned
+        if self.on_progress:
+            self.on_progress(total)
+
+    def _pages(self, prefix="", marker="", delimiter=""):
+        """逐页列举，行为与原串行遍历保持一致"""
+        while True:
+            logger.debug("列举分页 prefix=%r marker=%r delimiter=%r", prefix, marker, delimiter)
+            with metrics.timer("cos.list_objects"):
+                response = self.client.list_objects(
+                    Bucket=self.bucket,
+                    Prefix=prefix,
+                    Delimiter=delimiter,
+                    Marker=marker,
+                    MaxKeys=self.page_size
+                )
+            yield response
+
+            if response.get('IsTruncated') == 'false':
+                return
+            if 'NextMarker' in response:
+                marker = response['NextMarker']
+            else:
+                return
+
+    def _collect(self, contents, emit):
+        """筛选一页中的音频对象交给 emit（累积时为 list.extend）"""
+        # 逐对象跟踪默认关闭，只在开启TRACE级别时遍历输出
+        if logger.isEnabledFor(TRACE):
+            for obj in contents:
+                logger.log(TRACE, "扫描文件: %s", obj['Key'])
+        files = [make_file_info(obj, self.base_url) for obj in contents if is_audio_key(obj['Key'])]
+        if files:
+            emit(files)
+        self._count(len(contents))
+
+    def _list_prefix(self, prefix, emit=None):
+        """列举单个前缀分片，未指定 emit 时返回该分片的全部音频文件"""
+        files = []
+        for response in self._pages(prefix=prefix):
+            self._collect(response.get('Contents', []), emit or files.extend)
+        return files
+
+    def _list_range(self, lower, upper, emit=None):
+        """列举 (lower, upper] 区间内的对象，upper为None表示直到末尾"""
+        files = []
+        emit = emit or files.extend
+        for response in self._pages(marker=lower):
+            contents = response.get('Contents', [])
+            if upper is not None and contents and contents[-1]['Key'] > upper:
+                self._collect([obj for obj in contents if obj['Key'] <= upper], emit)
+                break
+            self._collect(contents, emit)
+        return files
+
+    def _discover(self, emit=None):
+        """用分隔符列举顶层，返回(根目录音频文件, 前缀列表)"""
+        root_files = []
+        prefixes = []
+        for response in self._pages(delimiter='/'):
+            self._collect(response.get('Contents', []), emit or root_files.extend)
+            for item in response.get('CommonPrefixes', []):
+                prefixes.append(item['Prefix'])
+        return root_files, prefixes
+
+    def _ranges(self):
+        """由切分键得到各区间 [(lower, upper), ...]"""
+        bounds = [""] + self.shards
+        return [(bounds[i], bounds[i + 1] if i + 1 < len(bounds) else None)
+                for i in range(len(bounds))]
+
+    def _run_shards(self, func, args_list):
+        """在有界线程池中执行各分片，按提交顺序返回结果"""
+        if self.concurrency == 1 or len(args_list) <= 1:
+            return [func(*args) for args in args_list]
+
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(args_list))) as executor:
+            futures = [executor.submit(func, *args) for args in args_list]
+            try:
+                return [future.result() for future in futures]
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def list_scope(self, prefix="", delimiter="", marker=""):
+        """
+        列举单个前缀（监视模式按分区轮询时使用）
+
+        指定 delimiter 时只列举该层级，子目录以公共前缀返回；指定 marker 时只列举字典序在其之后的部分。
+
+        Returns:
+            (files, prefixes): 该前缀下的音频文件，以及公共前缀列表
+        """
+        files = []
+        prefixes = []
+        for response in self._pages(prefix=prefix, marker=marker, delimiter=delimiter):
+            self._collect(response.get('Contents', []), files.extend)
+            prefixes.extend(item['Prefix'] for item in response.get('CommonPrefixes', []))
+        return files, prefixes
+
+    def list_serial(self):
+        """串行逐页遍历整个存储桶（基准实现）"""
+        return self._list_prefix("")
+
+    def list_audio_files(self):
+        """并发列举全部音频文件，返回按对象键排序的列表"""
+        self.total_scanned = 0
+
+        if self.concurrency == 1:
+            return self.list_serial()
+
+        if self.shards:
+            results = self._run_shards(self._list_range, self._ranges())
+        else:
+            root_files, prefixes = self._discover()
+            logger.debug("发现 %d 个顶层前缀分片", len(prefixes))
+            results = [root_files] + self._run_shards(self._list_prefix, [(p,) for p in prefixes])
+
+        merged = [file_info for files in results for file_info in files]
+        merged.sort(key=lambda f: f.key)
+        return merged
+
+    def stream_pages(self, emit):
+        """
+        并发列举，每页的音频文件列表直接交给 emit，不在内存中累积
+
+        emit 会在各分片线程中调用，页面之间的顺序不保证；emit 阻塞时对应分片暂停列举。
+        """
+        self.total_scanned = 0
+
+        if self.concurrency == 1:
+            self._list_prefix("", emit)
+        elif self.shards:
+            self._run_shards(self._list_range, [(lower, upper, emit) for lower, upper in self._ranges()])
+        else:
+            _, prefixes = self._discover(emit)
+            logger.debug("发现 %d 个顶层前缀分片", len(prefixes))
+            self._run_shards(self._list_prefix, [(p, emit) for p in prefixes])
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+COS并发上传
+功能: 遍历本地文件夹，跳过存储桶中内容相同（ETag或MD5一致）的音频文件，其余并发上传；
+      大文件使用分块上传，UploadId 记录在本地快照中，中断后只补传缺少的分块；
+      上传完成的文件逐个交给流水线，直接写入快照并生成二维码，无需重新列举存储桶
+"""
+
+import email.utils
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from app_logging import get_logger
+from cos_lister import build_base_url, is_audio_key
+from file_catalog import AudioFile
+
+logger = get_logger("uploader")
+
+DEFAULT_UPLOAD_CONCURRENCY = 4
+# 超过该大小的文件使用分块上传
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+# 上传时写入对象的自定义元数据，分块上传的对象 ETag 不是整体MD5，用它比较内容
+MD5_META_KEY = "x-cos-meta-md5"
+LIST_PARTS_PAGE = 1000
+
+
+class UploadCancelled(Exception):
+    """上传被取消（分块上传的进度已保存，下次继续）"""
+
+
+class LocalAudioFile:
+    """本地待上传的音频文件"""
+
+    __slots__ = ('path', 'key', 'size', 'mtime_ns')
+
+    def __init__(self, path, key, size, mtime_ns):
+        self.path = path
+        self.key = key
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def __repr__(self):
+        return f"LocalAudioFile({self.key!r}, size={self.size})"
+
+
+def object_key(prefix, relpath):
+    """本地相对路径对应的对象键（统一使用 / 分隔）"""
+    relpath = relpath.replace(os.sep, "/")
+    prefix = prefix.strip("/")
+    return f"{prefix}/{relpath}" if prefix else relpath
+
+
+def scan_local_files(directory, prefix=""):
+    """遍历本地目录中的音频文件（跳过隐藏文件），按对象键排序"""
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            key = object_key(prefix, os.path.relpath(path, directory))
+            if not is_audio_key(key):
+                continue
+            stat = os.stat(path)
+            files.append(LocalAudioFile(path, key, stat.st_size, stat.st_mtime_ns))
+    files.sort(key=lambda f: f.key)
+    return files
+
+
+def hash_file(path, part_size):
+    """
+    一次读取同时计算整体MD5与分块MD5
+
+    Returns:
+        (md5, multipart_etag, part_md5s): multipart_etag 为按 part_size 分块上传后对象的ETag
+    """
+    whole = hashlib.md5()
+    part_digests = []
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(part_size)
+            if not data:
+                break
+            whole.update(data)
+            part_digests.append(hashlib.md5(data).digest())
+    multipart_etag = hashlib.md5(b"".join(part_digests)).hexdigest() + f"-{len(part_digests)}"
+    return whole.hexdigest(), multipart_etag, [d.hex() for d in part_digests]
+
+
+def iso_time(timestamp=None):
+    """与列举结果一致的 LastModified 格式"""
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(timestamp))
+
+
+def _header(headers, name):
+    """不区分大小写读取响应头"""
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _status_code(error):
+    """COS服务端错误的HTTP状态码（CosServiceError.get_status_code），其他异常为 None"""
+    get_status_code = getattr(error, 'get_status_code', None)
+    return get_status_code() if get_status_code else None
+
+
+class CosUploader:
+    """
+    将本地文件夹上传到存储桶
+
+    - 跳过判断：先用本地快照中的 ETag 比较（不发请求），不一致时再 HEAD 对象，
+      ETag 等于整体MD5或分块ETag、或自定义元数据 x-cos-meta-md5 等于整体MD5时视为相同；
+      本地文件的MD5按 (路径, 大小, 修改时间) 缓存在快照中，不重复计算
+    - 小文件 put_object；超过 multipart_threshold 的文件分块上传，
+      UploadId 保存在快照中，再次上传时用 list_parts 核对已上传且MD5一致的分块，只补传其余分块
+    - 文件级和分块级各用一个大小为 concurrency 的线程池，内存中最多 concurrency 个分块
+
+    提供与 ShardedLister 相同的 stream_pages(emit) / bucket / total_scanned，
+    可直接作为 ListRenderPipeline 的页面来源：每个上传完成（或已存在）的文件立即交给流水线。
+    """
+
+    def __init__(self, client, bucket, region, catalog, directory, prefix="",
+                 concurrency=DEFAULT_UPLOAD_CONCURRENCY, part_size=DEFAULT_PART_SIZE,
+                 multipart_threshold=MULTIPART_THRESHOLD, on_progress=None, on_uploaded=None, should_stop=None):
+        """
+        Args:
+            client: CosS3Client
+            catalog: FileCatalog（读取已知对象、缓存本地MD5、保存分块上传进度）
+            directory: 本地文件夹
+            prefix: 对象键前缀（上传到的目录）
+            on_progress: 进度回调 on_progress(done, total, bytes_uploaded)
+            on_uploaded: 每个完成的文件回调 on_uploaded(file_info, uploaded)，uploaded 为 False 表示已存在而跳过
+            should_stop: 可选的 should_stop()（如 JobProgress.checkpoint），可阻塞（暂停），返回 True 时停止
+        """
+        self.client = client
+        self.bucket = bucket
+        self.region = region
+        self.catalog = catalog
+        self.directory = directory
+        self.prefix = prefix
+        self.concurrency = max(1, int(concurrency or 1))
+        self.part_size = part_size
+        self.multipart_threshold = max(multipart_threshold, part_size)
+        self.on_progress = on_progress
+        self.on_uploaded = on_uploaded
+        self.should_stop = should_stop
+        self.base_url = build_base_url(bucket, region)
+
+        self.total = 0
+        self.total_scanned = 0
+        self.uploaded = []
+        self.skipped = []
+        self.failures = []
+        self.bytes_uploaded = 0
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._known = {}
+        self._part_executor = None
+
+    def _stopped(self):
+        """检查点：暂停时阻塞，返回是否已取消"""
+        return self.should_stop is not None and self.should_stop()
+
+    def _add_bytes(self, count):
+        """累计已上传字节数"""
+        with self._lock:
+            self.bytes_uploaded += count
+
+    def _digest(self, local):
+        """本地文件的 (md5, multipart_etag, part_md5s)，优先使用快照中的缓存"""
+        digest = self.catalog.cached_hash(local.path, local.size, local.mtime_ns, self.part_size)
+        if digest is None:
+            digest = hash_file(local.path, self.part_size)
+            self.catalog.save_hash(local.path, local.size, local.mtime_ns, self.part_size, *digest)
+        return digest
+
+    def _make_file(self, local, etag, last_modified=None):
+        """构造上传后（或已存在）对象的文件记录"""
+        return AudioFile(local.key, local.size, last_modified or iso_time(), etag.strip('"'), self.base_url)
+
+    def _existing(self, local, digest):
+        """存储桶中已有相同内容时返回其文件记录，否则返回 None"""
+        md5, multipart_etag, _ = digest
+        known = self._known.get(local.key)
+        if known is not None and known.size == local.size and known.etag in (md5, multipart_etag):
+            return known
+
+        try:
+            headers = self.client.head_object(Bucket=self.bucket, Key=local.key)
+        except Exception as e:
+            if _status_code(e) == 404:
+                return None
+            raise
+        etag = (_header(headers, 'ETag') or "").strip('"')
+        size = int(_header(headers, 'Content-Length') or -1)
+        if size != local.size or (etag not in (md5, multipart_etag) and _header(headers, MD5_META_KEY) != md5):
+            return None
+        modified = _header(headers, 'Last-Modified')
+        last_modified = iso_time(email.utils.parsedate_to_datetime(modified).timestamp()) if modified else None
+        return self._make_file(local, etag, last_modified)
+
+    def _put(self, local, md5):
+        """简单上传"""
+        with open(local.path, 'rb') as f:
+            response = self.client.put_object(
+                Bucket=self.bucket, Body=f, Key=local.key,
+                ContentType=mimetypes.guess_type(local.key)[0] or "application/octet-stream",
+                Metadata={MD5_META_KEY: md5})
+        self._add_bytes(local.size)
+        return response['ETag']
+
+    def _uploaded_parts(self, local, upload_id):
+        """列出服务端已有的分块 {分块号: ETag}，上传已失效时返回 None"""
+        parts = {}
+        marker = 0
+        try:
+            while True:
+                response = self.client.list_parts(Bucket=self.bucket, Key=local.key, UploadId=upload_id,
+                                                  MaxParts=LIST_PARTS_PAGE, PartNumberMarker=marker)
+                for part in response.get('Part', []):
+                    parts[int(part['PartNumber'])] = part['ETag'].strip('"')
+                if response.get('IsTruncated') != 'true':
+                    return parts
+                marker = int(response['NextPartNumberMarker'])
+        except Exception as e:
+            if _status_code(e) == 404:
+                return None
+            raise
+
+    def _upload_part(self, local, upload_id, number):
+        """上传一个分块（在分块线程池中执行，每个分块单独读取，内存中只有在途分块）"""
+        if self._stopped():
+            raise UploadCancelled()
+        with open(local.path, 'rb') as f:
+            f.seek((number - 1) * self.part_size)
+            data = f.read(self.part_size)
+        response = self.client.upload_part(Bucket=self.bucket, Key=local.key, Body=data,
+                                           PartNumber=number, UploadId=upload_id)
+        self._add_bytes(len(data))
+        return response['ETag'].strip('"')
+
+    def _multipart(self, local, md5, part_md5s):
+        """分块上传，可从上次中断处继续"""
+        parts = None
+        pending = self.catalog.pending_upload(self.bucket, local.key)
+        if pending is not None:
+            if (pending['size'], pending['mtime_ns'], pending['part_size']) == (local.size, local.mtime_ns, self.part_size):
+                parts = self._uploaded_parts(local, pending['upload_id'])
+            if parts is None:
+                self.catalog.clear_pending_upload(self.bucket, local.key)
+
+        if parts is None:
+            response = self.client.create_multipart_upload(
+                Bucket=self.bucket, Key=local.key,
+                ContentType=mimetypes.guess_type(local.key)[0] or "application/octet-stream",
+                Metadata={MD5_META_KEY: md5})
+            upload_id = response['UploadId']
+            self.catalog.save_pending_upload(self.bucket, local.key, upload_id, local.size,
+                                             local.mtime_ns, self.part_size)
+            parts = {}
+        else:
+            upload_id = pending['upload_id']
+            logger.info("继续分块上传 %s：已有 %d/%d 个分块", local.key, len(parts), len(part_md5s))
+
+        # 只保留内容与本地一致的分块，其余重新上传
+        etags = {number: etag for number, etag in parts.items()
+                 if number <= len(part_md5s) and etag == part_md5s[number - 1]}
+        missing = [number for number in range(1, len(part_md5s) + 1) if number not in etags]
+        futures = {number: self._part_executor.submit(self._upload_part, local, upload_id, number)
+                   for number in missing}
+        try:
+            for number, future in futures.items():
+                etags[number] = future.result()
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            raise
+
+        response = self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=local.key, UploadId=upload_id,
+            MultipartUpload={'Part': [{'PartNumber': number, 'ETag': etags[number]} for number in sorted(etags)]})
+        self.catalog.clear_pending_upload(self.bucket, local.key)
+        return response['ETag']
+
+    def upload(self, local):
+        """
+        上传单个文件（已存在相同内容时跳过）
+
+        Returns:
+            (file_info, uploaded): 对象的文件记录，以及是否实际上传
+        """
+        digest = self._digest(local)
+        existing = self._existing(local, digest)
+        if existing is not None:
+            logger.debug("内容相同，跳过上传: %s", local.key)
+            return existing, False
+
+        md5, _, part_md5s = digest
+        if local.size > self.multipart_threshold:
+            etag = self._multipart(local, md5, part_md5s)
+        else:
+            etag = self._put(local, md5)
+        logger.info("已上传 %s（%d 字节）", local.key, local.size)
+        return self._make_file(local, etag), True
+
+    def _report(self):
+        """回调进度"""
+        if self.on_progress:
+            done = len(self.uploaded) + len(self.skipped) + len(self.failures)
+            self.on_progress(done, self.total, self.bytes_uploaded)
+
+    def run(self, emit=None):
+        """
+        上传整个文件夹
+
+        Args:
+            emit: 可选的 emit([file_info])，每个完成的文件调用一次（流水线的页面回调）
+
+        Returns:
+            dict: 见 summary()
+        """
+        local_files = scan_local_files(self.directory, self.prefix)
+        self.total = len(local_files)
+        self._known = {f.key: f for f in self.catalog.load(self.bucket)}
+        logger.info("本地音频文件 %d 个，开始上传到 %s/%s", self.total, self.bucket, self.prefix)
+
+        pending = iter(local_files)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="upload") as executor, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="upload-part") as part_executor:
+            self._part_executor = part_executor
+            while True:
+                while not self.cancelled and len(in_flight) < self.concurrency:
+                    local = next(pending, None)
+                    if local is None:
+                        break
+                    if self._stopped():
+                        self.cancelled = True
+                        break
+                    in_flight[executor.submit(self.upload, local)] = local
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    local = in_flight.pop(future)
+                    self.total_scanned += 1
+                    try:
+                        file_info, uploaded = future.result()
+                    except UploadCancelled:
+                        self.cancelled = True
+                        continue
+                    except Exception as e:
+                        logger.warning("上传失败 %s: %s", local.key, e)
+                        self.failures.append((local.key, str(e)))
+                        self._report()
+                        continue
+                    (self.uploaded if uploaded else self.skipped).append(file_info)
+                    self._report()
+                    if self.on_uploaded:
+                        self.on_uploaded(file_info, uploaded)
+                    if emit:
+                        emit([file_info])
+
+        return self.summary()
+
+    def summary(self):
+        """
+        上传汇总
+
+        Returns:
+            dict: total、uploaded、skipped、failures [(key, error)]、bytes、cancelled
+        """
+        return {
+            'total': self.total,
+            'uploaded': len(self.uploaded),
+            'skipped': len(self.skipped),
+            'failures': self.failures,
+            'bytes': self.bytes_uploaded,
+            'cancelled': self.cancelled
+        }
+
+    def stream_pages(self, emit):
+        """流水线页面来源接口：上传并逐个交出完成的文件"""
+        self.run(emit)
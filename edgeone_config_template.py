@@ -49,11 +49,11 @@ def main():
     
     # 更新Python文件
     try:
-        update_edgeone_url('audio_qr_manager.py', edgeone_domain)
+        update_edgeone_url('audio_qr_core.py', edgeone_domain)
         print("\n✅ 配置更新完成！")
         print(f"现在二维码将使用EdgeOne Pages地址：https://{edgeone_domain}")
         print("\n📝 接下来的步骤：")
-        print("1. 重新运行 audio_qr_manager.py")
+        print("1. 重新运行 audio_qr_manager.py 或 audio_qr_cli.py")
         print("2. 生成新的二维码测试")
         print("3. 用微信扫码测试播放效果")
         
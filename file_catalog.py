@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频文件目录
+功能: AudioFile 紧凑的文件记录；FileIndex 按对象键和列表行O(1)查找；
+      FileCatalog 按对象键持久化存储桶列表（SQLite），刷新时只写入新增、变更和删除的条目，
+      并保存音频地址到短ID的分配、音频元数据（AudioMetadata）、公网地址检查结果（LinkStatus）
+      以及上传用的本地MD5缓存与分块上传进度
+"""
+
+import os
+import sqlite3
+import threading
+
+from short_ids import short_id_candidates
+
+DEFAULT_CATALOG_PATH = "catalog.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_modified TEXT NOT NULL,
+    etag TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL,
+    PRIMARY KEY (bucket, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS short_ids (
+    id TEXT PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS metadata (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    etag TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL,
+    duration REAL,
+    bitrate INTEGER,
+    codec TEXT,
+    sample_rate INTEGER,
+    channels INTEGER,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    error TEXT,
+    PRIMARY KEY (bucket, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS local_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    part_size INTEGER NOT NULL,
+    md5 TEXT NOT NULL,
+    multipart_etag TEXT NOT NULL,
+    part_md5s TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS multipart_uploads (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    upload_id TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    part_size INTEGER NOT NULL,
+    PRIMARY KEY (bucket, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS link_checks (
+    url TEXT PRIMARY KEY,
+    status INTEGER,
+    error TEXT,
+    checked REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+METADATA_COLUMNS = ('etag', 'size', 'duration', 'bitrate', 'codec', 'sample_rate', 'channels',
+                    'title', 'artist', 'album', 'error')
+
+# 每条查询的地址数上限（低于SQLite的参数个数限制）
+LINK_QUERY_BATCH = 500
+
+
+class AudioFile:
+    """
+    单个音频对象的记录
+
+    使用 __slots__ 代替每个文件一个字典；文件名和访问地址按需由对象键推导，
+    同一存储桶的记录共享同一个 base_url 字符串。
+    """
+
+    __slots__ = ('key', 'size', 'last_modified', 'etag', 'base_url')
+
+    FIELDS = ('key', 'name', 'size', 'last_modified', 'etag', 'url')
+
+    def __init__(self, key, size, last_modified, etag, base_url):
+        self.key = key
+        self.size = size
+        self.last_modified = last_modified
+        self.etag = etag
+        self.base_url = base_url
+
+    @property
+    def name(self):
+        """文件名（不含目录）"""
+        return os.path.basename(self.key)
+
+    @property
+    def url(self):
+        """公网访问地址"""
+        return self.base_url + self.key
+
+    def __eq__(self, other):
+        if not isinstance(other, AudioFile):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __hash__(self):
+        # 与 __eq__ 比较相同的字段；记录创建后不再修改，可作为集合元素和字典键
+        return hash(tuple(getattr(self, field) for field in self.__slots__))
+
+    def to_dict(self):
+        """转换为字典（用于JSON输出）"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"AudioFile({self.key!r}, size={self.size})"
+
+
+class AudioMetadata:
+    """
+    音频元数据（由文件头部解析）
+
+    etag / size 记录解析时对象的版本，对象变化后需要重新读取；
+    格式无法解析时 error 为原因，其余字段为 None。
+    """
+
+    __slots__ = METADATA_COLUMNS
+
+    def __init__(self, **fields):
+        for field in self.__slots__:
+            setattr(self, field, fields.get(field))
+
+    def is_current(self, file_info):
+        """是否仍对应当前版本的对象"""
+        return self.etag == file_info.etag and self.size == file_info.size
+
+    @property
+    def label(self):
+        """“艺术家 - 标题”，缺少标签时为 None"""
+        return " - ".join(value for value in (self.artist, self.title) if value) or None
+
+    def to_dict(self):
+        """转换为字典（用于JSON输出）"""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        if self.error:
+            return f"AudioMetadata(error={self.error!r})"
+        return f"AudioMetadata({self.codec}, {self.duration}s, {self.bitrate}kbps)"
+
+
+class LinkStatus:
+    """
+    一个公网地址的检查结果
+
+    status 为HTTP状态码（网络错误时为 None），error 为无法访问的原因，可访问时为 None；
+    checked 为检查时刻（Unix时间）。
+    """
+
+    __slots__ = ('url', 'status', 'error', 'checked')
+
+    def __init__(self, url, status, error, checked):
+        self.url = url
+        self.status = status
+        self.error = error
+        self.checked = checked
+
+    @property
+    def ok(self):
+        """地址是否可以访问"""
+        return self.error is None
+
+    def is_fresh(self, ttl, now):
+        """是否可以沿用：可访问且检查时间在 ttl 秒以内（无法访问的地址每次都重新检查）"""
+        return self.ok and now - self.checked < ttl
+
+    def __repr__(self):
+        return f"LinkStatus({self.url!r}, {self.status}, error={self.error!r})"
+
+
+def row_to_file_info(row, base_urls):
+    """将数据库行转换为文件记录，base_urls 用于共享相同的地址前缀"""
+    key, size, last_modified, etag, url = row
+    base_url = url[:len(url) - len(key)] if url.endswith(key) else url
+    base_url = base_urls.setdefault(base_url, base_url)
+    return AudioFile(key, size, last_modified, etag, base_url)
+
+
+class FileIndex:
+    """
+    内存中的文件索引
+
+    files 保持对象键顺序；by_key 按对象键查找记录；
+    key_to_item / item_to_key 维护对象键与列表行（Treeview item id）之间的双向映射，
+    使选中行到文件记录的查找为O(1)，且不会因不同目录下的同名文件而混淆。
+    """
+
+    def __init__(self):
+        self.files = []
+        self.by_key = {}
+        self.key_to_item = {}
+        self.item_to_key = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def set_files(self, files):
+        """替换全部文件记录"""
+        self.files = files
+        self.by_key = {f.key: f for f in files}
+
+    def get(self, key):
+        """按对象键查找记录"""
+        return self.by_key.get(key)
+
+    def bind_item(self, key, item):
+        """记录对象键对应的列表行"""
+        self.key_to_item[key] = item
+        self.item_to_key[item] = key
+
+    def unbind_key(self, key):
+        """移除对象键的列表行映射，返回原来的行id"""
+        item = self.key_to_item.pop(key, None)
+        if item is not None:
+            self.item_to_key.pop(item, None)
+        return item
+
+    def clear_items(self):
+        """清空全部列表行映射"""
+        self.key_to_item = {}
+        self.item_to_key = {}
+
+    def item_for_key(self, key):
+        """对象键对应的列表行id"""
+        return self.key_to_item.get(key)
+
+    def file_for_item(self, item):
+        """列表行对应的文件记录"""
+        key = self.item_to_key.get(item)
+        return self.by_key.get(key) if key is not None else None
+
+
+class FileCatalog:
+    """
+    存储桶对象目录的本地快照
+
+    每个存储桶的条目以 (bucket, key) 为主键，保存大小、LastModified、ETag 和访问地址。
+    apply_snapshot() 将一次完整列举结果与上次快照比较，只对差异行执行写入，
+    并返回差异供界面做增量更新。
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def load(self, bucket, limit=None):
+        """读取某个存储桶的上次快照，按对象键排序；limit 只读取前若干条（启动时先显示首屏）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, size, last_modified, etag, url FROM objects WHERE bucket = ? ORDER BY key LIMIT ?",
+                (bucket, -1 if limit is None else limit)
+            ).fetchall()
+        base_urls = {}
+        return [row_to_file_info(row, base_urls) for row in rows]
+
+    def count(self, bucket):
+        """返回某个存储桶快照中的条目数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM objects WHERE bucket = ?", (bucket,)).fetchone()[0]
+
+    def apply_snapshot(self, bucket, files):
+        """
+        用新的列举结果更新快照
+
+        Args:
+            bucket: 存储桶名称
+            files: 本次列举得到的文件信息列表
+
+        Returns:
+            dict: {'added': [file_info], 'changed': [file_info], 'deleted': [key]}
+        """
+        with self._lock:
+            previous = {
+                key: (size, last_modified, etag, url)
+                for key, size, last_modified, etag, url in self._conn.execute(
+                    "SELECT key, size, last_modified, etag, url FROM objects WHERE bucket = ?", (bucket,)
+                )
+            }
+
+            added = []
+            changed = []
+            for file_info in files:
+                old = previous.pop(file_info.key, None)
+                current = (file_info.size, file_info.last_modified, file_info.etag, file_info.url)
+                if old is None:
+                    added.append(file_info)
+                elif old != current:
+                    changed.append(file_info)
+            deleted = sorted(previous)
+            self._write_changes(bucket, added + changed, deleted)
+
+        return {'added': added, 'changed': changed, 'deleted': deleted}
+
+    def apply_changes(self, bucket, files, deleted):
+        """
+        写入已知的差异（监视模式按前缀分区比较后调用）
+
+        Args:
+            files: 新增或变更的文件记录
+            deleted: 已删除的对象键
+        """
+        with self._lock:
+            self._write_changes(bucket, files, deleted)
+
+    def _write_changes(self, bucket, files, deleted):
+        """在一个事务中写入新增/变更并删除已删除的条目及其元数据（调用方已持有锁）"""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO objects (bucket, key, size, last_modified, etag, url) VALUES (?, ?, ?, ?, ?, ?)",
+                [(bucket, f.key, f.size, f.last_modified, f.etag, f.url) for f in files]
+            )
+            self._conn.executemany(
+                "DELETE FROM objects WHERE bucket = ? AND key = ?",
+                [(bucket, key) for key in deleted]
+            )
+            self._conn.executemany(
+                "DELETE FROM metadata WHERE bucket = ? AND key = ?",
+                [(bucket, key) for key in deleted]
+            )
+
+    def upsert_files(self, bucket, files):
+        """
+        写入一批文件记录（流式列举时逐页调用）
+
+        只新增或覆盖，不会删除快照中未出现的条目；需要检测删除时使用 apply_snapshot()。
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO objects (bucket, key, size, last_modified, etag, url) VALUES (?, ?, ?, ?, ?, ?)",
+                [(bucket, f.key, f.size, f.last_modified, f.etag, f.url) for f in files]
+            )
+
+    def assign_short_ids(self, urls):
+        """
+        为音频地址分配短ID
+
+        已分配的地址保持原来的ID；对象删除后ID也不回收，已打印的二维码不会指向别的音频。
+
+        Returns:
+            dict: {url: 短ID}
+        """
+        assigned = {}
+        with self._lock:
+            for url in dict.fromkeys(urls):
+                row = self._conn.execute("SELECT id FROM short_ids WHERE url = ?", (url,)).fetchone()
+                if row is not None:
+                    assigned[url] = row[0]
+                    continue
+                for candidate in short_id_candidates(url):
+                    if not self._conn.execute("SELECT 1 FROM short_ids WHERE id = ?", (candidate,)).fetchone():
+                        break
+                self._conn.execute("INSERT INTO short_ids (id, url) VALUES (?, ?)", (candidate, url))
+                assigned[url] = candidate
+            self._conn.commit()
+        return assigned
+
+    def short_id_shard(self, prefix):
+        """前缀下的全部短ID映射 {短ID: url}"""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT id, url FROM short_ids WHERE id >= ? AND id < ?", (prefix, prefix + "~")
+            ))
+
+    def load_metadata(self, bucket):
+        """读取某个存储桶已保存的元数据 {对象键: AudioMetadata}"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, {', '.join(METADATA_COLUMNS)} FROM metadata WHERE bucket = ?", (bucket,)
+            ).fetchall()
+        return {row[0]: AudioMetadata(**dict(zip(METADATA_COLUMNS, row[1:]))) for row in rows}
+
+    def missing_metadata(self, bucket, files):
+        """返回尚无元数据或对象已变化（ETag/大小不同）的文件"""
+        saved = self.load_metadata(bucket)
+        return [f for f in files if f.key not in saved or not saved[f.key].is_current(f)]
+
+    def save_metadata(self, bucket, results):
+        """
+        保存一批元数据
+
+        Args:
+            results: [(file_info, AudioMetadata), ...]
+        """
+        placeholders = ", ".join("?" * (len(METADATA_COLUMNS) + 2))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO metadata (bucket, key, {', '.join(METADATA_COLUMNS)}) VALUES ({placeholders})",
+                [(bucket, f.key) + tuple(getattr(meta, field) for field in METADATA_COLUMNS)
+                 for f, meta in results]
+            )
+
+    def load_link_checks(self, urls):
+        """读取这些地址已保存的检查结果 {url: LinkStatus}"""
+        urls = list(urls)
+        results = {}
+        with self._lock:
+            for start in range(0, len(urls), LINK_QUERY_BATCH):
+                batch = urls[start:start + LINK_QUERY_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT url, status, error, checked FROM link_checks WHERE url IN ({', '.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                results.update((row[0], LinkStatus(*row)) for row in rows)
+        return results
+
+    def save_link_checks(self, results):
+        """保存一批 LinkStatus"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO link_checks (url, status, error, checked) VALUES (?, ?, ?, ?)",
+                [(r.url, r.status, r.error, r.checked) for r in results]
+            )
+
+    def cached_hash(self, path, size, mtime_ns, part_size):
+        """本地文件未变化时返回缓存的 (md5, multipart_etag, part_md5s)，否则返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT md5, multipart_etag, part_md5s FROM local_hashes "
+                "WHERE path = ? AND size = ? AND mtime_ns = ? AND part_size = ?",
+                (path, size, mtime_ns, part_size)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], row[2].split(",") if row[2] else []
+
+    def save_hash(self, path, size, mtime_ns, part_size, md5, multipart_etag, part_md5s):
+        """缓存本地文件的MD5"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO local_hashes (path, size, mtime_ns, part_size, md5, multipart_etag, part_md5s) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, part_size, md5, multipart_etag, ",".join(part_md5s))
+            )
+
+    def pending_upload(self, bucket, key):
+        """未完成的分块上传 {upload_id, size, mtime_ns, part_size}，没有时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT upload_id, size, mtime_ns, part_size FROM multipart_uploads WHERE bucket = ? AND key = ?",
+                (bucket, key)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('upload_id', 'size', 'mtime_ns', 'part_size'), row))
+
+    def save_pending_upload(self, bucket, key, upload_id, size, mtime_ns, part_size):
+        """记录开始的分块上传，中断后据此继续"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO multipart_uploads (bucket, key, upload_id, size, mtime_ns, part_size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (bucket, key, upload_id, size, mtime_ns, part_size)
+            )
+
+    def clear_pending_upload(self, bucket, key):
+        """分块上传完成或失效后删除记录"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM multipart_uploads WHERE bucket = ? AND key = ?", (bucket, key))
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
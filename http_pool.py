@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并发HTTP请求的公共部分
+功能: 创建连接池大小与并发数一致的 requests 会话；在线程池中有界提交任务，结果按批回调，
+      可暂停与取消。音频元数据提取（Range请求）与公网地址检查（HEAD请求）共用
+
+requests 在创建会话时才导入，导入本模块本身只依赖标准库。
+"""
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# 每批结果回调一次（写入快照与刷新进度）
+RESULT_BATCH_SIZE = 64
+# 临时错误的状态码，自动重试
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def create_session(concurrency, methods=('GET',)):
+    """
+    创建 requests 会话
+
+    Args:
+        concurrency: 并发请求数，即连接池大小（保持长连接）
+        methods: 遇到连接错误或 RETRY_STATUSES 时自动重试（最多2次）的请求方法
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    retry = Retry(total=2, backoff_factor=0.2, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(methods), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def run_bounded(func, items, on_results, concurrency, should_stop=None, batch_size=RESULT_BATCH_SIZE,
+                thread_name_prefix=""):
+    """
+    在 concurrency 个线程中对每一项执行 func(item)
+
+    在途任务数不超过 concurrency*2，不会一次把全部任务放进线程池；
+    每完成 batch_size 项（以及最后剩余的）调用一次 on_results([(item, result), ...])。
+
+    Args:
+        should_stop: 可选的 should_stop()（如 JobProgress.checkpoint），每次提交前调用，
+                     可阻塞（暂停），返回 True 时不再提交，已提交的任务完成后返回
+
+    Returns:
+        list: func 抛出异常的 [(item, exception), ...]
+    """
+    errors = []
+    batch = []
+    pending = iter(items)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=thread_name_prefix) as executor:
+        stopped = False
+        while True:
+            while not stopped and len(in_flight) < concurrency * 2:
+                item = next(pending, None)
+                if item is None or (should_stop is not None and should_stop()):
+                    stopped = True
+                    break
+                in_flight[executor.submit(func, item)] = item
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                try:
+                    batch.append((item, future.result()))
+                except Exception as e:
+                    errors.append((item, e))
+            if len(batch) >= batch_size or (not in_flight and batch):
+                on_results(batch)
+                batch = []
+    if batch:
+        on_results(batch)
+    return errors
@@ -16,7 +16,8 @@ def install_requirements():
         "cos-python-sdk-v5==1.9.24",
         "qrcode[pil]==7.4.2", 
         "Pillow==10.1.0",
-        "requests==2.31.0"
+        "requests==2.31.0",
+        "numpy>=1.21"
     ]
     
     for requirement in requirements:
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量任务进度
+功能: 工作线程只更新共享计数，界面按固定节拍读取快照刷新进度条和状态（含速度与剩余时间），
+      并提供暂停、继续与取消
+"""
+
+import threading
+import time
+from collections import deque
+
+# 计算速度的滑动窗口（秒）
+RATE_WINDOW_SECONDS = 5.0
+PAUSE_POLL_SECONDS = 0.1
+
+
+def format_duration(seconds):
+    """秒数格式化为 m:ss 或 h:mm:ss"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class JobProgress:
+    """
+    批量任务的进度计数与控制
+
+    工作线程调用 update() / skip() 写入累计值（只加锁赋值，不触碰Tk），
+    界面每个节拍调用 snapshot() 读取一次，任务再快，Tk事件队列中每个节拍也只有一次刷新。
+
+    渲染循环在提交每块任务前调用 checkpoint()：暂停时阻塞直到继续或取消，取消后返回 True。
+    速度按最近 RATE_WINDOW_SECONDS 秒内实际处理（不含跳过）的数量计算，暂停期间不计时。
+    """
+
+    def __init__(self, total=0):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.current = ""
+
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+        self._started = time.monotonic()
+        self._paused_at = None
+        self._paused_seconds = 0.0
+        self._samples = deque()
+
+    def update(self, done, total=None, failed=None, current=None):
+        """写入累计完成数（含跳过与失败），可同时更新总数、失败数与当前文件"""
+        with self._lock:
+            self.done = max(self.done, done)
+            if total is not None:
+                self.total = total
+            if failed is not None:
+                self.failed = failed
+            if current:
+                self.current = current
+
+    def skip(self, count):
+        """记录未变化而跳过的任务（计入完成数，不计入速度）"""
+        with self._lock:
+            self.skipped += count
+            self.done += count
+
+    def pause(self):
+        """暂停：已提交的块继续完成，之后不再提交"""
+        with self._lock:
+            if self._paused_at is None:
+                self._paused_at = time.monotonic()
+                self._running.clear()
+
+    def resume(self):
+        """继续"""
+        with self._lock:
+            if self._paused_at is not None:
+                self._paused_seconds += time.monotonic() - self._paused_at
+                self._paused_at = None
+                self._samples.clear()
+                self._running.set()
+
+    def cancel(self):
+        """取消（同时解除暂停）"""
+        self._cancelled.set()
+        self._running.set()
+
+    @property
+    def paused(self):
+        """是否已暂停"""
+        return self._paused_at is not None
+
+    @property
+    def cancelled(self):
+        """是否已取消"""
+        return self._cancelled.is_set()
+
+    def checkpoint(self):
+        """渲染循环的检查点：暂停时阻塞，返回是否已取消"""
+        while not self._running.wait(PAUSE_POLL_SECONDS):
+            pass
+        return self._cancelled.is_set()
+
+    def elapsed(self):
+        """不含暂停时间的已用时间（秒）"""
+        now = time.monotonic()
+        paused = self._paused_seconds + (now - self._paused_at if self._paused_at is not None else 0)
+        return now - self._started - paused
+
+    def snapshot(self):
+        """
+        读取当前进度（供界面节拍调用）
+
+        Returns:
+            dict: done, total, skipped, failed, current, percent, rate（个/秒）, eta（秒或None）, elapsed, paused
+        """
+        with self._lock:
+            done, total, skipped = self.done, self.total, self.skipped
+            failed, current = self.failed, self.current
+            elapsed = self.elapsed()
+
+            processed = done - skipped
+            samples = self._samples
+            if not self.paused:
+                samples.append((elapsed, processed))
+            while len(samples) > 2 and samples[0][0] < elapsed - RATE_WINDOW_SECONDS:
+                samples.popleft()
+            rate = 0.0
+            if len(samples) >= 2 and samples[-1][0] > samples[0][0]:
+                rate = (samples[-1][1] - samples[0][1]) / (samples[-1][0] - samples[0][0])
+
+        remaining = max(0, total - done)
+        return {
+            'done': done,
+            'total': total,
+            'skipped': skipped,
+            'failed': failed,
+            'current': current,
+            'percent': done / total * 100 if total else 0,
+            'rate': rate,
+            'eta': remaining / rate if rate > 0 else None,
+            'elapsed': elapsed,
+            'paused': self.paused
+        }
+
+    def describe(self, snapshot=None):
+        """进度的简短文字描述：完成数、速度、剩余时间"""
+        s = snapshot or self.snapshot()
+        text = f"{s['done']}/{s['total']}"
+        if s['paused']:
+            return f"{text} 已暂停"
+        text += f"  {s['rate']:.1f} 个/秒"
+        if s['eta'] is not None:
+            text += f"  剩余 {format_duration(s['eta'])}"
+        return text
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公网地址检查
+功能: 用HEAD请求并发检查二维码依赖的地址（音频对象、播放页面、短ID映射分片）是否可以公开访问；
+      多线程共用一个带连接池的 requests.Session（见 http_pool），每个主机单独用令牌桶限速，
+      403（对象不是公共读）、404、超时等都作为检查结果返回
+"""
+
+import threading
+import time
+import urllib.parse
+
+from app_logging import get_logger
+from app_metrics import get_metrics
+from file_catalog import LinkStatus
+from http_pool import create_session, run_bounded
+
+logger = get_logger("links")
+metrics = get_metrics()
+
+DEFAULT_CHECK_CONCURRENCY = 16
+# 每个主机每秒的请求数上限
+DEFAULT_CHECK_RATE = 20
+# 可访问的结果沿用的秒数
+DEFAULT_CHECK_TTL = 24 * 3600
+REQUEST_TIMEOUT = (5, 15)
+# 不支持 HEAD 的服务器返回这些状态码时改用只读1字节的 GET
+HEAD_UNSUPPORTED = (405, 501)
+
+STATUS_REASONS = {
+    401: "需要授权",
+    403: "拒绝访问（对象不是公共读？）",
+    404: "不存在"
+}
+
+
+class RateLimiter:
+    """
+    令牌桶限速（线程安全）
+
+    令牌不足时预约下一个令牌并在锁外等待，多个线程排队时依次间隔 1/rate 秒；
+    rate 为 0 或 None 时不限速。
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，返回等待的秒数"""
+        if not self.rate:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+def describe_status(status):
+    """HTTP状态码对应的错误说明，可访问（2xx/3xx）时返回 None"""
+    if status < 400:
+        return None
+    reason = STATUS_REASONS.get(status)
+    return f"HTTP {status} {reason}" if reason else f"HTTP {status}"
+
+
+class LinkChecker:
+    """
+    并发检查一批地址
+
+    所有线程共用一个 requests.Session（连接池大小等于并发数，保持长连接），
+    在途请求数不超过 concurrency*2，同一主机的请求不超过 rate 次每秒，结果按批交给回调。
+    """
+
+    def __init__(self, session=None, concurrency=DEFAULT_CHECK_CONCURRENCY, rate=DEFAULT_CHECK_RATE,
+                 timeout=REQUEST_TIMEOUT):
+        self.concurrency = max(1, int(concurrency or 1))
+        self.session = session or create_session(self.concurrency, methods=('HEAD', 'GET'))
+        self.rate = rate
+        self.timeout = timeout
+        self.requests = 0
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, url):
+        """该地址所在主机的限速器"""
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = RateLimiter(self.rate)
+            return limiter
+
+    def _request(self, method, url, **kwargs):
+        """限速后发送一个请求并立即关闭响应（不读取正文）"""
+        self._limiter(url).acquire()
+        with self._lock:
+            self.requests += 1
+        response = self.session.request(method, url, timeout=self.timeout, allow_redirects=True, **kwargs)
+        response.close()
+        return response.status_code
+
+    def check(self, url):
+        """检查单个地址"""
+        try:
+            with metrics.timer("link.check"):
+                status = self._request('HEAD', url)
+                if status in HEAD_UNSUPPORTED:
+                    status = self._request('GET', url, headers={'Range': "bytes=0-0"}, stream=True)
+            error = describe_status(status)
+        except Exception as e:
+            status = None
+            error = f"无法连接: {type(e).__name__}"
+            logger.debug("检查 %s 失败: %s", url, e)
+        if error:
+            metrics.count("link.failed")
+            logger.info("无法访问 %s: %s", url, error)
+        return LinkStatus(url, status, error, time.time())
+
+    def run(self, urls, on_results, should_stop=None):
+        """
+        并发检查
+
+        Args:
+            urls: 地址列表（不重复）
+            on_results: on_results([LinkStatus, ...]) 每批结果回调
+            should_stop: 可选的 should_stop()（如 JobProgress.checkpoint），可阻塞（暂停），返回 True 时停止提交
+
+        Returns:
+            int: 已检查的地址数
+        """
+        checked = [0]
+
+        def on_batch(batch):
+            checked[0] += len(batch)
+            on_results([status for _, status in batch])
+
+        # check() 不抛出异常，网络错误也作为结果返回
+        run_bounded(self.check, urls, on_batch, self.concurrency, should_stop=should_stop,
+                    thread_name_prefix="links")
+        return checked[0]
+
+    def close(self):
+        """关闭会话的连接池"""
+        self.session.close()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二维码渲染缓存
+功能: 以 (内容, 渲染参数) 的摘要为键缓存已生成的PNG。
+      内存层为按字节数限制的LRU，磁盘层按总大小淘汰最久未使用的文件；
+      命中时通过硬链接（不支持时复制）得到输出文件，无需重新编码和光栅化
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join("cache", "qr")
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+
+
+def cache_key(content, settings, fmt="png"):
+    """二维码内容、渲染参数与输出格式的摘要"""
+    payload = json.dumps([content, settings, fmt], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def replace_with_link(src, dest):
+    """
+    将 dest 原子地替换为 src 的硬链接，跨文件系统等无法链接时退回复制
+
+    先链接/复制到临时文件再 os.replace，dest 总是一个新的inode，
+    不会改写与缓存共享的文件内容。
+    """
+    tmp_path = f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+def write_atomic(path, data):
+    """先写临时文件再替换，避免中断时留下半个文件"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class QRRenderCache:
+    """
+    两级二维码渲染缓存
+
+    - 内存层：键 -> PNG字节，超过 memory_bytes 时淘汰最久未使用的条目
+    - 磁盘层：cache_dir/ab/<键>.png，超过 disk_bytes 时删除最久未使用的文件；
+      使用顺序通过文件修改时间持久化，重启后仍然有效
+
+    hits_memory / hits_disk / misses / evictions 计数可在界面状态栏显示。
+    disk_bytes 为 0 时只使用内存层；批量生成、导出与HTTP服务都会填充并查找内存层。
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, memory_bytes=DEFAULT_MEMORY_BYTES, disk_bytes=DEFAULT_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = None
+        self._disk_size = 0
+        self._lock = threading.Lock()
+
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _disk_path(self, key):
+        """缓存文件路径（按前两位分目录）"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def _load_disk_index(self):
+        """首次使用时扫描磁盘层，按修改时间恢复LRU顺序"""
+        if self._disk is not None:
+            return
+        entries = []
+        if self.disk_bytes and os.path.isdir(self.cache_dir):
+            for sub in os.scandir(self.cache_dir):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    if entry.name.endswith(".png"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        entries.sort()
+        self._disk = OrderedDict((key, size) for _, key, size in entries)
+        self._disk_size = sum(size for _, _, size in entries)
+
+    def _remember(self, key, data):
+        """放入内存层并按字节数淘汰"""
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= len(old)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        """磁盘层超出容量时删除最久未使用的文件"""
+        while self._disk_size > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def get_bytes(self, key):
+        """读取缓存的PNG字节，未命中返回 None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return data
+            self._load_disk_index()
+            if key in self._disk:
+                try:
+                    with open(self._disk_path(key), 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    self._disk_size -= self._disk.pop(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self.hits_disk += 1
+                    self._remember(key, data)
+                    return data
+            self.misses += 1
+            return None
+
+    def materialize(self, key, dest):
+        """
+        命中时把缓存内容放到 dest，返回是否命中
+
+        优先硬链接磁盘层文件，其次写出内存层字节。
+        """
+        with self._lock:
+            self._load_disk_index()
+            if key in self._disk:
+                path = self._disk_path(key)
+                try:
+                    replace_with_link(path, dest)
+                    os.utime(path)
+                except OSError:
+                    self._disk_size -= self._disk.pop(key)
+                else:
+                    self._disk.move_to_end(key)
+                    self.hits_disk += 1
+                    return True
+            data = self._memory.get(key)
+            if data is None:
+                self.misses += 1
+                return False
+            self._memory.move_to_end(key)
+            self.hits_memory += 1
+        write_atomic(dest, data)
+        return True
+
+    def put_bytes(self, key, data):
+        """缓存渲染好的PNG字节（同时写入磁盘层）"""
+        with self._lock:
+            self._remember(key, data)
+            self._load_disk_index()
+            if not self.disk_bytes or key in self._disk:
+                return
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                write_atomic(path, data)
+            except OSError:
+                return
+            self._disk[key] = len(data)
+            self._disk_size += len(data)
+            self._evict_disk()
+
+    def put_file(self, key, path):
+        """
+        把已生成的输出文件加入缓存
+
+        与 put_bytes() 一样把字节放入内存层；磁盘层使用硬链接，不额外占用空间。
+        """
+        if self.memory_bytes:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                return
+        with self._lock:
+            if self.memory_bytes:
+                self._remember(key, data)
+            self._load_disk_index()
+            if not self.disk_bytes or key in self._disk:
+                return
+            cache_path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                replace_with_link(path, cache_path)
+                size = os.path.getsize(cache_path)
+            except OSError:
+                return
+            self._disk[key] = size
+            self._disk_size += size
+            self._evict_disk()
+
+    def stats(self):
+        """命中、未命中与淘汰计数"""
+        return {
+            'hits_memory': self.hits_memory,
+            'hits_disk': self.hits_disk,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'memory_bytes': self._memory_size,
+            'disk_bytes': self._disk_size
+        }
+
+    def summary(self):
+        """状态栏显示的简短统计"""
+        hits = self.hits_memory + self.hits_disk
+        return f"缓存 命中 {hits} / 未命中 {self.misses} / 淘汰 {self.evictions}"
@@ -0,0 +1,753 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二维码批量渲染引擎
+功能: 将编码、光栅化和PNG保存分块分发到进程池，按提交顺序汇报进度；
+      通过输出目录中的清单跳过内容未变化的二维码，通过渲染缓存复用相同内容的二维码
+"""
+
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from app_metrics import StageTimings, get_metrics
+from qr_cache import cache_key, write_atomic
+
+metrics = get_metrics()
+
+DEFAULT_RENDER_SETTINGS = {
+    'version': 1,
+    'box_size': 10,
+    'border': 5,
+    'fill_color': 'black',
+    'back_color': 'white',
+    'png_compress_level': 9
+}
+
+# 任务数少于该值时直接在当前线程渲染，避免进程池启动开销
+MIN_PARALLEL_TASKS = 32
+
+# 批量渲染时每块的最大任务数（约1秒的工作量）
+MAX_CHUNK_SIZE = 64
+
+# 流式渲染时每块的任务数较小，第一批二维码可以尽快写出
+STREAM_CHUNK_SIZE = 16
+
+
+_numpy = None
+
+
+def load_numpy():
+    """按需导入numpy，未安装时返回 None（使用qrcode自带的逐模块绘制）"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+def color_palette(fill_color, back_color):
+    """
+    与 qrcode PilImage 一致地确定图像模式
+
+    Returns:
+        None 表示黑白（mode "1"）；(背景RGB, 前景RGB) 表示两色调色板；
+        False 表示透明背景等无法用调色板表示的情况
+    """
+    from PIL import ImageColor
+
+    if isinstance(fill_color, str):
+        fill_color = fill_color.lower()
+    if isinstance(back_color, str):
+        back_color = back_color.lower()
+    if fill_color == "black" and back_color == "white":
+        return None
+    if back_color == "transparent":
+        return False
+    try:
+        colors = [ImageColor.getrgb(c) if isinstance(c, str) else tuple(c) for c in (back_color, fill_color)]
+    except (ValueError, TypeError):
+        return False
+    if any(len(c) != 3 for c in colors):
+        return False
+    return colors[0], colors[1]
+
+
+def rasterize(qr, settings):
+    """
+    将编码好的二维码转换为图像
+
+    用numpy把模块矩阵加边框后按 box_size 整块放大，得到与 qr.make_image() 像素完全一致的
+    1位黑白图（或两色调色板图）；未安装numpy或使用透明背景时退回 qr.make_image()。
+    """
+    from PIL import Image
+
+    np = load_numpy()
+    palette = color_palette(settings['fill_color'], settings['back_color'])
+    if np is None or palette is False:
+        return qr.make_image(fill_color=settings['fill_color'], back_color=settings['back_color'])
+
+    box_size = settings['box_size']
+    dark = np.pad(np.asarray(qr.modules, dtype=bool), settings['border'])
+    dark = np.repeat(np.repeat(dark, box_size, axis=0), box_size, axis=1)
+
+    if palette is None:
+        # mode "1" 中 True 为白色
+        return Image.fromarray(~dark)
+    # 灰度图设置调色板后即为 mode "P"，两种颜色时保存为1位PNG
+    img = Image.fromarray(dark.view(np.uint8))
+    img.putpalette(palette[0] + palette[1])
+    return img
+
+
+def render_png(content, settings=None, timings=None):
+    """编码并光栅化单个二维码，返回PNG字节；timings（StageTimings）记录各阶段耗时"""
+    import qrcode
+
+    def stage(name):
+        return timings.time(name) if timings is not None else nullcontext()
+
+    settings = settings or DEFAULT_RENDER_SETTINGS
+    with stage("qr.encode"):
+        qr = qrcode.QRCode(version=settings['version'], box_size=settings['box_size'], border=settings['border'])
+        qr.add_data(content)
+        qr.make(fit=True)
+
+    with stage("qr.rasterize"):
+        img = rasterize(qr, settings)
+    with stage("qr.png_encode"):
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG", compress_level=settings.get('png_compress_level', 6))
+    return buffer.getvalue()
+
+
+def render_qr(content, path, settings=None, timings=None):
+    """
+    编码、光栅化并保存单个二维码
+
+    输出通过临时文件原子替换，不会改写与渲染缓存硬链接共享的旧文件。
+    """
+    data = render_png(content, settings, timings)
+    with timings.time("qr.write") if timings is not None else nullcontext():
+        write_atomic(path, data)
+
+
+def render_png_chunk(contents, settings):
+    """
+    在工作进程中渲染一批二维码内容，返回PNG字节而不写文件（用于导出）
+
+    Returns:
+        (results, samples, pid): results 与 contents 一一对应，为 (PNG字节, None) 或 (None, 错误信息)；
+        samples 为各阶段耗时，由 collect_chunk() 并入主进程的指标
+    """
+    timings = StageTimings()
+    results = []
+    for content in contents:
+        try:
+            results.append((render_png(content, settings, timings), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results, timings.samples, os.getpid()
+
+
+def render_chunk(tasks, settings):
+    """
+    在工作进程中渲染一批任务
+
+    Returns:
+        (errors, samples, pid): errors 与 tasks 一一对应，成功为 None；samples 同 render_png_chunk()
+    """
+    timings = StageTimings()
+    errors = []
+    for content, path in tasks:
+        try:
+            render_qr(content, path, settings, timings)
+            errors.append(None)
+        except Exception as e:
+            errors.append(str(e))
+    return errors, timings.samples, os.getpid()
+
+
+def collect_chunk(result):
+    """把渲染块带回的阶段耗时并入指标，返回渲染结果"""
+    results, samples, pid = result
+    metrics.merge(samples, pid)
+    return results
+
+
+class QRBatchEngine:
+    """
+    进程池二维码渲染引擎
+
+    任务为 (二维码内容, 输出路径) 元组。任务按 chunksize 分块提交，
+    每完成一块（按提交顺序）回调一次 on_progress(done, total, completed)，
+    completed 为该块中成功的任务下标。进程池在首次大批量任务时创建并复用。
+
+    设置了 cache（QRRenderCache）时，先在当前进程查缓存，命中的直接链接（磁盘层）或写出（内存层）到输出路径，
+    只有未命中的任务才交给进程池，渲染成功的输出再加入缓存的内存层与磁盘层。
+    """
+
+    def __init__(self, workers=None, chunksize=None, settings=None, cache=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.settings = dict(settings or DEFAULT_RENDER_SETTINGS)
+        self.cache = cache
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        """按需创建进程池（可能被多个请求线程同时调用）"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _chunk_size(self, total):
+        """
+        每个工作进程约分到4块，兼顾负载均衡与进程间通信开销
+
+        每块最多 MAX_CHUNK_SIZE 个任务，进度刷新、暂停和取消不会等待太久。
+        """
+        if self.chunksize:
+            return self.chunksize
+        return max(1, min(MAX_CHUNK_SIZE, total // (self.workers * 4) or 1))
+
+    def run(self, tasks, on_progress=None, use_cache=True, should_stop=None):
+        """
+        渲染全部任务
+
+        Args:
+            tasks: [(content, path), ...]
+            on_progress: 进度回调 on_progress(done, total, completed)
+            use_cache: 为 False 时跳过缓存查找（仍会把新渲染的结果放入缓存）
+            should_stop: 可选的 should_stop()，每提交一块前调用，可阻塞（暂停），返回 True 时停止提交
+
+        Returns:
+            list: 失败的任务 [(task_index, error), ...]
+        """
+        tasks = list(tasks)
+        if self.cache is None:
+            return self._render(tasks, on_progress, should_stop)
+
+        total = len(tasks)
+        keys = [cache_key(content, self.settings) for content, _ in tasks]
+        hits = []
+        misses = []
+        with metrics.timer("qr.cache_lookup"):
+            for i, (_, path) in enumerate(tasks):
+                if use_cache and self.cache.materialize(keys[i], path):
+                    hits.append(i)
+                else:
+                    misses.append(i)
+        metrics.count("qr.cache_hits", len(hits))
+        if on_progress and hits:
+            on_progress(len(hits), total, hits)
+
+        def progress(done, _, completed):
+            completed = [misses[i] for i in completed]
+            for i in completed:
+                self.cache.put_file(keys[i], tasks[i][1])
+            if on_progress:
+                on_progress(len(hits) + done, total, completed)
+
+        failures = self._render([tasks[i] for i in misses], progress, should_stop)
+        return [(misses[i], error) for i, error in failures]
+
+    def _results(self, chunks, parallel, should_stop):
+        """
+        按提交顺序逐块产出 (start, errors)
+
+        并行时最多 workers * 2 块在途，每提交一块前检查 should_stop，
+        停止后不再提交，已提交的块仍会产出（暂停期间完成的块在继续后汇报）。
+        """
+        executor = self._get_executor() if parallel else None
+        in_flight = deque()
+        for start, chunk in chunks:
+            # 先汇报已经完成的块，暂停时 should_stop() 会阻塞
+            while in_flight and in_flight[0][1].done():
+                finished, future = in_flight.popleft()
+                yield finished, collect_chunk(future.result())
+            if should_stop and should_stop():
+                break
+            if executor is None:
+                yield start, collect_chunk(render_chunk(chunk, self.settings))
+                continue
+            in_flight.append((start, executor.submit(render_chunk, chunk, self.settings)))
+            if len(in_flight) >= self.workers * 2:
+                start, future = in_flight.popleft()
+                yield start, collect_chunk(future.result())
+        while in_flight:
+            start, future = in_flight.popleft()
+            yield start, collect_chunk(future.result())
+
+    def _render(self, tasks, on_progress=None, should_stop=None):
+        """分块渲染任务（不经过缓存）"""
+        total = len(tasks)
+        failures = []
+        if not total:
+            return failures
+
+        size = self._chunk_size(total)
+        chunks = [(start, tasks[start:start + size]) for start in range(0, total, size)]
+        parallel = self.workers > 1 and total >= MIN_PARALLEL_TASKS
+        results = self._results(chunks, parallel, should_stop)
+
+        done = 0
+        for start, errors in results:
+            completed = []
+            for offset, error in enumerate(errors):
+                if error is None:
+                    completed.append(start + offset)
+                else:
+                    failures.append((start + offset, error))
+            done += len(errors)
+            metrics.count("qr.rendered", len(completed))
+            metrics.count("qr.failed", len(errors) - len(completed))
+            if on_progress:
+                on_progress(done, total, completed)
+
+        return failures
+
+    def run_incremental(self, tasks, output_dir, mode, force=False, on_progress=None,
+                        on_skipped=None, should_stop=None, use_cache=None):
+        """
+        借助输出目录清单只渲染新增或变化的任务
+
+        Args:
+            tasks: [(content, path), ...]
+            output_dir: 输出目录（清单所在位置）
+            mode: 二维码生成方式，参与摘要计算
+            force: 为 True 时忽略清单全部重新生成
+            on_progress: 进度回调 on_progress(done, total, completed)，下标对应原始 tasks
+            on_skipped: 可选，渲染开始前以跳过的任务下标调用一次 on_skipped(skipped)
+            should_stop: 可选的 should_stop()，见 run()；停止后未提交的任务既不算失败也不记入清单
+            use_cache: 是否查找渲染缓存，默认与 force 相反
+
+        Returns:
+            (failures, skipped): 失败的任务 [(task_index, error), ...] 与跳过的任务下标
+        """
+        tasks = list(tasks)
+        manifest = QRManifest(output_dir)
+        pending, digests = manifest.filter_tasks(tasks, mode, self.settings, force)
+        pending_set = set(pending)
+        skipped = [i for i in range(len(tasks)) if i not in pending_set]
+        # 输出可能分布在多个子目录中（如多来源批量生成），渲染前在主进程统一创建
+        for directory in {os.path.dirname(tasks[i][1]) for i in pending}:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        if on_skipped and skipped:
+            on_skipped(skipped)
+        if on_progress and skipped:
+            on_progress(len(skipped), len(tasks), skipped)
+
+        def progress(done, total, completed):
+            completed = [pending[i] for i in completed]
+            for i in completed:
+                manifest.record(tasks[i][1], digests[i])
+            if on_progress:
+                on_progress(len(skipped) + done, len(tasks), completed)
+
+        try:
+            failures = self.run([tasks[i] for i in pending], progress,
+                                use_cache=not force if use_cache is None else use_cache,
+                                should_stop=should_stop)
+        finally:
+            manifest.save()
+        return [(pending[i], error) for i, error in failures], skipped
+
+    def run_stream(self, batches, on_chunk=None, use_cache=True, should_stop=None):
+        """
+        流式渲染：逐批消费 batches（可以是边列举边产生的生成器）
+
+        缓存命中的任务直接链接到输出路径，未命中的按 STREAM_CHUNK_SIZE 分块提交到进程池；
+        在途的块不超过 workers * 2 个，达到上限时先等待最早的块完成再继续读取 batches，
+        因此内存占用与任务总数无关。
+
+        Args:
+            batches: 可迭代的任务列表 [(content, path), ...]
+            on_chunk: 每完成一块回调 on_chunk(tasks, errors)（按完成顺序），errors 与 tasks 一一对应
+            use_cache: 为 False 时跳过缓存查找
+            should_stop: 可选的 should_stop()，返回 True 时不再提交新的块（已提交的块仍会完成）
+
+        Returns:
+            list: 失败的任务 [(task, error), ...]
+        """
+        failures = []
+        in_flight = deque()
+        executor = self._get_executor() if self.workers > 1 else None
+        limit = self.workers * 2
+
+        def finish(chunk, keys, errors):
+            for task, key, error in zip(chunk, keys, errors):
+                if error is not None:
+                    failures.append((task, error))
+                elif key is not None:
+                    self.cache.put_file(key, task[1])
+            if on_chunk:
+                on_chunk(chunk, errors)
+
+        for batch in batches:
+            # 输出按对象键的目录层级存放，渲染前在主进程创建本批涉及的子目录
+            for directory in {os.path.dirname(task[1]) for task in batch}:
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            hits = []
+            misses = []
+            for task in batch:
+                key = cache_key(task[0], self.settings) if self.cache is not None else None
+                if use_cache and key is not None and self.cache.materialize(key, task[1]):
+                    hits.append(task)
+                else:
+                    misses.append((task, key))
+            if hits and on_chunk:
+                on_chunk(hits, [None] * len(hits))
+
+            for start in range(0, len(misses), STREAM_CHUNK_SIZE):
+                if should_stop and should_stop():
+                    break
+                chunk = [task for task, _ in misses[start:start + STREAM_CHUNK_SIZE]]
+                keys = [key for _, key in misses[start:start + STREAM_CHUNK_SIZE]]
+                if executor is None:
+                    finish(chunk, keys, collect_chunk(render_chunk(chunk, self.settings)))
+                    continue
+                in_flight.append((chunk, keys, executor.submit(render_chunk, chunk, self.settings)))
+                while len(in_flight) >= limit:
+                    chunk, keys, future = in_flight.popleft()
+                    finish(chunk, keys, collect_chunk(future.result()))
+
+            # 等待下一批之前先汇报已经完成的块
+            while in_flight and in_flight[0][2].done():
+                chunk, keys, future = in_flight.popleft()
+                finish(chunk, keys, collect_chunk(future.result()))
+
+        while in_flight:
+            chunk, keys, future = in_flight.popleft()
+            finish(chunk, keys, collect_chunk(future.result()))
+        return failures
+
+    def render_bytes(self, contents, use_cache=True, should_stop=None):
+        """
+        按顺序逐个产出二维码PNG字节，不写输出文件（导出ZIP或打印页时使用）
+
+        缓存命中的直接读取，其余分块交给进程池；在途的块不超过 workers * 2 个，
+        调用方消费得慢时不会继续提交，内存占用与任务总数无关。
+
+        Args:
+            contents: 二维码内容列表
+            use_cache: 为 False 时跳过缓存查找（仍会把新渲染的结果放入缓存）
+            should_stop: 可选的 should_stop()，每提交一块前调用，可阻塞（暂停），返回 True 时停止
+
+        Yields:
+            (index, png_bytes, error): 成功时 error 为 None，失败时 png_bytes 为 None
+        """
+        contents = list(contents)
+        total = len(contents)
+        size = self._chunk_size(total)
+        executor = self._get_executor() if self.workers > 1 and total >= MIN_PARALLEL_TASKS else None
+        in_flight = deque()
+
+        def results(entry):
+            start, keys, cached, rendered = entry
+            rendered = iter(collect_chunk(rendered.result() if executor is not None else rendered))
+            for offset, (key, data) in enumerate(zip(keys, cached)):
+                error = None
+                if data is None:
+                    data, error = next(rendered)
+                    if data is not None and key is not None:
+                        self.cache.put_bytes(key, data)
+                yield start + offset, data, error
+
+        for start in range(0, total, size):
+            while in_flight and (executor is None or in_flight[0][3].done()):
+                yield from results(in_flight.popleft())
+            if should_stop and should_stop():
+                break
+
+            chunk = contents[start:start + size]
+            keys = [cache_key(content, self.settings) if self.cache is not None else None for content in chunk]
+            cached = [self.cache.get_bytes(key) if use_cache and key is not None else None for key in keys]
+            misses = [content for content, data in zip(chunk, cached) if data is None]
+            if executor is None:
+                rendered = render_png_chunk(misses, self.settings)
+            else:
+                rendered = executor.submit(render_png_chunk, misses, self.settings)
+            in_flight.append((start, keys, cached, rendered))
+            if len(in_flight) >= self.workers * 2:
+                yield from results(in_flight.popleft())
+
+        while in_flight:
+            yield from results(in_flight.popleft())
+
+    def submit_png(self, contents):
+        """
+        提交一小批内容渲染为PNG字节（按需生成二维码的HTTP服务使用），不查缓存也不写文件
+
+        workers 为 1 时直接在调用线程渲染，返回已完成的 Future。
+
+        Returns:
+            Future: 结果同 render_png_chunk()
+        """
+        contents = list(contents)
+        future = Future()
+        if self.workers > 1:
+            pending = self._get_executor().submit(render_png_chunk, contents, self.settings)
+
+            def done(pending):
+                try:
+                    future.set_result(collect_chunk(pending.result()))
+                except Exception as e:
+                    future.set_exception(e)
+
+            pending.add_done_callback(done)
+        else:
+            future.set_result(collect_chunk(render_png_chunk(contents, self.settings)))
+        return future
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+MANIFEST_NAME = ".qr_manifest.json"
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+
+
+def lock_file(f, blocking=True):
+    """
+    对已打开的文件加进程间独占锁（POSIX 为 flock，Windows 为 msvcrt 锁住第一个字节），关闭文件即释放
+
+    Returns:
+        bool: 非阻塞时锁已被其他打开的文件持有返回 False
+    """
+    if os.name == 'nt':
+        import msvcrt
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.05)
+    import fcntl
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
+
+
+def task_digest(content, mode, settings):
+    """二维码内容、生成方式与渲染参数的摘要"""
+    payload = json.dumps([content, mode, settings], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class QRManifest:
+    """
+    输出目录中的生成清单
+
+    记录每个输出文件（相对输出目录的路径）对应的内容摘要。
+    批量生成前用 filter_tasks() 跳过摘要一致且文件仍存在的任务，
+    生成后用 record() 记录成功的任务，最后 save() 原子写回。
+
+    record() 同时把每条记录追加到本实例自己的日志文件（.qr_manifest.json.journal.<编号>）并立即刷新，
+    程序中途退出或崩溃时，下次 load() 会把日志重放到清单上，已完成的输出不会重新生成。
+
+    同一输出目录可能同时有多个实例（监视模式与批量任务、图形界面与命令行进程）：
+    save() 在文件锁（.qr_manifest.json.lock）内重新读取磁盘上的清单，只合并本实例的记录与删除，
+    不会覆盖其他实例已保存的记录；每个实例打开日志期间持有其文件锁，
+    save() 只删除自己的日志和无人持有的日志（崩溃遗留，已合并），不会删除仍在运行的实例的日志。
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.journal_path = f"{self.path}{JOURNAL_SUFFIX}.{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        self.entries = {}
+        self._changes = {}
+        self._listed = {}
+        self._journal = None
+        self.replayed = 0
+        self.load()
+
+    @contextmanager
+    def _locked(self):
+        """清单文件锁，读取-合并-写回期间持有"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(self.path + LOCK_SUFFIX, 'a+b') as f:
+            lock_file(f)
+            yield
+
+    def _journals(self):
+        """输出目录中全部日志文件（含旧版本的 .qr_manifest.json.journal），按修改时间排序"""
+        paths = glob.glob(glob.escape(self.path + JOURNAL_SUFFIX) + "*")
+
+        def mtime(path):
+            try:
+                return os.path.getmtime(path)
+            except OSError:
+                return 0
+        return sorted(paths, key=mtime)
+
+    def _read(self):
+        """读取磁盘上的清单，文件不存在或损坏时视为空"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('entries', {})
+        except (OSError, ValueError):
+            return {}
+
+    def load(self):
+        """读取清单并重放未合并的日志（包括其他仍在运行的实例已记录的输出）"""
+        self.entries = self._read()
+        self.replayed = sum(self._apply(self.entries, self._read_journal(path)) for path in self._journals())
+
+    @staticmethod
+    def _read_journal(path):
+        """读取日志中的记录 [(relpath, digest或None), ...]（中断时写了一半的最后一行被忽略）"""
+        records = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        relpath, digest = json.loads(line)
+                    except ValueError:
+                        continue
+                    records.append((relpath, digest))
+        except OSError:
+            pass
+        return records
+
+    @staticmethod
+    def _apply(entries, records):
+        """按顺序把记录应用到 entries（digest 为 None 表示移除），返回记录条数"""
+        for relpath, digest in records:
+            if digest is None:
+                entries.pop(relpath, None)
+            else:
+                entries[relpath] = digest
+        return len(records)
+
+    def _append_journal(self, relpath, digest):
+        """追加一条日志并刷新到操作系统（进程崩溃不会丢失）"""
+        if self._journal is None:
+            # 在清单锁内创建并锁住日志，save() 不会把刚创建的日志当作遗留日志删除
+            with self._locked():
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+                lock_file(self._journal)
+        self._journal.write(json.dumps([relpath, digest], ensure_ascii=False) + "\n")
+        self._journal.flush()
+
+    def _claim_orphans(self, entries):
+        """合并并删除无人持有的日志（调用方已持有清单锁）"""
+        for path in self._journals():
+            if path == self.journal_path:
+                continue
+            # 先读取再尝试加锁：Windows 的锁按句柄生效，加锁后其他句柄无法读取
+            records = self._read_journal(path)
+            try:
+                with open(path, 'a', encoding='utf-8') as f:
+                    if not lock_file(f, blocking=False):
+                        continue
+                # 持有者已退出（日志名唯一，清单锁内不会有新的持有者），关闭后删除
+                os.remove(path)
+            except OSError:
+                continue
+            self._apply(entries, records)
+
+    def save(self):
+        """
+        在文件锁内与磁盘上的清单合并后写回（先写临时文件再替换，避免中断时清单损坏），
+        然后删除已合并的日志
+        """
+        with self._locked():
+            entries = self._read()
+            self._claim_orphans(entries)
+            self._apply(entries, self._changes.items())
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'entries': entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.entries = entries
+            self._changes = {}
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+                try:
+                    os.remove(self.journal_path)
+                except OSError:
+                    pass
+
+    def relpath(self, path):
+        """输出文件相对输出目录的路径，作为清单键"""
+        return os.path.relpath(path, self.output_dir).replace(os.sep, '/')
+
+    def is_current(self, path, digest):
+        """输出文件存在且摘要一致时视为最新"""
+        return self.entries.get(self.relpath(path)) == digest and os.path.exists(path)
+
+    def filter_tasks(self, tasks, mode, settings, force=False):
+        """
+        筛选需要重新生成的任务
+
+        Returns:
+            (pending, digests): pending 为需要生成的任务下标，digests 与 tasks 一一对应
+        """
+        digests = [task_digest(content, mode, settings) for content, _ in tasks]
+        if force:
+            return list(range(len(tasks))), digests
+
+        pending = [i for i, ((_, path), digest) in enumerate(zip(tasks, digests))
+                   if self.entries.get(self.relpath(path)) != digest
+                   or path not in self._existing(os.path.dirname(path))]
+        return pending, digests
+
+    def _existing(self, directory):
+        """
+        目录中已有的文件路径
+
+        每个目录只扫描一次（流式生成时多次调用 filter_tasks 也不会重复扫描），
+        避免对每个输出文件单独 stat；之后新生成的文件总是待生成任务，不影响判断。
+        """
+        existing = self._listed.get(directory)
+        if existing is None:
+            existing = set()
+            try:
+                with os.scandir(directory) as it:
+                    existing.update(entry.path for entry in it)
+            except OSError:
+                pass
+            self._listed[directory] = existing
+        return existing
+
+    def record(self, path, digest):
+        """记录一个已生成的输出（同时写入日志）"""
+        relpath = self.relpath(path)
+        self.entries[relpath] = digest
+        self._changes[relpath] = digest
+        self._append_journal(relpath, digest)
+
+    def forget(self, paths):
+        """移除输出的记录，之后这些输出总会被重新生成（用于强制重新生成的任务）"""
+        for path in paths:
+            relpath = self.relpath(path)
+            if self.entries.pop(relpath, None) is not None:
+                self._changes[relpath] = None
+                self._append_journal(relpath, None)
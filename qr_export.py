@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二维码批量导出
+功能: 渲染结果不落地为单个PNG文件，直接顺序写入ZIP压缩包，
+      或按网格排版（二维码+文件名标签）写成可打印的多页PDF或PNG页面；
+      渲染与写出流式进行，内存中只有在途的渲染块和当前一页
+"""
+
+import io
+import os
+import time
+import zipfile
+import zlib
+
+from app_logging import get_logger
+
+logger = get_logger("export")
+
+EXPORT_FORMATS = ("zip", "pdf", "png")
+
+# 纸张尺寸（毫米）
+PAGE_SIZES = {
+    'A4': (210.0, 297.0),
+    'A3': (297.0, 420.0),
+    'A5': (148.0, 210.0),
+    'Letter': (215.9, 279.4)
+}
+
+DEFAULT_SHEET_LAYOUT = {
+    'page': 'A4',
+    'dpi': 300,
+    'columns': 4,
+    'rows': 5,
+    'margin_mm': 10.0,
+    'font_size_pt': 9,
+    'font': ""
+}
+
+# 依次尝试的中文字体（Windows / macOS / Linux），都不可用时使用PIL内置字体（不含中文字形）
+LABEL_FONTS = (
+    "msyh.ttc",
+    "simhei.ttf",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Light.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "DejaVuSans.ttf"
+)
+
+MM_PER_INCH = 25.4
+POINTS_PER_INCH = 72
+
+
+def export_format(path, fmt=None):
+    """导出格式：未指定时按文件扩展名判断"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}（可选 {', '.join(EXPORT_FORMATS)}）")
+    return fmt
+
+
+def unique_name(name, used):
+    """压缩包内重名时在扩展名前加序号"""
+    if name not in used:
+        used.add(name)
+        return name
+    stem, ext = os.path.splitext(name)
+    number = 2
+    while f"{stem}_{number}{ext}" in used:
+        number += 1
+    name = f"{stem}_{number}{ext}"
+    used.add(name)
+    return name
+
+
+def load_label_font(size_px, font_path=""):
+    """加载标签字体，优先使用配置的字体文件"""
+    from PIL import ImageFont
+
+    for candidate in ((font_path,) if font_path else ()) + LABEL_FONTS:
+        try:
+            return ImageFont.truetype(candidate, size_px)
+        except OSError:
+            continue
+    logger.warning("未找到可用的中文字体，标签使用PIL内置字体，中文可能无法显示")
+    return ImageFont.load_default()
+
+
+def fit_label(draw, text, font, width):
+    """标签超出格子宽度时截断并加省略号"""
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+class ZipExporter:
+    """
+    顺序写入ZIP压缩包
+
+    PNG本身已压缩，条目使用 ZIP_STORED 存储；先写入 .part 文件，完成后原子替换，
+    中途取消或失败时不会留下不完整的压缩包。条目超过65535个时自动使用ZIP64。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".part"
+        self.count = 0
+        self._names = set()
+        self._zip = zipfile.ZipFile(self.tmp_path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+        self._date_time = time.localtime()[:6]
+
+    def add(self, name, data, label=None):
+        """写入一个二维码"""
+        info = zipfile.ZipInfo(unique_name(name.replace(os.sep, "/"), self._names), self._date_time)
+        self._zip.writestr(info, data)
+        self.count += 1
+
+    def close(self, commit=True):
+        """关闭压缩包，commit 为 False 时丢弃"""
+        self._zip.close()
+        if commit:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+
+class PdfPageWriter:
+    """
+    逐页写出PDF（每页一张整页图像）
+
+    每页的图像对象和内容流写出后即释放，结束时只需写入页面目录与交叉引用表，
+    页数再多内存中也只有当前一页。
+    """
+
+    def __init__(self, path, page_points):
+        self.path = path
+        self.tmp_path = path + ".part"
+        self.page_points = page_points
+        self.count = 0
+        self._file = open(self.tmp_path, 'wb')
+        self._offsets = {}
+        self._pages = []
+        # 1 号对象为目录，2 号对象为页面树，最后写出
+        self._next_id = 3
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _object(self, body, object_id=None):
+        """写出一个间接对象，返回对象号"""
+        if object_id is None:
+            object_id = self._next_id
+            self._next_id += 1
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(b"%d 0 obj\n" % object_id + body + b"\nendobj\n")
+        return object_id
+
+    def _stream(self, dictionary, data):
+        """写出一个流对象"""
+        return self._object(b"<< %s /Length %d >>\nstream\n" % (dictionary, len(data)) + data + b"\nendstream")
+
+    def add_page(self, image):
+        """写出一页（mode "L" 或 "RGB" 的整页图像）"""
+        color_space = b"/DeviceRGB" if image.mode == "RGB" else b"/DeviceGray"
+        image_id = self._stream(
+            b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace %s /BitsPerComponent 8 /Filter /FlateDecode"
+            % (image.width, image.height, color_space),
+            zlib.compress(image.tobytes(), 6))
+        width, height = self.page_points
+        content_id = self._stream(b"", b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (width, height))
+        page_id = self._object(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+            % (width, height, image_id, content_id))
+        self._pages.append(page_id)
+        self.count += 1
+
+    def close(self, commit=True):
+        """写入页面树、目录与交叉引用表"""
+        if commit:
+            kids = b" ".join(b"%d 0 R" % page_id for page_id in self._pages)
+            self._object(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._pages)), 2)
+            self._object(b"<< /Type /Catalog /Pages 2 0 R >>", 1)
+            xref = self._file.tell()
+            size = self._next_id
+            self._file.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+            for object_id in range(1, size):
+                self._file.write(b"%010d 00000 n \n" % self._offsets[object_id])
+            self._file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref))
+        self._file.close()
+        if commit:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+
+
+class PngPageWriter:
+    """每页保存为一个PNG文件：sheets.png -> sheets_001.png, sheets_002.png, ..."""
+
+    def __init__(self, path, dpi):
+        self.stem, self.ext = os.path.splitext(path)
+        self.dpi = dpi
+        self.count = 0
+        self.paths = []
+
+    def add_page(self, image):
+        """保存一页"""
+        from qr_cache import write_atomic
+
+        self.count += 1
+        path = f"{self.stem}_{self.count:03d}{self.ext or '.png'}"
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", dpi=(self.dpi, self.dpi), optimize=False)
+        write_atomic(path, buffer.getvalue())
+        self.paths.append(path)
+
+    def close(self, commit=True):
+        """PNG页面逐页写出，提交时无需收尾；取消时删除已写出的页面"""
+        if commit:
+            return
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.paths = []
+        self.count = 0
+
+
+class SheetExporter:
+    """
+    把二维码按 columns x rows 网格排版到打印页
+
+    每格上方为二维码（最近邻缩放，保持模块边缘清晰），下方为标签；
+    一页排满即交给页面写出器并释放，内存中只有当前一页。
+    """
+
+    def __init__(self, writer, layout=None, color=False):
+        from PIL import Image, ImageDraw
+
+        self.layout = dict(DEFAULT_SHEET_LAYOUT, **(layout or {}))
+        self.writer = writer
+        self.mode = "RGB" if color else "L"
+        self.count = 0
+
+        dpi = self.layout['dpi']
+        page_mm = PAGE_SIZES[self.layout['page']]
+        self.page_px = tuple(int(round(mm / MM_PER_INCH * dpi)) for mm in page_mm)
+        margin = int(round(self.layout['margin_mm'] / MM_PER_INCH * dpi))
+        columns, rows = self.layout['columns'], self.layout['rows']
+        self.cell_w = (self.page_px[0] - 2 * margin) // columns
+        self.cell_h = (self.page_px[1] - 2 * margin) // rows
+        self.margin = margin
+
+        font_px = max(8, int(round(self.layout['font_size_pt'] / POINTS_PER_INCH * dpi)))
+        self.font = load_label_font(font_px, self.layout['font'])
+        self.label_h = int(font_px * 1.6)
+        padding = max(2, self.cell_w // 20)
+        self.qr_size = max(16, min(self.cell_w, self.cell_h - self.label_h) - 2 * padding)
+
+        self._Image = Image
+        self._ImageDraw = ImageDraw
+        self._page = None
+        self._draw = None
+        self._slot = 0
+
+    @property
+    def per_page(self):
+        """每页的格子数"""
+        return self.layout['columns'] * self.layout['rows']
+
+    def _new_page(self):
+        """开始新的一页"""
+        self._page = self._Image.new(self.mode, self.page_px, "white")
+        self._draw = self._ImageDraw.Draw(self._page)
+        self._slot = 0
+
+    def _flush(self):
+        """把当前页交给写出器"""
+        if self._page is not None and self._slot:
+            self.writer.add_page(self._page)
+        self._page = None
+        self._draw = None
+
+    def add(self, name, data, label=None):
+        """排入一个二维码（PNG字节），label 为空时使用文件名"""
+        if self._page is None:
+            self._new_page()
+
+        column = self._slot % self.layout['columns']
+        row = self._slot // self.layout['columns']
+        x = self.margin + column * self.cell_w
+        y = self.margin + row * self.cell_h
+
+        with self._Image.open(io.BytesIO(data)) as qr:
+            qr = qr.convert(self.mode).resize((self.qr_size, self.qr_size), self._Image.NEAREST)
+        self._page.paste(qr, (x + (self.cell_w - self.qr_size) // 2, y + (self.cell_h - self.label_h - self.qr_size) // 2))
+
+        text = fit_label(self._draw, label or os.path.splitext(os.path.basename(name))[0], self.font, self.cell_w - 8)
+        self._draw.text((x + self.cell_w // 2, y + self.cell_h - self.label_h // 2), text,
+                        fill="black", font=self.font, anchor="mm")
+
+        self.count += 1
+        self._slot += 1
+        if self._slot == self.per_page:
+            self._flush()
+
+    def close(self, commit=True):
+        """写出最后一页并关闭写出器"""
+        if commit:
+            self._flush()
+        self.writer.close(commit)
+
+
+def create_exporter(path, fmt=None, layout=None, color=False):
+    """
+    按格式创建导出器（add(name, data, label) / close(commit)）
+
+    Args:
+        path: 导出文件路径（PNG页面以它为前缀编号）
+        fmt: zip / pdf / png，未指定时按扩展名判断
+        layout: 打印页排版参数，见 DEFAULT_SHEET_LAYOUT
+        color: 二维码是否为彩色（打印页使用RGB，否则使用灰度）
+    """
+    fmt = export_format(path, fmt)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    if fmt == "zip":
+        return ZipExporter(path)
+
+    layout = dict(DEFAULT_SHEET_LAYOUT, **(layout or {}))
+    if layout['page'] not in PAGE_SIZES:
+        raise ValueError(f"不支持的纸张: {layout['page']}（可选 {', '.join(PAGE_SIZES)}）")
+    if fmt == "pdf":
+        page_mm = PAGE_SIZES[layout['page']]
+        writer = PdfPageWriter(path, tuple(mm / MM_PER_INCH * POINTS_PER_INCH for mm in page_mm))
+    else:
+        writer = PngPageWriter(path, layout['dpi'])
+    return SheetExporter(writer, layout, color=color)
+
+
+def export_qr_codes(engine, entries, path, fmt=None, layout=None, use_cache=True,
+                    on_progress=None, should_stop=None):
+    """
+    渲染并导出一批二维码
+
+    Args:
+        engine: QRBatchEngine（使用其 render_bytes() 按顺序取得PNG字节）
+        entries: [(二维码内容, 条目名, 标签或None), ...]，条目名为压缩包内路径
+        path: 导出文件路径
+        on_progress: 进度回调 on_progress(done, total)
+        should_stop: 可选的 should_stop()，可阻塞（暂停），返回 True 时取消（不保留不完整的导出文件）
+
+    Returns:
+        dict: total、exported、failures [(条目名, 错误)]、pages、cancelled
+    """
+    from qr_engine import color_palette
+
+    entries = list(entries)
+    color = color_palette(engine.settings['fill_color'], engine.settings['back_color']) is not None
+    exporter = create_exporter(path, fmt, layout, color=color)
+    failures = []
+    done = 0
+    committed = False
+    try:
+        for index, data, error in engine.render_bytes([content for content, _, _ in entries],
+                                                      use_cache=use_cache, should_stop=should_stop):
+            _, name, label = entries[index]
+            if error is None:
+                exporter.add(name, data, label)
+            else:
+                failures.append((name, error))
+            done += 1
+            if on_progress:
+                on_progress(done, len(entries))
+        committed = done == len(entries)
+    finally:
+        exporter.close(commit=committed)
+
+    pages = getattr(exporter, 'writer', None)
+    summary = {
+        'total': len(entries),
+        'exported': done - len(failures),
+        'failures': failures,
+        'pages': pages.count if pages is not None and committed else 0,
+        'cancelled': not committed
+    }
+    if committed:
+        logger.info("导出完成: %s，%d 个二维码，%d 页，失败 %d", path, summary['exported'], summary['pages'], len(failures))
+    else:
+        logger.info("导出已取消: %s，已处理 %d/%d 个二维码，未保留导出文件", path, done, len(entries))
+    return summary
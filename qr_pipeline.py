@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+边列举边生成二维码的流水线
+功能: 列举线程把每页音频文件放入有界队列，渲染引擎从队列中取出页面立即生成；
+      第一页返回后即可写出第一批二维码，内存占用与存储桶大小无关
+"""
+
+import queue
+import threading
+import time
+
+from app_logging import get_logger
+from qr_engine import QRManifest
+
+logger = get_logger("pipeline")
+
+# 队列中最多缓存的页数，渲染跟不上时列举线程暂停
+DEFAULT_QUEUE_PAGES = 8
+QUEUE_POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class PipelineCancelled(Exception):
+    """流水线已取消，用于中止列举线程"""
+
+
+class ListRenderPipeline:
+    """
+    列举 -> 有界队列 -> 渲染 流水线
+
+    - 列举：lister.stream_pages() 在后台线程中并发分页列举，每页音频文件放入队列，
+      队列满时阻塞，列举速度自动与渲染速度匹配
+    - 渲染：当前线程从队列取出页面，写入本地快照（只新增/覆盖），用生成清单跳过未变化的输出，
+      其余任务交给 engine.run_stream() 分块渲染
+
+    队列、在途渲染块和待记录的摘要都有上限，内存占用不随存储桶大小增长。
+    流式列举看不到完整的对象集合，不会从快照中删除已删除的对象，需要时另行完整刷新。
+    """
+
+    def __init__(self, lister, engine, output_dir, mode, make_tasks, catalog=None, force=False,
+                 queue_pages=DEFAULT_QUEUE_PAGES, on_progress=None, on_finish=None, should_stop=None):
+        """
+        Args:
+            lister: ShardedLister
+            engine: QRBatchEngine
+            output_dir: 输出目录（生成清单所在位置）
+            mode: 二维码生成方式，参与清单摘要计算
+            make_tasks: make_tasks(files) -> [(content, path), ...]，与 files 一一对应
+            catalog: 可选的 FileCatalog，每页写入快照
+            force: 为 True 时忽略清单与缓存全部重新生成
+            on_progress: 进度回调 on_progress(done, total, scanned)，total 为目前已列举的音频文件数
+            on_finish: 全部完成后调用（例如导出短ID映射）
+            should_stop: 可选的 should_stop()（如 JobProgress.checkpoint），可阻塞（暂停），返回 True 时取消
+        """
+        self.lister = lister
+        self.engine = engine
+        self.output_dir = output_dir
+        self.mode = mode
+        self.make_tasks = make_tasks
+        self.catalog = catalog
+        self.force = force
+        self.on_progress = on_progress
+        self.on_finish = on_finish
+        self.should_stop = should_stop
+
+        self.listed = 0
+        self.generated = 0
+        self.skipped = 0
+        self.failures = []
+        self.first_result_seconds = None
+
+        self._pages = queue.Queue(maxsize=queue_pages)
+        self._cancelled = threading.Event()
+        self._pending = {}
+        self._list_error = None
+        self._started = None
+
+    def cancel(self):
+        """取消：停止列举，已提交的渲染块完成后返回"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        """是否已取消"""
+        return self._cancelled.is_set()
+
+    def _should_stop(self):
+        """渲染循环的检查点：外部暂停时在此阻塞，外部取消时一并取消列举"""
+        if self.should_stop is not None and self.should_stop():
+            self.cancel()
+        return self._cancelled.is_set()
+
+    def _put(self, item):
+        """放入队列，队列满时等待，取消后放弃"""
+        while not self._cancelled.is_set():
+            try:
+                self._pages.put(item, timeout=QUEUE_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _emit(self, files):
+        """列举线程回调：每页音频文件放入队列"""
+        if not self._put(files):
+            raise PipelineCancelled()
+
+    def _list(self):
+        """后台列举线程"""
+        try:
+            self.lister.stream_pages(self._emit)
+        except PipelineCancelled:
+            pass
+        except Exception as e:
+            logger.exception("流式列举失败: %s", e)
+            self._list_error = e
+        finally:
+            self._put(_DONE)
+
+    def _batches(self, manifest):
+        """从队列取出页面，筛选出需要生成的任务"""
+        while True:
+            try:
+                files = self._pages.get(timeout=QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                if self._cancelled.is_set():
+                    return
+                continue
+            if files is _DONE or self._cancelled.is_set():
+                return
+
+            self.listed += len(files)
+            if self.catalog is not None:
+                self.catalog.upsert_files(self.lister.bucket, files)
+
+            tasks = self.make_tasks(files)
+            pending, digests = manifest.filter_tasks(tasks, self.mode, self.engine.settings, self.force)
+            self.skipped += len(tasks) - len(pending)
+            # 以任务对象的 id 为键（同名文件的输出路径可能相同），任务在完成回调前一直被引用
+            for i in pending:
+                self._pending[id(tasks[i])] = (files[i].key, digests[i])
+            self._report()
+            yield [tasks[i] for i in pending]
+
+    def _on_chunk(self, manifest, tasks, errors):
+        """一块渲染完成：记录清单、失败与进度"""
+        if self.first_result_seconds is None:
+            self.first_result_seconds = time.perf_counter() - self._started
+            logger.info("首个二维码已生成，用时 %.3fs", self.first_result_seconds)
+        for task, error in zip(tasks, errors):
+            path = task[1]
+            key, digest = self._pending.pop(id(task))
+            if error is None:
+                manifest.record(path, digest)
+                self.generated += 1
+            else:
+                self.failures.append((key, error))
+        self._report()
+
+    def _report(self):
+        """回调进度"""
+        if self.on_progress:
+            done = self.generated + self.skipped + len(self.failures)
+            self.on_progress(done, self.listed, self.lister.total_scanned)
+
+    def run(self):
+        """
+        执行流水线直到列举结束（或取消）且全部渲染完成
+
+        Returns:
+            dict: 扫描数、音频文件数、生成/跳过/失败数、首个二维码用时、总用时、是否取消
+        """
+        self._started = time.perf_counter()
+        manifest = QRManifest(self.output_dir)
+        thread = threading.Thread(target=self._list, name="pipeline-list", daemon=True)
+        thread.start()
+        try:
+            self.engine.run_stream(
+                self._batches(manifest),
+                lambda tasks, errors: self._on_chunk(manifest, tasks, errors),
+                use_cache=not self.force,
+                should_stop=self._should_stop
+            )
+        except BaseException:
+            self.cancel()
+            raise
+        finally:
+            manifest.save()
+            thread.join()
+
+        if self._list_error is not None:
+            raise self._list_error
+        if self.on_finish:
+            self.on_finish()
+
+        summary = {
+            'scanned': self.lister.total_scanned,
+            'listed': self.listed,
+            'generated': self.generated,
+            'skipped': self.skipped,
+            'failures': self.failures,
+            'first_result_seconds': self.first_result_seconds,
+            'seconds': time.perf_counter() - self._started,
+            'cancelled': self.cancelled
+        }
+        logger.info("流式生成完成: 扫描 %d, 音频 %d, 生成 %d, 跳过 %d, 失败 %d, 用时 %.1fs",
+                    summary['scanned'], summary['listed'], summary['generated'],
+                    summary['skipped'], len(summary['failures']), summary['seconds'])
+        return summary
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按需生成二维码的HTTP服务
+功能: GET /qr/<对象键>.png?mode=wechat 返回该音频的二维码，其他系统无需同步PNG目录；
+      内容与批量生成完全一致（get_qr_content + 同一套渲染参数），渲染交给进程池，
+      热点条目保存在内存LRU中，响应带 ETag / Cache-Control，CDN和客户端可用 If-None-Match 低成本复查；
+      GET /metrics 以Prometheus文本格式返回分阶段耗时
+"""
+
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import audio_qr_core as core
+from app_logging import get_logger
+from app_metrics import get_metrics
+from qr_cache import QRRenderCache, cache_key
+
+logger = get_logger("server")
+metrics = get_metrics()
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_AGE = 86400
+
+# 请求的对象键不在内存索引中时，最多每隔这么久从本地快照重新加载一次（其他进程可能刚同步过）
+RELOAD_INTERVAL = 30
+
+QR_PATH_PREFIX = "/qr/"
+
+
+def etag_matches(header, etag):
+    """If-None-Match 中是否包含当前 ETag（忽略弱校验前缀 W/）"""
+    if header.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in header.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+
+class QRServer:
+    """
+    按需生成二维码的服务
+
+    对象键通过本地快照（catalog.db）的内存索引查找，不访问COS；
+    ETag 为二维码内容与渲染参数的摘要，无需渲染即可回答 304；
+    同一条目的并发请求只渲染一次（共享同一个 Future）。
+    """
+
+    def __init__(self, catalog, bucket, engine, mode=core.DEFAULT_QR_MODE, max_age=DEFAULT_MAX_AGE,
+                 short_id_dir=core.DEFAULT_ID_DIR, memory_bytes=64 * 1024 * 1024):
+        self.catalog = catalog
+        self.bucket = bucket
+        self.engine = engine
+        self.mode = mode
+        self.max_age = max_age
+        self.short_id_dir = short_id_dir
+        # 引擎未设置缓存时（如基准测试直接创建的引擎）使用只有内存层的LRU
+        self.cache = engine.cache or QRRenderCache(memory_bytes=memory_bytes, disk_bytes=0)
+
+        self._lock = threading.Lock()
+        self._index = {}
+        self._loaded_at = 0.0
+        self._short_ids = {}
+        self._rendering = {}
+
+        self.requests = 0
+        self.not_modified = 0
+        self.rendered = 0
+        self.errors = 0
+        self._started = time.monotonic()
+        self._httpd = None
+
+        self.reload()
+
+    def reload(self):
+        """从本地快照重新加载对象键索引"""
+        files = self.catalog.load(self.bucket)
+        with self._lock:
+            self._index = {f.key: f for f in files}
+            self._loaded_at = time.monotonic()
+        logger.info("已加载 %s 的快照: %d 个音频文件", self.bucket, len(files))
+
+    def lookup(self, key):
+        """按对象键查找文件，未找到时按 RELOAD_INTERVAL 节流重新加载快照"""
+        file_info = self._index.get(key)
+        if file_info is None and time.monotonic() - self._loaded_at >= RELOAD_INTERVAL:
+            self.reload()
+            file_info = self._index.get(key)
+        return file_info
+
+    def content_for(self, file_info, mode):
+        """二维码内容，short 模式按需分配短ID并导出映射分片"""
+        short_ids = None
+        if mode == "short":
+            with self._lock:
+                short_id = self._short_ids.get(file_info.url)
+            if short_id is None:
+                short_id = core.prepare_short_ids(self.catalog, [file_info], self.short_id_dir)[file_info.url]
+                with self._lock:
+                    self._short_ids[file_info.url] = short_id
+            short_ids = {file_info.url: short_id}
+        return core.get_qr_content(file_info, mode, short_ids)
+
+    def count(self, name):
+        """计数加一（requests / not_modified / rendered / errors，多个请求线程同时调用）"""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def cache_key(self, content):
+        """内容与渲染参数的摘要，同时用作缓存键和 ETag"""
+        return cache_key(content, self.engine.settings)
+
+    def render(self, content, digest):
+        """
+        取得二维码PNG字节：先查LRU，未命中时交给进程池渲染
+
+        同一内容正在渲染时等待已有的结果，不重复提交。
+        """
+        data = self.cache.get_bytes(digest)
+        if data is not None:
+            return data
+
+        with self._lock:
+            future = self._rendering.get(digest)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._rendering[digest] = future
+        if not owner:
+            return future.result()
+
+        try:
+            data, error = self.engine.submit_png([content]).result()[0]
+            if error is not None:
+                raise ValueError(error)
+            self.cache.put_bytes(digest, data)
+            self.count('rendered')
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._rendering.pop(digest, None)
+
+    def stats(self):
+        """运行统计（/health 返回）"""
+        uptime = time.monotonic() - self._started
+        with self._lock:
+            counts = {
+                'requests': self.requests,
+                'not_modified': self.not_modified,
+                'rendered': self.rendered,
+                'errors': self.errors
+            }
+        return {
+            'bucket': self.bucket,
+            'files': len(self._index),
+            **counts,
+            'requests_per_second': round(counts['requests'] / uptime, 1) if uptime > 0 else 0,
+            'cache': self.cache.stats()
+        }
+
+    def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """创建HTTP服务（port 为 0 时由系统分配），返回 ThreadingHTTPServer"""
+        server = self
+
+        class Handler(QRRequestHandler):
+            qr_server = server
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        return self._httpd
+
+    def serve_forever(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """在当前线程运行HTTP服务，直到 shutdown()"""
+        httpd = self.serve(host, port)
+        logger.info("二维码服务已启动: http://%s:%d%s<对象键>.png", *httpd.server_address[:2], QR_PATH_PREFIX)
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+
+    def shutdown(self):
+        """停止HTTP服务（可在其他线程调用）"""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+
+
+class QRRequestHandler(BaseHTTPRequestHandler):
+    """GET/HEAD /qr/<对象键>.png?mode=...、/health 与 /metrics"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "AudioQR"
+    # 响应头与PNG缓冲后一次写出（请求处理完自动 flush），并关闭Nagle算法，
+    # 否则长连接上头和正文分两次发送，会与客户端的延迟确认叠加出约40ms的等待
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    qr_server = None
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def handle_request(self, send_body):
+        """处理一次请求并记录耗时"""
+        with metrics.timer("http.request"):
+            self.dispatch(send_body)
+
+    def dispatch(self, send_body):
+        """解析路径并返回二维码、运行统计或指标"""
+        server = self.qr_server
+        server.count('requests')
+        url = urllib.parse.urlsplit(self.path)
+
+        if url.path == "/health":
+            body = json.dumps(server.stats(), ensure_ascii=False).encode('utf-8')
+            self.send_body(200, "application/json; charset=utf-8", body, send_body)
+            return
+        if url.path == "/metrics":
+            body = metrics.to_prometheus().encode('utf-8')
+            self.send_body(200, "text/plain; version=0.0.4; charset=utf-8", body, send_body)
+            return
+
+        if not url.path.startswith(QR_PATH_PREFIX) or not url.path.endswith(".png"):
+            self.send_text(404, "not found", send_body)
+            return
+        key = urllib.parse.unquote(url.path[len(QR_PATH_PREFIX):-len(".png")])
+        mode = urllib.parse.parse_qs(url.query).get('mode', [server.mode])[0]
+        if mode not in core.QR_MODES:
+            self.send_text(400, f"unknown mode: {mode}", send_body)
+            return
+
+        file_info = server.lookup(key)
+        if file_info is None:
+            self.send_text(404, f"unknown key: {key}", send_body)
+            return
+
+        try:
+            content = server.content_for(file_info, mode)
+            digest = server.cache_key(content)
+            etag = f'"{digest[:32]}"'
+            if etag_matches(self.headers.get("If-None-Match", ""), etag):
+                server.count('not_modified')
+                self.send_response(304)
+                self.send_cache_headers(etag)
+                self.end_headers()
+                return
+            data = server.render(content, digest)
+        except Exception as e:
+            server.count('errors')
+            logger.exception("生成二维码失败: %s", key)
+            self.send_text(500, f"render failed: {e}", send_body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_cache_headers(etag)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def send_cache_headers(self, etag):
+        """ETag 与 Cache-Control"""
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", f"public, max-age={self.qr_server.max_age}")
+
+    def send_body(self, status, content_type, body, send_body=True):
+        """带 Content-Length 的响应（保持长连接）"""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def send_text(self, status, text, send_body=True):
+        """纯文本错误响应"""
+        self.send_body(status, "text/plain; charset=utf-8", text.encode('utf-8'), send_body)
+
+    def log_message(self, format, *args):
+        """访问日志写入 DEBUG 级别，避免高并发时刷屏"""
+        logger.debug("%s - %s", self.address_string(), format % args)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+音频短ID
+功能: 为每个音频地址分配稳定的短ID，二维码只编码 播放器地址/?id=短ID；
+      ID到地址的映射按ID前缀分片导出为JSON，由播放页面按需加载解析
+"""
+
+import hashlib
+import json
+import os
+
+from qr_cache import write_atomic
+
+# 只用小写字母和数字，分片文件名在不区分大小写的文件系统上也不会冲突
+SHORT_ID_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+SHORT_ID_LENGTH = 6
+SHARD_PREFIX_LENGTH = 2
+DEFAULT_ID_DIR = "ids"
+
+
+def short_id_candidates(url):
+    """
+    依次给出地址的候选短ID
+
+    候选ID由地址摘要的36进制表示截取而来，长度从 SHORT_ID_LENGTH 开始逐位增加；
+    首个候选已被其他地址占用时使用下一个，结果只取决于地址本身和分配顺序。
+    """
+    number = int.from_bytes(hashlib.sha256(url.encode('utf-8')).digest(), 'big')
+    digits = []
+    while number:
+        number, remainder = divmod(number, len(SHORT_ID_ALPHABET))
+        digits.append(SHORT_ID_ALPHABET[remainder])
+    encoded = "".join(digits)
+    for length in range(SHORT_ID_LENGTH, len(encoded) + 1):
+        yield encoded[:length]
+
+
+def shard_prefix(short_id):
+    """短ID所在的分片"""
+    return short_id[:SHARD_PREFIX_LENGTH]
+
+
+def shard_path(id_dir, prefix):
+    """分片文件路径：ids/<前缀>.json"""
+    return os.path.join(id_dir, f"{prefix}.json")
+
+
+def write_id_shards(id_dir, shards):
+    """
+    导出映射分片
+
+    Args:
+        id_dir: 导出目录（与 wechat_player.html 一起部署）
+        shards: {前缀: {短ID: 音频地址}}，每个分片须包含该前缀下的全部ID
+    """
+    os.makedirs(id_dir, exist_ok=True)
+    for prefix, entries in shards.items():
+        data = json.dumps(entries, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        write_atomic(shard_path(id_dir, prefix), data.encode('utf-8'))
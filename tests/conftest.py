@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""测试公共设置：导入项目模块与 benchmarks/ 中的本地替身（fake_cos、fake_http）"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""COS并发上传：用进程内COS替身（benchmarks/fake_cos.py）代替存储桶"""
+
+import hashlib
+import os
+
+import pytest
+
+import audio_qr_core as core
+from cos_uploader import CosUploader, hash_file
+from fake_cos import FakeCosClient
+from file_catalog import AudioFile, FileCatalog
+from qr_engine import QRBatchEngine
+
+BUCKET = "test-1250000000"
+REGION = "ap-guangzhou"
+PART_SIZE = 1024
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = FileCatalog(str(tmp_path / "catalog.db"))
+    yield catalog
+    catalog.close()
+
+
+@pytest.fixture
+def directory(tmp_path):
+    directory = tmp_path / "audio"
+    (directory / "album").mkdir(parents=True)
+    (directory / "small.mp3").write_bytes(b"small" * 100)
+    (directory / "album" / "large.mp3").write_bytes(bytes(range(256)) * 20)
+    (directory / "cover.jpg").write_bytes(b"not audio")
+    return directory
+
+
+def make_uploader(client, catalog, directory, **kwargs):
+    """小分块，让 5120 字节的文件走分块上传"""
+    return CosUploader(client, BUCKET, REGION, catalog, str(directory), part_size=PART_SIZE,
+                       multipart_threshold=2 * PART_SIZE, **kwargs)
+
+
+def test_upload_then_skip_by_catalog_etag(catalog, directory):
+    client = FakeCosClient()
+    first = make_uploader(client, catalog, directory)
+    summary = first.run(emit=lambda files: catalog.upsert_files(BUCKET, files))
+    assert summary['uploaded'] == 2 and summary['skipped'] == 0 and not summary['failures']
+    assert sorted(client.uploaded) == ["album/large.mp3", "small.mp3"]
+    assert client.uploaded["small.mp3"]['data'] == b"small" * 100
+    _, multipart_etag, _ = hash_file(str(directory / "album" / "large.mp3"), PART_SIZE)
+    assert client.uploaded["album/large.mp3"]['etag'] == multipart_etag
+
+    # 快照中的 ETag 与本地一致：不发任何请求
+    requests = client.request_count
+    second = make_uploader(client, catalog, directory).run()
+    assert second['uploaded'] == 0 and second['skipped'] == 2
+    assert client.request_count == requests
+
+
+def test_skip_by_head_without_catalog(catalog, directory):
+    client = FakeCosClient()
+    make_uploader(client, catalog, directory).run()
+    assert catalog.count(BUCKET) == 0
+
+    # 快照中没有记录时 HEAD 对象：简单上传比较ETag，分块上传比较 x-cos-meta-md5
+    requests = client.request_count
+    summary = make_uploader(client, catalog, directory).run()
+    assert summary['uploaded'] == 0 and summary['skipped'] == 2
+    assert client.request_count - requests == 2
+
+
+def test_changed_file_is_uploaded_again(catalog, directory):
+    client = FakeCosClient()
+    make_uploader(client, catalog, directory).run(emit=lambda files: catalog.upsert_files(BUCKET, files))
+
+    path = directory / "small.mp3"
+    path.write_bytes(b"changed" * 100)
+    os.utime(path, ns=(0, 1))
+    summary = make_uploader(client, catalog, directory).run()
+    assert summary['uploaded'] == 1 and summary['skipped'] == 1
+    assert client.uploaded["small.mp3"]['etag'] == hashlib.md5(b"changed" * 100).hexdigest()
+
+
+def test_multipart_resumes_after_part_failure(catalog, directory):
+    client = FakeCosClient()
+    client.fail_part_numbers = {3}
+    summary = make_uploader(client, catalog, directory, concurrency=1).run()
+    assert [key for key, _ in summary['failures']] == ["album/large.mp3"]
+    pending = catalog.pending_upload(BUCKET, "album/large.mp3")
+    assert pending is not None and pending['part_size'] == PART_SIZE
+    uploaded_parts = set(client.multipart[pending['upload_id']]['parts'])
+    assert 3 not in uploaded_parts and uploaded_parts
+
+    # 再次上传沿用同一个 UploadId，list_parts 核对后只补传缺少的分块
+    client.fail_part_numbers = set()
+    sent = []
+    upload_part = client.upload_part
+
+    def record_part(**kwargs):
+        sent.append(kwargs['PartNumber'])
+        return upload_part(**kwargs)
+
+    client.upload_part = record_part
+    summary = make_uploader(client, catalog, directory, concurrency=1).run()
+    assert summary['uploaded'] == 1 and summary['skipped'] == 1 and not summary['failures']
+    assert sorted(sent) == sorted(set(range(1, 6)) - uploaded_parts)
+    assert catalog.pending_upload(BUCKET, "album/large.mp3") is None
+    assert not client.multipart
+    assert client.uploaded["album/large.mp3"]['data'] == (directory / "album" / "large.mp3").read_bytes()
+
+
+def test_stale_upload_id_starts_over(catalog, directory):
+    client = FakeCosClient()
+    catalog.save_pending_upload(BUCKET, "album/large.mp3", "expired", 5120,
+                                os.stat(directory / "album" / "large.mp3").st_mtime_ns, PART_SIZE)
+    summary = make_uploader(client, catalog, directory).run()
+    assert summary['uploaded'] == 2 and not summary['failures']
+    assert catalog.pending_upload(BUCKET, "album/large.mp3") is None
+
+
+def test_upload_pipeline_upserts_catalog(catalog, directory, tmp_path):
+    client = FakeCosClient(keys=["other.mp3"])
+    catalog.apply_snapshot(BUCKET, [AudioFile("other.mp3", 1, "2024-01-01T00:00:00.000Z", "e",
+                                              f"https://{BUCKET}.cos.{REGION}.myqcloud.com/")])
+    engine = QRBatchEngine(workers=1)
+    try:
+        pipeline = core.create_upload_pipeline(client, BUCKET, REGION, str(directory), "direct",
+                                               str(tmp_path / "qr"), engine, catalog, part_size=PART_SIZE)
+        summary = pipeline.run()
+    finally:
+        engine.shutdown()
+
+    assert summary['listed'] == 2 and summary['generated'] == 2
+    saved = {f.key: f for f in catalog.load(BUCKET)}
+    # 流式写入只新增/覆盖，不删除快照中已有的对象
+    assert sorted(saved) == ["album/large.mp3", "other.mp3", "small.mp3"]
+    assert saved["small.mp3"].etag == client.uploaded["small.mp3"]['etag']
+    assert saved["small.mp3"].size == 500
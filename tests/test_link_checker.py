@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""公网地址检查：用本地HTTP替身（benchmarks/fake_http.py）代替COS与播放页面"""
+
+import time
+
+import pytest
+
+import audio_qr_core as core
+from fake_http import FakeHttpServer
+from file_catalog import AudioFile, FileCatalog
+from link_checker import LinkChecker
+
+
+@pytest.fixture
+def server():
+    server = FakeHttpServer(statuses={"/denied.mp3": 403, "/missing.mp3": 404})
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = FileCatalog(str(tmp_path / "catalog.db"))
+    yield catalog
+    catalog.close()
+
+
+def check_all(checker, urls):
+    """检查一批地址，返回 {url: LinkStatus}"""
+    results = {}
+    checker.run(urls, lambda batch: results.update((r.url, r) for r in batch))
+    return results
+
+
+def test_status_reasons(server):
+    checker = LinkChecker(concurrency=2, rate=0)
+    try:
+        results = check_all(checker, [server.base_url + name for name in ("ok.mp3", "denied.mp3", "missing.mp3")])
+    finally:
+        checker.close()
+
+    ok = results[server.base_url + "ok.mp3"]
+    assert ok.ok and ok.status == 200
+    denied = results[server.base_url + "denied.mp3"]
+    assert denied.status == 403 and "不是公共读" in denied.error
+    missing = results[server.base_url + "missing.mp3"]
+    assert missing.status == 404 and "不存在" in missing.error
+
+
+def test_unreachable_host_is_a_result():
+    checker = LinkChecker(concurrency=1, rate=0, timeout=(1, 1))
+    try:
+        status = checker.check("http://127.0.0.1:1/a.mp3")
+    finally:
+        checker.close()
+    assert status.status is None and status.error.startswith("无法连接")
+
+
+def test_head_rejected_falls_back_to_ranged_get():
+    server = FakeHttpServer(statuses={"/missing.mp3": 404}, head_allowed=False)
+    checker = LinkChecker(concurrency=1, rate=0)
+    try:
+        ok = checker.check(server.base_url + "a.mp3")
+        missing = checker.check(server.base_url + "missing.mp3")
+    finally:
+        checker.close()
+        server.close()
+
+    assert ok.ok and ok.status == 200
+    assert missing.status == 404
+    assert server.requests == [("HEAD", "/a.mp3"), ("GET", "/a.mp3"),
+                               ("HEAD", "/missing.mp3"), ("GET", "/missing.mp3")]
+
+
+def test_rate_limit_is_per_host(server):
+    port = server.httpd.server_address[1]
+    one_host = [f"{server.base_url}{i}.mp3" for i in range(6)]
+    two_hosts = [f"http://{host}:{port}/{i}.mp3" for i in range(3) for host in ("127.0.0.1", "localhost")]
+
+    def elapsed(urls):
+        checker = LinkChecker(concurrency=6, rate=10)
+        try:
+            started = time.monotonic()
+            check_all(checker, urls)
+            return time.monotonic() - started
+        finally:
+            checker.close()
+
+    # 每秒10个请求：同一主机的6个请求至少间隔 5 * 0.1 秒，分在两个主机时各自只需 2 * 0.1 秒
+    single = elapsed(one_host)
+    split = elapsed(two_hosts)
+    assert single >= 0.45
+    assert split < single - 0.15
+
+
+def test_results_reused_within_ttl(server, catalog):
+    files = [AudioFile(key, 1, "2024-01-01T00:00:00.000Z", "e", server.base_url)
+             for key in ("ok.mp3", "denied.mp3")]
+
+    first = core.verify_links(catalog, files, "direct", rate=0)
+    assert first['checked'] == 2 and first['cached'] == 0
+    assert list(first['problems']) == [1]
+    saved = catalog.load_link_checks([f.url for f in files])
+    assert saved[files[0].url].ok and saved[files[1].url].status == 403
+
+    # 有效期内可访问的地址沿用快照中的结果，无法访问的地址重新检查
+    requests = len(server.requests)
+    second = core.verify_links(catalog, files, "direct", rate=0)
+    assert second['checked'] == 1 and second['cached'] == 1
+    assert second['problems'] == first['problems']
+    assert server.requests[requests:] == [("HEAD", "/denied.mp3")]
+
+    # 过期后全部重新检查
+    expired = core.verify_links(catalog, files, "direct", rate=0, ttl=0)
+    assert expired['checked'] == 2
+    forced = core.verify_links(catalog, files, "direct", rate=0, force=True)
+    assert forced['checked'] == 2
+
+
+def test_player_page_checked_once(server, catalog, monkeypatch):
+    monkeypatch.setattr(core, "WECHAT_PLAYER_URL", server.base_url + "wechat_player.html")
+    server.statuses["/wechat_player.html"] = 404
+    files = [AudioFile(f"{i}.mp3", 1, "2024-01-01T00:00:00.000Z", "e", server.base_url) for i in range(3)]
+
+    summary = core.verify_links(catalog, files, "wechat", rate=0)
+    assert summary['checked'] == 4
+    assert sorted(summary['problems']) == [0, 1, 2]
+    assert all(problem.startswith("播放页 HTTP 404") for problem in summary['problems'].values())
+    assert server.requests.count(("HEAD", "/wechat_player.html")) == 1
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""生成清单：同一输出目录中多个实例（监视与批量任务、图形界面与命令行）同时写入"""
+
+import glob
+import os
+
+from qr_engine import MANIFEST_NAME, QRManifest
+
+
+def journals(directory):
+    return glob.glob(os.path.join(directory, MANIFEST_NAME + ".journal*"))
+
+
+def test_concurrent_saves_merge(tmp_path):
+    directory = str(tmp_path)
+    batch = QRManifest(directory)
+    watch = QRManifest(directory)
+    batch.record(os.path.join(directory, "a.png"), "1")
+    watch.record(os.path.join(directory, "b.png"), "2")
+
+    # 后保存的一方不会丢掉另一方的记录，也不会删除另一方仍在写入的日志
+    watch.save()
+    assert journals(directory) == [batch.journal_path]
+    assert QRManifest(directory).entries == {"a.png": "1", "b.png": "2"}
+
+    batch.record(os.path.join(directory, "c.png"), "3")
+    batch.save()
+    assert QRManifest(directory).entries == {"a.png": "1", "b.png": "2", "c.png": "3"}
+    assert not journals(directory)
+
+
+def test_forget_is_merged(tmp_path):
+    directory = str(tmp_path)
+    batch = QRManifest(directory)
+    batch.record(os.path.join(directory, "a.png"), "1")
+    batch.record(os.path.join(directory, "b.png"), "2")
+    batch.save()
+
+    other = QRManifest(directory)
+    watch = QRManifest(directory)
+    watch.forget([os.path.join(directory, "a.png")])
+    other.record(os.path.join(directory, "c.png"), "3")
+    watch.save()
+    other.save()
+    assert QRManifest(directory).entries == {"b.png": "2", "c.png": "3"}
+
+
+def test_interrupted_journal_is_replayed_then_claimed(tmp_path):
+    directory = str(tmp_path)
+    crashed = QRManifest(directory)
+    crashed.record(os.path.join(directory, "a.png"), "1")
+    # 进程退出时日志的文件锁随之释放
+    crashed._journal.close()
+    crashed._journal = None
+
+    resumed = QRManifest(directory)
+    assert resumed.replayed == 1 and resumed.entries == {"a.png": "1"}
+    resumed.record(os.path.join(directory, "b.png"), "2")
+    resumed.save()
+    assert QRManifest(directory).entries == {"a.png": "1", "b.png": "2"}
+    assert not journals(directory)